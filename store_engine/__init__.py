@@ -0,0 +1,9 @@
+"""
+The store engine shared by the scrapers of the repository: the definitions of the stores (stores.json), and the pure
+functions which extract the gpus' information from the texts found by the selectors. The requests-based scraper (task1)
+and the Scrapy spiders (task2 and task3, see store_engine.spider) are thin adapters over it.
+"""
+from store_engine.config import STORES_PATH, load_stores, get_store_config
+from store_engine.extract import (fix_text, fix_gpu_name, fix_price, is_in_stock, get_gpu_model, get_last_page,
+                                  is_last_page)
+from store_engine.incremental import load_previous_data, get_previous_row, is_detail_refresh_due
@@ -0,0 +1,156 @@
+"""
+A benchmark of the scrapers over the replay server (see store_engine.replay). Every scraper runs in its own process over
+the saved pages of the stores, and the benchmark prints its pages and rows per second, its CPU time per page and its
+peak memory.
+
+To record the pages first (the scrapers are run over the real sites through the server):
+    $ python -m store_engine.bench ./fixtures --record --targets task1
+To run the benchmark over the saved pages, with a latency of 20-70 ms and 2% of failed responses:
+    $ python -m store_engine.bench ./fixtures --latency 0.02 --jitter 0.05 --error-rate 0.02
+"""
+import argparse
+import csv
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+from store_engine.replay import ReplayServer
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRAPY_PROJECTS = {
+    'task2': os.path.join(ROOT_DIR, 'task2', 'scrapy_scraper'),
+    'task3': os.path.join(ROOT_DIR, 'task3', 'scrapy_tor'),
+}
+TARGETS = ['task1', 'task1_async'] + list(SCRAPY_PROJECTS)
+
+
+def run_task1(server_url: str, output: str, use_async: bool = False) -> None:
+    """
+    A method to scrape the stores over the replay server with the requests-based scraper (GpuScraper.scrape), and
+    write the gpus to a csv file.
+    :param server_url: the link of the replay server.
+    :param output: the path of the output file.
+    :param use_async: a boolean indicating whether to use the asynchronous scraper (AsyncGpuScraper.scrape) instead.
+    :return: None.
+    """
+    from store_engine.replay import replay_store
+    from task1.gpu_scraper import GpuScraper
+    from task1.main import stores
+    from task1.writers import RowWriter
+
+    if use_async:
+        from task1.async_scraper import AsyncGpuScraper as GpuScraper
+
+    with RowWriter(output, mode='w') as writer:
+        for store in stores:
+            data, _ = GpuScraper(**replay_store(store, server_url)).scrape()
+            writer.write_all(data)
+
+
+def get_command(target: str, server_url: str, output: str, throttle: bool = False) -> Tuple[List[str], str]:
+    """
+    A method to get the command which runs a scraper over the replay server.
+    :param target: the name of the scraper, one of TARGETS.
+    :param server_url: the link of the replay server.
+    :param output: the path of the output file.
+    :param throttle: a boolean indicating whether the stores' throttling of the Scrapy spiders is enabled.
+    :return: the command and the directory to run it in.
+    """
+    if target in ('task1', 'task1_async'):
+        return [sys.executable, '-m', 'store_engine.bench', '--run-' + target.replace('_', '-'), server_url,
+                output], ROOT_DIR
+    command = [sys.executable, '-m', 'scrapy', 'crawl', 'gpu_scraper', '-a', 'replay_server=' + server_url,
+               '-O', output, '-s', 'LOG_LEVEL=ERROR', '-s', 'HTTPCACHE_ENABLED=False',
+               '-s', 'STORE_THROTTLE_ENABLED=%s' % throttle]
+    if target == 'task3':
+        # The pages are served locally, so they are not requested over tor.
+        command += ['-s', 'DOWNLOADER_MIDDLEWARES={}']
+    return command, SCRAPY_PROJECTS[target]
+
+
+def count_rows(path: str) -> int:
+    """
+    A method to count the rows of a csv output file.
+    :param path: the path of the output file.
+    :return: the number of rows, 0 if the file does not exist.
+    """
+    if not os.path.exists(path):
+        return 0
+    with open(path, newline='', encoding='utf-8') as csv_file:
+        return sum(1 for _ in csv.DictReader(csv_file))
+
+
+def run_benchmark(target: str, server: ReplayServer, output: str, throttle: bool = False) -> Dict[str, float]:
+    """
+    A method to run a scraper over the replay server and measure it. The CPU time and the peak memory are the ones of
+    the scraper's process.
+    :param target: the name of the scraper, one of TARGETS.
+    :param server: the running replay server.
+    :param output: the path of the output file.
+    :param throttle: a boolean indicating whether the stores' throttling of the Scrapy spiders is enabled.
+    :return: a dictionary of the measures.
+    """
+    command, cwd = get_command(target, server.url, output, throttle)
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [ROOT_DIR, os.environ.get('PYTHONPATH')]))}
+    server.reset_counts()
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=cwd, env=env)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode:
+        print('Error while running %s: exit code %d' % (target, process.returncode))
+    pages = server.num_requests
+    rows = count_rows(output)
+    cpu_time = usage.ru_utime + usage.ru_stime
+    return {
+        'pages': pages,
+        'rows': rows,
+        'errors': server.num_errors,
+        'missing': server.num_missing,
+        'seconds': elapsed,
+        'pages_per_sec': pages / elapsed,
+        'rows_per_sec': rows / elapsed,
+        'cpu_ms_per_page': 1000 * cpu_time / pages if pages else 0.0,
+        'peak_mb': usage.ru_maxrss / 1024,
+    }
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Benchmark the scrapers over the saved pages of the stores.')
+    arg_parser.add_argument('fixture_dir', nargs='?', help='the directory of the saved pages.')
+    arg_parser.add_argument('--targets', nargs='+', choices=TARGETS, default=TARGETS)
+    arg_parser.add_argument('--record', action='store_true', help='request and save the pages which are not saved.')
+    arg_parser.add_argument('--latency', type=float, default=0.0, help='the minimum latency in seconds.')
+    arg_parser.add_argument('--jitter', type=float, default=0.0, help='the maximum random latency added in seconds.')
+    arg_parser.add_argument('--error-rate', type=float, default=0.0, help='the probability of a 503 response.')
+    arg_parser.add_argument('--throttle', action='store_true', help="enable the stores' throttling of the spiders.")
+    arg_parser.add_argument('--repeat', type=int, default=1)
+    arg_parser.add_argument('--run-task1', nargs=2, metavar=('SERVER_URL', 'OUTPUT'), help=argparse.SUPPRESS)
+    arg_parser.add_argument('--run-task1-async', nargs=2, metavar=('SERVER_URL', 'OUTPUT'), help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.run_task1 or args.run_task1_async:
+        run_task1(*(args.run_task1 or args.run_task1_async), use_async=bool(args.run_task1_async))
+        sys.exit()
+    if args.fixture_dir is None:
+        arg_parser.error('the fixture_dir argument is required')
+
+    server = ReplayServer(args.fixture_dir, record=args.record, latency=args.latency, jitter=args.jitter,
+                          error_rate=args.error_rate).start()
+    print('%-11s %6s %6s %6s %8s %8s %8s %10s %8s' % ('target', 'pages', 'rows', 'errors', 'seconds', 'pages/s',
+                                                     'rows/s', 'cpu ms/pg', 'peak MB'))
+    with tempfile.TemporaryDirectory() as output_dir:
+        for target in args.targets:
+            for i in range(args.repeat):
+                output = os.path.join(output_dir, '%s_%d.csv' % (target, i))
+                result = run_benchmark(target, server, output, args.throttle)
+                if result['missing']:
+                    print('%d pages of %s were not recorded' % (result['missing'], target))
+                print('%-11s %6d %6d %6d %8.2f %8.1f %8.1f %10.2f %8.1f' % (
+                    target, result['pages'], result['rows'], result['errors'], result['seconds'],
+                    result['pages_per_sec'], result['rows_per_sec'], result['cpu_ms_per_page'], result['peak_mb']))
+    server.stop()
@@ -0,0 +1,110 @@
+"""
+The canonical gpu models, to match the same gpus across the stores. The stores write a gpu's model in their own forms
+(e.g. OnlineTrade's 'NVIDIA GeForce RTX 3070 Ti' against Regard's 'GeForce RTX3070Ti'), and the gpus' names differ
+again ('NVIDIA GeForce RTX3070 ASUS 8Gb LHR'). The families of the gpus are listed in gpu_models.json (by vendor), and
+their names are tokenized into a trie once (see ModelIndex): a text is reduced to its latin words and numbers, split
+where letters and digits meet ('RTX3070Ti' is 'RTX 3070 TI'), and its canonical model is the longest family found in
+its tokens. A gpu is canonicalized from its model, or from its name when its model is not known, when it is recorded
+in the price history (see store_engine.history), so that the queries across the stores are index lookups.
+"""
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+MODELS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gpu_models.json')
+TOKEN_PATTERN = re.compile(r'[A-Z]+|[0-9]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    A method to split a text into the tokens of the model keys: its latin words and its numbers, in upper case. A word
+    with digits is split where the letters and the digits meet, and the other characters are dropped.
+    :param text: the text, e.g. 'GeForce RTX3070Ti 8Гб'.
+    :return: the tokens, e.g. ['GEFORCE', 'RTX', '3070', 'TI'].
+    """
+    return TOKEN_PATTERN.findall(text.upper())
+
+
+class ModelIndex:
+    """
+    A class of the index of the canonical gpu models: a trie over the tokens of the families' keys, so that a text is
+    canonicalized in one pass over its tokens, whatever the number of families.
+    """
+
+    def __init__(self, families: Optional[Dict[str, List[str]]] = None):
+        """
+        The main constructor of the index.
+        :param families: the families of the gpus by vendor, e.g. {'NVIDIA GeForce': ['RTX 3070', 'RTX 3070 Ti']}. The
+        canonical model of a family is its vendor followed by its key, e.g. 'NVIDIA GeForce RTX 3070 Ti'.
+        """
+        self.trie = {}
+        for vendor, keys in (families or {}).items():
+            for key in keys:
+                self.add(key, '%s %s' % (vendor, key))
+
+    @classmethod
+    def from_file(cls, path: Optional[str] = None) -> 'ModelIndex':
+        """
+        A method to build the index of the families of a JSON file.
+        :param path: the path of the file. The default is the 'gpu_models.json' file of the package.
+        :return: the index.
+        """
+        with open(MODELS_PATH if path is None else path, encoding='utf-8') as models_file:
+            return cls(json.load(models_file))
+
+    def add(self, key: str, canonical_model: str) -> None:
+        """
+        A method to add a key of a canonical model to the index.
+        :param key: the key, e.g. 'RTX 3070 Ti'.
+        :param canonical_model: the canonical model, e.g. 'NVIDIA GeForce RTX 3070 Ti'.
+        :return: None.
+        :raises ValueError: if the key has no tokens.
+        """
+        tokens = tokenize(key)
+        if not tokens:
+            raise ValueError('No tokens in the key %r' % key)
+        node = self.trie
+        for token in tokens:
+            node = node.setdefault(token, {})
+        node[None] = canonical_model
+
+    def lookup(self, text: Optional[str]) -> Optional[str]:
+        """
+        A method to find the canonical model of a text: the longest key found in its tokens (the first one if there
+        are many).
+        :param text: the text, e.g. a gpu's model or name.
+        :return: the canonical model, or None if no key is found.
+        """
+        if not text:
+            return None
+        tokens = tokenize(text)
+        best_model, best_length = None, 0
+        for start in range(len(tokens)):
+            node = self.trie
+            for length, token in enumerate(tokens[start:], 1):
+                node = node.get(token)
+                if node is None:
+                    break
+                if None in node and length > best_length:
+                    best_model, best_length = node[None], length
+        return best_model
+
+    def canonicalize(self, row: dict) -> Optional[str]:
+        """
+        A method to find the canonical model of a scraped gpu, from its model or, if it is not known, from its name.
+        :param row: the gpu's data (COLUMNS).
+        :return: the canonical model, or None if it is not found.
+        """
+        return self.lookup(row.get('gpu_model')) or self.lookup(row.get('gpu_name'))
+
+
+@lru_cache(maxsize=None)
+def get_model_index(path: Optional[str] = None) -> ModelIndex:
+    """
+    A method to get the index of the families of a JSON file, which is built once.
+    :param path: the path of the file. The default is the 'gpu_models.json' file of the package.
+    :return: the index.
+    """
+    return ModelIndex.from_file(path)
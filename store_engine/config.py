@@ -0,0 +1,41 @@
+import json
+import os
+from typing import List, Optional
+
+
+STORES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stores.json')
+SECTIONS = ('css', 'xpath', 'requests', 'scrapy', 'tor')
+
+
+def load_stores(path: Optional[str] = None) -> List[dict]:
+    """
+    A method to load the definitions of the stores. Each store has its common information (store_name, base_link,
+    gpu_page_link, page_start_from_zero), and sections which are used by some of the scrapers:
+        css: the CSS selectors used by the requests-based scraper (task1).
+        xpath: the XPath selectors used by the Scrapy spiders (task2 and task3).
+        requests, scrapy, tor: the options of the requests-based scraper, of the Scrapy spiders, and of the Scrapy
+        spider over tor (which override the ones of the 'scrapy' section).
+    :param path: the path of the JSON file of the stores. The default is the 'stores.json' file of the package.
+    :return: a list of the stores' definitions.
+    """
+    with open(STORES_PATH if path is None else path, encoding='utf-8') as stores_file:
+        stores = json.load(stores_file)
+    for store in stores:
+        for key in ('store_name', 'base_link', 'gpu_page_link', 'page_start_from_zero'):
+            if key not in store:
+                raise ValueError('The store %s has no %s' % (store.get('store_name'), key))
+    return stores
+
+
+def get_store_config(store: dict, *sections: str) -> dict:
+    """
+    A method to get the flat configuration of a store for one scraper, by merging its common information with the
+    given sections (the later sections override the earlier ones).
+    :param store: the store's definition (see load_stores).
+    :param sections: the names of the sections, e.g. 'css', 'requests'.
+    :return: a dictionary of the store's configuration.
+    """
+    config = {key: value for key, value in store.items() if key not in SECTIONS}
+    for section in sections:
+        config.update(store.get(section, {}))
+    return config
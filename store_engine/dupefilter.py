@@ -0,0 +1,39 @@
+from scrapy.dupefilters import RFPDupeFilter
+from scrapy.utils.job import job_dir
+
+from store_engine.urls import SeenSet, url_fingerprint
+
+
+class CanonicalDupeFilter(RFPDupeFilter):
+    """
+    A duplicate filter of requests which fingerprints the GET requests by their canonical links (see
+    store_engine.urls.url_fingerprint), so that the aliases of a page (its host with or without 'www.', its query
+    parameters in another order, its tracking parameters) are requested once. The other requests are fingerprinted as
+    usual. The fingerprints are kept in a SeenSet, exactly, or in a Bloom filter when DUPEFILTER_BLOOM_CAPACITY is more
+    than zero. Like in Scrapy's filter, they are written to the JOBDIR when the crawl is persisted.
+    """
+
+    def __init__(self, path=None, debug: bool = False, *, fingerprinter=None, bloom_capacity: int = 0):
+        super().__init__(path, debug, fingerprinter=fingerprinter)
+        self.seen = SeenSet(bloom_capacity)
+        for fingerprint in self.fingerprints:
+            self.seen.add_fingerprint(bytes.fromhex(fingerprint))
+        self.fingerprints = set()
+
+    @classmethod
+    def from_settings(cls, settings, *, fingerprinter=None):
+        return cls(job_dir(settings), settings.getbool('DUPEFILTER_DEBUG'), fingerprinter=fingerprinter,
+                   bloom_capacity=settings.getint('DUPEFILTER_BLOOM_CAPACITY', 0))
+
+    def request_fingerprint(self, request) -> str:
+        if request.method == 'GET' and not request.body:
+            return url_fingerprint(request.url).hex()
+        return super().request_fingerprint(request)
+
+    def request_seen(self, request) -> bool:
+        fingerprint = self.request_fingerprint(request)
+        if not self.seen.add_fingerprint(bytes.fromhex(fingerprint)):
+            return True
+        if self.file:
+            self.file.write(fingerprint + '\n')
+        return False
@@ -0,0 +1,98 @@
+import re
+from typing import Iterable, Optional
+
+
+NON_BREAK_SPACE = '\xa0'
+OUT_OF_STOCK = '= 0 шт.'
+TRAILING_NON_DIGITS = re.compile(r'\D+$')
+
+
+def fix_text(text: str) -> str:
+    """
+    A method to replace the non-break spaces (i.e. '\xa0') of a text with normal spaces.
+    :param text: the original text.
+    :return: the text with normal spaces.
+    """
+    return text.replace(NON_BREAK_SPACE, ' ')
+
+
+def fix_gpu_name(gpu_name: str, ascii_only: bool = False) -> str:
+    """
+    A method to fix the gpu name. It takes rid of the parts that are inside parenthesis, and optionally of the words
+    which are not ascii.
+    :param gpu_name: the original gpu name.
+    :param ascii_only: a boolean indicating whether to keep only the ascii words of the name.
+    :return: a modified version of the gpu name.
+    """
+    gpu_name = fix_text(gpu_name)
+    gpu_name = gpu_name.split(' (')[0]
+    gpu_name = gpu_name.split(' [')[0]
+    if ascii_only:
+        gpu_name = ' '.join(word for word in gpu_name.split() if word.isascii())
+    return gpu_name
+
+
+def fix_price(gpu_price: str) -> str:
+    """
+    A method to fix the price by eliminating the spaces and the currency.
+    :param gpu_price: a price string which needs to be fixed.
+    :return: a modified version of the price.
+    :raises ValueError: if the string does not contain a price.
+    """
+    gpu_price = TRAILING_NON_DIGITS.sub('', fix_text(gpu_price).replace(' ', ''))
+    if not gpu_price.isdigit() or not int(gpu_price):
+        raise ValueError('No price in %r' % gpu_price)
+    return gpu_price
+
+
+def is_in_stock(in_stock: str) -> bool:
+    """
+    A method to find if the gpu is available in stock given the availability string.
+    :param in_stock: the availability string.
+    :return: a boolean for the gpu's availability in stock.
+    """
+    return fix_text(in_stock).strip() != OUT_OF_STOCK
+
+
+def get_gpu_model(features: Iterable[str], gpu_model_key: str, feature_separator: str) -> str:
+    """
+    A method to find the gpu model given the features of the gpu, which are (key, value) pairs separated by
+    feature_separator. The model is the ascii words of the value of gpu_model_key.
+    :param features: the texts of the features.
+    :param gpu_model_key: the key of the gpu model.
+    :param feature_separator: the separator between the key and the value of a feature.
+    :return: the gpu model, or an empty string if there is no feature of the gpu model.
+    """
+    for feature in features:
+        if feature_separator not in feature:
+            continue
+        key, value = fix_text(feature).split(feature_separator, 1)
+        if key == gpu_model_key:
+            return ' '.join(word for word in value.split() if word.isascii())
+    return ''
+
+
+def get_last_page(page_iterators: Iterable[str]) -> Optional[int]:
+    """
+    A method to find the number of the last gpu list page given the page iterators of a gpu list page. It finds the
+    last page iterator which is a number.
+    :param page_iterators: the texts of the page iterators at the bottom of the page.
+    :return: the number of the last page (as shown in the page iterators), or None if there is no such iterator.
+    """
+    for page_iterator in list(page_iterators)[::-1]:
+        page_iterator = fix_text(page_iterator).replace(' ', '')
+        if page_iterator.isdigit():
+            return int(page_iterator)
+    return None
+
+
+def is_last_page(page_iterators: Iterable[str], page_num: int) -> bool:
+    """
+    a method to find if a gpu list page (given its page iterators) is the last page. It does this by finding the last
+    page iterator in the page and compares its value with the page number.
+    :param page_iterators: the texts of the page iterators at the bottom of the page.
+    :param page_num: the page number of the given page.
+    :return: a boolean indicating whether the given page is the last page.
+    """
+    last_page = get_last_page(page_iterators)
+    return last_page is not None and last_page <= page_num
@@ -0,0 +1,322 @@
+"""
+The price history of the gpus in a SQLite database. Instead of keeping a full snapshot of every run, a gpu's version is
+written only when its name, price or availability changed, so the database grows with the rate of change of the stores
+rather than with the number of runs. Every run reports its diff: the new, changed and removed gpus.
+
+The 'gpus' table keeps the latest version of every gpu (keyed by its link and indexed by its model), and the
+'gpu_history' table keeps all its versions (clustered by link and fetch_ts). Every gpu is also mapped to its canonical
+model when it is recorded (see store_engine.canonical), and the gpus in stock are indexed by it, so the cheapest gpu of
+every model across the stores is found without matching the gpus' models at query time (see get_cheapest_in_stock).
+"""
+import sqlite3
+import time
+from typing import Dict, List, Optional
+
+from store_engine.canonical import ModelIndex, get_model_index
+
+TRACKED_COLUMNS = ('gpu_name', 'gpu_price', 'in_stock')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS gpus (
+    url TEXT PRIMARY KEY,
+    store_name TEXT NOT NULL,
+    gpu_model TEXT,
+    gpu_name TEXT,
+    gpu_price INTEGER,
+    in_stock INTEGER NOT NULL,
+    first_seen INTEGER NOT NULL,
+    changed_at INTEGER NOT NULL,
+    removed_at INTEGER,
+    canonical_model TEXT
+);
+CREATE INDEX IF NOT EXISTS gpus_model ON gpus (gpu_model, gpu_price);
+CREATE TABLE IF NOT EXISTS gpu_history (
+    url TEXT NOT NULL,
+    fetch_ts INTEGER NOT NULL,
+    gpu_name TEXT,
+    gpu_price INTEGER,
+    in_stock INTEGER NOT NULL,
+    PRIMARY KEY (url, fetch_ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS open_run (
+    url TEXT PRIMARY KEY,
+    store_name TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+CANONICAL_INDEX = """
+CREATE INDEX IF NOT EXISTS gpus_canonical_in_stock ON gpus (canonical_model, gpu_price)
+WHERE in_stock = 1 AND removed_at IS NULL;
+"""
+
+
+def get_values(row: dict) -> dict:
+    """
+    A method to get the typed values of a scraped gpu (whose values may be strings, e.g. when it is read from a csv
+    file). An empty or invalid price becomes None.
+    :param row: the gpu's data (COLUMNS).
+    :return: a dictionary of the gpu's values as stored in the database.
+    """
+    gpu_price = str(row.get('gpu_price') or '')
+    in_stock = row.get('in_stock')
+    if isinstance(in_stock, str):
+        in_stock = in_stock.lower() == 'true'
+    return {
+        'url': row['url'],
+        'store_name': row['store_name'],
+        'gpu_model': (row.get('gpu_model') or '').strip() or None,
+        'gpu_name': row.get('gpu_name') or None,
+        'gpu_price': int(gpu_price) if gpu_price.isdigit() else None,
+        'in_stock': int(bool(in_stock)),
+        'fetch_ts': int(row['fetch_ts']),
+    }
+
+
+class HistoryStore:
+    """
+    A class to keep the price history of the gpus in a SQLite database. The gpus of a run are recorded one by one (see
+    record), and finish_run marks the gpus which were not seen in the run as removed and returns the run's diff. A run
+    is committed in one transaction. A run which is interrupted can be left open (see suspend_run), and it is continued
+    by the next store opened on the database.
+    """
+
+    def __init__(self, path: str = 'history.sqlite', model_index: Optional[ModelIndex] = None):
+        """
+        The main constructor of the store. It creates the database and its tables if they do not exist.
+        :param path: the path of the database file.
+        :param model_index: the index of the canonical models of the gpus. The default is the index of the package's
+        families (see store_engine.canonical).
+        """
+        self.path = path
+        self.model_index = get_model_index() if model_index is None else model_index
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+        self.add_canonical_models()
+        self.connection.executescript(CANONICAL_INDEX)
+        self.start_run()
+
+    def add_canonical_models(self) -> None:
+        """
+        A method to add the canonical models to a database created before they were recorded, by canonicalizing its
+        gpus once.
+        :return: None.
+        """
+        columns = [row['name'] for row in self.connection.execute('PRAGMA table_info(gpus)')]
+        if 'canonical_model' in columns:
+            return
+        self.connection.execute('ALTER TABLE gpus ADD COLUMN canonical_model TEXT')
+        rows = self.connection.execute('SELECT url, gpu_model, gpu_name FROM gpus').fetchall()
+        self.connection.executemany('UPDATE gpus SET canonical_model = ? WHERE url = ?',
+                                    [(self.model_index.canonicalize(dict(row)), row['url']) for row in rows])
+        self.connection.commit()
+
+    def start_run(self) -> None:
+        """
+        A method to start a new run, or to continue the run which was left open in the database (see suspend_run).
+        :return: None.
+        """
+        self.run_ts = int(time.time())
+        self.seen_urls = {row['url']: row['store_name'] for row in self.connection.execute('SELECT * FROM open_run')}
+        self.seen_stores = set(self.seen_urls.values())
+        self.diff = {'new': [], 'changed': [], 'removed': []}
+
+    def record(self, row: dict) -> Optional[str]:
+        """
+        A method to record a gpu scraped in the current run. A new version is written only if the gpu is new, or its
+        name, price or availability changed.
+        :param row: the gpu's data (COLUMNS).
+        :return: 'new' or 'changed' if a version was written, otherwise None.
+        """
+        values = get_values(row)
+        url = values['url']
+        self.seen_urls[url] = values['store_name']
+        self.seen_stores.add(values['store_name'])
+        latest = self.connection.execute('SELECT * FROM gpus WHERE url = ?', (url,)).fetchone()
+        if latest is not None and values['gpu_model'] is None:
+            values['gpu_model'] = latest['gpu_model']
+        values['canonical_model'] = self.model_index.canonicalize(values)
+        if latest is not None and latest['removed_at'] is None and all(
+                latest[column] == values[column] for column in TRACKED_COLUMNS):
+            if (latest['gpu_model'], latest['canonical_model']) != (values['gpu_model'], values['canonical_model']):
+                self.connection.execute('UPDATE gpus SET gpu_model = ?, canonical_model = ? WHERE url = ?',
+                                        (values['gpu_model'], values['canonical_model'], url))
+            return None
+        self.connection.execute(
+            'INSERT OR REPLACE INTO gpu_history (url, fetch_ts, gpu_name, gpu_price, in_stock) VALUES (?, ?, ?, ?, ?)',
+            (url, values['fetch_ts'], values['gpu_name'], values['gpu_price'], values['in_stock']))
+        if latest is None:
+            self.connection.execute(
+                'INSERT INTO gpus (url, store_name, gpu_model, gpu_name, gpu_price, in_stock, first_seen, changed_at, '
+                'canonical_model) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, values['store_name'], values['gpu_model'], values['gpu_name'], values['gpu_price'],
+                 values['in_stock'], values['fetch_ts'], values['fetch_ts'], values['canonical_model']))
+            self.diff['new'].append(values)
+            return 'new'
+        self.connection.execute(
+            'UPDATE gpus SET store_name = ?, gpu_model = ?, gpu_name = ?, gpu_price = ?, in_stock = ?, changed_at = ?, '
+            'removed_at = NULL, canonical_model = ? WHERE url = ?',
+            (values['store_name'], values['gpu_model'], values['gpu_name'], values['gpu_price'], values['in_stock'],
+             values['fetch_ts'], values['canonical_model'], url))
+        if latest['removed_at'] is not None:
+            self.diff['new'].append(values)
+            return 'new'
+        self.diff['changed'].append({'url': url, 'store_name': values['store_name'],
+                                     **{column: (latest[column], values[column]) for column in TRACKED_COLUMNS
+                                        if latest[column] != values[column]}})
+        return 'changed'
+
+    def finish_run(self) -> Dict[str, List[dict]]:
+        """
+        A method to finish the current run: the gpus of the stores scraped in the run which were not seen are marked as
+        removed, and the run is committed. The stores which did not return any gpu (e.g. because they failed) are left
+        as they are.
+        :return: the diff of the run: the lists of the 'new', 'changed' and 'removed' gpus. A changed gpu has its link,
+        its store and the (old, new) pair of every changed column.
+        """
+        for store_name in self.seen_stores:
+            rows = self.connection.execute('SELECT url, store_name, gpu_model, gpu_name, gpu_price FROM gpus '
+                                           'WHERE store_name = ? AND removed_at IS NULL', (store_name,)).fetchall()
+            removed = [dict(row) for row in rows if row['url'] not in self.seen_urls]
+            self.connection.executemany('UPDATE gpus SET removed_at = ? WHERE url = ?',
+                                        [(self.run_ts, row['url']) for row in removed])
+            self.diff['removed'].extend(removed)
+        self.connection.execute('DELETE FROM open_run')
+        self.connection.commit()
+        diff = self.diff
+        self.start_run()
+        return diff
+
+    def suspend_run(self) -> None:
+        """
+        A method to leave the current run open, e.g. when the crawl was stopped and will be resumed: the gpus recorded
+        so far are committed, but no gpu is marked as removed, since the gpus which were not seen yet may be seen when
+        the run is continued. The gpus seen in the run are kept in the database until finish_run.
+        :return: None.
+        """
+        self.connection.executemany('INSERT OR REPLACE INTO open_run (url, store_name) VALUES (?, ?)',
+                                    self.seen_urls.items())
+        self.connection.commit()
+
+    def get_latest_prices(self, gpu_model: str, in_stock_only: bool = False) -> List[dict]:
+        """
+        A method to get the latest prices of the gpus of a model, cheapest first (an index lookup on the model).
+        :param gpu_model: the gpu model, e.g. 'NVIDIA GeForce RTX 3060'.
+        :param in_stock_only: a boolean indicating whether to keep only the gpus available in stock.
+        :return: the latest versions of the gpus which are not removed.
+        """
+        query = 'SELECT * FROM gpus WHERE gpu_model = ? AND removed_at IS NULL' + (
+            ' AND in_stock = 1' if in_stock_only else '') + ' ORDER BY gpu_price'
+        return [dict(row) for row in self.connection.execute(query, (gpu_model,))]
+
+    def get_cheapest_in_stock(self, canonical_model: Optional[str] = None) -> List[dict]:
+        """
+        A method to get the cheapest gpu in stock of every canonical model across the stores, from the latest versions
+        of the gpus (a scan of the index of the gpus in stock by canonical model, or a lookup for one model).
+        :param canonical_model: the canonical model, e.g. 'NVIDIA GeForce RTX 3070 Ti', or None for all the models.
+        :return: the cheapest gpu of every model (its latest version), by canonical model. The gpus without a price are
+        left out.
+        """
+        if canonical_model is not None:
+            row = self.connection.execute(
+                'SELECT * FROM gpus WHERE canonical_model = ? AND in_stock = 1 AND removed_at IS NULL '
+                'AND gpu_price IS NOT NULL ORDER BY gpu_price LIMIT 1', (canonical_model,)).fetchone()
+            return [] if row is None else [dict(row)]
+        # With MIN, SQLite takes the other columns from the row of the minimum, i.e. the cheapest gpu of the group.
+        return [dict(row) for row in self.connection.execute(
+            'SELECT url, store_name, gpu_model, gpu_name, MIN(gpu_price) AS gpu_price, in_stock, first_seen, '
+            'changed_at, removed_at, canonical_model FROM gpus WHERE canonical_model IS NOT NULL AND in_stock = 1 '
+            'AND removed_at IS NULL AND gpu_price IS NOT NULL GROUP BY canonical_model ORDER BY canonical_model')]
+
+    def get_price_history(self, url: str) -> List[dict]:
+        """
+        A method to get the versions of a gpu, oldest first.
+        :param url: the link of the gpu page.
+        :return: the versions of the gpu: its fetch_ts, name, price and availability when each version was seen first.
+        """
+        return [dict(row) for row in self.connection.execute(
+            'SELECT * FROM gpu_history WHERE url = ? ORDER BY fetch_ts', (url,))]
+
+    def close(self) -> None:
+        """
+        A method to close the database. The gpus recorded since the last finish_run are not committed.
+        :return: None.
+        """
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def format_diff(diff: Dict[str, List[dict]], max_lines: int = 20) -> str:
+    """
+    A method to format the diff of a run (see HistoryStore.finish_run) as a short report.
+    :param diff: the diff of the run.
+    :param max_lines: the maximum number of gpus listed of every kind.
+    :return: the report.
+    """
+    lines = ['%d new, %d changed, %d removed gpus' % (len(diff['new']), len(diff['changed']), len(diff['removed']))]
+    for kind in ('new', 'changed', 'removed'):
+        for gpu in diff[kind][:max_lines]:
+            if kind == 'changed':
+                details = ', '.join('%s: %s -> %s' % (column, *gpu[column]) for column in TRACKED_COLUMNS
+                                    if column in gpu)
+            else:
+                details = '%s, %s' % (gpu['gpu_name'], gpu['gpu_price'])
+            lines.append('  %-7s %s (%s)' % (kind, gpu['url'], details))
+        if len(diff[kind]) > max_lines:
+            lines.append('  ... %d more %s gpus' % (len(diff[kind]) - max_lines, kind))
+    return '\n'.join(lines)
+
+
+class HistoryPipeline:
+    """
+    A Scrapy item pipeline which records the items in a HistoryStore. It is enabled by the HISTORY_DB setting, e.g.
+    'scrapy crawl gpu_scraper -s HISTORY_DB=history.sqlite'. The diff of the crawl is logged and counted in the stats
+    ('history/new', 'history/changed' and 'history/removed'). The run is finished only if the crawl finished; otherwise
+    (e.g. it was stopped with Ctrl-C, to be resumed with its JOBDIR) it is left open, and no gpu is marked as removed.
+    """
+
+    def __init__(self, path: str, stats=None):
+        """
+        The main constructor of the pipeline.
+        :param path: the path of the database file.
+        :param stats: the stats collector of the crawler.
+        """
+        self.path = path
+        self.stats = stats
+        self.history = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        from scrapy import signals
+        from scrapy.exceptions import NotConfigured
+
+        path = crawler.settings.get('HISTORY_DB')
+        if not path:
+            raise NotConfigured('HISTORY_DB is not set')
+        pipeline = cls(path, crawler.stats)
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+
+    def open_spider(self, spider):
+        self.history = HistoryStore(self.path)
+
+    def process_item(self, item, spider):
+        self.history.record(dict(item))
+        return item
+
+    def spider_closed(self, spider, reason):
+        if reason != 'finished':
+            self.history.suspend_run()
+            self.history.close()
+            spider.logger.info('Price history: the run is left open, since the crawl was closed (%s)', reason)
+            return
+        diff = self.history.finish_run()
+        self.history.close()
+        if self.stats is not None:
+            for kind, gpus in diff.items():
+                self.stats.set_value('history/' + kind, len(gpus))
+        spider.logger.info('Price history: %s', format_diff(diff))
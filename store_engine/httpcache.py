@@ -0,0 +1,54 @@
+import os
+import shutil
+import time
+
+from scrapy.extensions.httpcache import FilesystemCacheStorage, RFC2616Policy
+
+
+class RevalidatePolicy(RFC2616Policy):
+    """
+    A cache policy which always revalidates the cached pages with a conditional request ('If-None-Match' and
+    'If-Modified-Since'), and reuses the cached page when the server answers '304 Not Modified'. Only pages which can be
+    revalidated (i.e. have an 'ETag' or a 'Last-Modified' header) are cached. A page whose download was stopped (e.g. by
+    the stream extractor, once it found its fields) is incomplete, so it is not cached.
+    """
+
+    def should_cache_response(self, response, request):
+        return (response.status == 200 and 'download_stopped' not in response.flags
+                and (b'ETag' in response.headers or b'Last-Modified' in response.headers))
+
+    def is_cached_response_fresh(self, cachedresponse, request):
+        self._set_conditional_validators(request, cachedresponse)
+        return False
+
+
+class PrunedFilesystemCacheStorage(FilesystemCacheStorage):
+    """
+    A filesystem cache storage which, when the spider is closed, removes the entries older than
+    HTTPCACHE_EXPIRATION_SECS, then the oldest entries until the total size of the cache is at most HTTPCACHE_MAX_SIZE
+    bytes (0 means no limit).
+    """
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.max_size = settings.getint('HTTPCACHE_MAX_SIZE')
+
+    def close_spider(self, spider):
+        super().close_spider(spider)
+        entries = []
+        now = time.time()
+        for dir_path, _, file_names in os.walk(os.path.join(self.cachedir, spider.name)):
+            if 'pickled_meta' not in file_names:
+                continue
+            try:
+                stored_at = os.stat(os.path.join(dir_path, 'pickled_meta')).st_mtime
+                size = sum(os.stat(os.path.join(dir_path, file_name)).st_size for file_name in file_names)
+            except OSError:
+                stored_at, size = 0, 0
+            entries.append((stored_at, size, dir_path))
+        entries.sort(reverse=True)
+        total_size = 0
+        for stored_at, size, dir_path in entries:
+            total_size += size
+            if 0 < self.expiration_secs < now - stored_at or 0 < self.max_size < total_size:
+                shutil.rmtree(dir_path, ignore_errors=True)
@@ -0,0 +1,85 @@
+import csv
+import os
+import time
+import zlib
+from typing import Dict, Optional
+
+from store_engine import extract
+from store_engine.urls import canonicalize_url
+
+
+def load_previous_data(path: str) -> Dict[str, dict]:
+    """
+    A method to load the output csv file of a previous run, to use it in an incremental run. The gpus' links are
+    canonicalized (see store_engine.urls), like the links found in the gpus list pages, so that the gpus of an output
+    written before the links were canonicalized are found too. When many rows have the same canonical link, the latest
+    one is kept.
+    :param path: the path of the output file.
+    :return: a dictionary from the gpus' canonical links to their data, which is empty if the file does not exist.
+    """
+    if not os.path.exists(path):
+        return {}
+    previous_data = {}
+    with open(path, newline='', encoding='utf-8') as csv_file:
+        for row in csv.DictReader(csv_file):
+            try:
+                row['fetch_ts'] = int(row['fetch_ts'])
+            except (KeyError, ValueError):
+                continue
+            row['in_stock'] = row.get('in_stock', '').lower() == 'true'
+            row['url'] = canonicalize_url(row.get('url') or '')
+            previous_row = previous_data.get(row['url'])
+            if previous_row is None or row['fetch_ts'] >= previous_row['fetch_ts']:
+                previous_data[row['url']] = row
+    return previous_data
+
+
+def get_previous_row(previous_data: Optional[Dict[str, dict]], gpu_link: str, item_data: dict,
+                     refresh_after: float) -> Optional[dict]:
+    """
+    A method to find whether the previous data of a gpu can be reused in an incremental run. It can be reused if it is
+    not older than refresh_after seconds, and the gpu's price in the gpus list page did not change (the prices are
+    compared once normalized). The name is not compared, since the scrapers do not all take it from the gpus list page
+    (task1 takes it from the gpu page).
+    :param previous_data: the output of the previous run (see load_previous_data), or None if the run is not
+    incremental.
+    :param gpu_link: the canonical link of the gpu page.
+    :param item_data: the data of the gpu in the gpus list page, e.g. its name and price.
+    :param refresh_after: the maximum age in seconds of the previous data.
+    :return: the previous data of the gpu, or None if the gpu needs to be scraped.
+    """
+    if previous_data is None:
+        return None
+    previous_row = previous_data.get(gpu_link)
+    if previous_row is None or time.time() - previous_row['fetch_ts'] > refresh_after:
+        return None
+    listing_price = item_data.get('gpu_price')
+    if listing_price is not None and normalize_price(listing_price) != normalize_price(previous_row.get('gpu_price')):
+        return None
+    return previous_row
+
+
+def normalize_price(price) -> Optional[str]:
+    """
+    A method to normalize a price of the gpus list page or of the previous data, to compare them.
+    :param price: the price, e.g. '32 990 ₽', '32990' or 32990.
+    :return: the digits of the price, or None if it does not contain a price.
+    """
+    try:
+        return extract.fix_price(str(price))
+    except ValueError:
+        return None
+
+
+def is_detail_refresh_due(gpu_link: str, detail_refresh_days: int) -> bool:
+    """
+    A method to find whether the gpu page of a gpu scraped from the gpus list page only needs to be requested today.
+    Every gpu is assigned to one day out of every detail_refresh_days days using a hash of its link.
+    :param gpu_link: the link of the gpu page.
+    :param detail_refresh_days: the number of days between two requests of the gpu page.
+    :return: a boolean indicating whether the gpu page needs to be requested.
+    """
+    if detail_refresh_days <= 1:
+        return True
+    today = int(time.time() // (24 * 3600))
+    return zlib.crc32(gpu_link.encode()) % detail_refresh_days == today % detail_refresh_days
@@ -0,0 +1,243 @@
+"""
+The metrics of the scrapers, per store: histograms of the fetch latency, of the parse time, of the extraction time of
+every field and of the size of the pages, and counters of the retries and of the fields which could not be extracted.
+The requests-based scraper (task1) writes them to a Prometheus text file, and the Scrapy spiders (task2 and task3)
+export them as Scrapy stats (see store_engine.spider).
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Optional, Sequence, Tuple
+
+
+BUCKETS = {
+    'fetch_seconds': (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+    'parse_seconds': (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+    'extract_seconds': (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05),
+    'response_bytes': (10000, 30000, 100000, 300000, 1000000, 3000000, 10000000),
+}
+DEFAULT_BUCKETS = (0.001, 0.01, 0.1, 1.0, 10.0)
+QUANTILES = (0.5, 0.95)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """
+    A class of a histogram with fixed buckets, as in Prometheus. A value is counted in the first bucket whose upper
+    bound is not less than it, or in the last (infinite) bucket.
+    """
+
+    def __init__(self, buckets: Sequence[float]):
+        """
+        The main constructor of the histogram.
+        :param buckets: the sorted upper bounds of the buckets.
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        """
+        A method to count a value.
+        :param value: the value.
+        :return: None.
+        """
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def get_quantile(self, quantile: float) -> float:
+        """
+        A method to estimate a quantile of the values, as the upper bound of the bucket which reaches it.
+        :param quantile: the quantile, between 0 and 1.
+        :return: the estimated quantile, which is the largest value for the last bucket (or 0 if there are no values).
+        """
+        rank = quantile * self.count
+        total = 0
+        for bucket, count in zip(self.buckets, self.counts):
+            total += count
+            if count and total >= rank:
+                return min(bucket, self.max)
+        return self.max
+
+
+class Metrics:
+    """
+    A class to collect the metrics of the scrapers. Every metric has a name and labels (e.g. the store and the field),
+    and it is either a histogram (see observe) or a counter (see inc). It can be shared by the threads of a scraper.
+    """
+
+    def __init__(self, buckets: Optional[Dict[str, Sequence[float]]] = None):
+        """
+        The main constructor of the metrics.
+        :param buckets: the buckets of the histograms by their names. The default is BUCKETS, and the histograms which
+        are not in it use DEFAULT_BUCKETS.
+        """
+        self.buckets = BUCKETS if buckets is None else buckets
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """
+        A method to count a value in a histogram.
+        :param name: the name of the histogram, e.g. 'fetch_seconds'.
+        :param value: the value.
+        :param labels: the labels of the histogram, e.g. store='OnlineTrade'.
+        :return: None.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets.get(name, DEFAULT_BUCKETS))
+            histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        """
+        A method to increase a counter.
+        :param name: the name of the counter, e.g. 'retries'.
+        :param value: the value to add.
+        :param labels: the labels of the counter, e.g. store='OnlineTrade'.
+        :return: None.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    @contextmanager
+    def timer(self, name: str, **labels: str):
+        """
+        A method to measure the time of a block of code (in seconds) in a histogram, e.g.
+        'with metrics.timer('parse_seconds', store='OnlineTrade'): ...'.
+        :param name: the name of the histogram.
+        :param labels: the labels of the histogram.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def get_summary(self) -> Dict[str, dict]:
+        """
+        A method to summarize the metrics.
+        :return: a dictionary from the metrics' names with their labels (e.g. 'fetch_seconds{page=gpu,store=Regard}')
+        to their summaries: the count, the sum, the average, the quantiles (QUANTILES) and the maximum of a histogram,
+        or the value of a counter.
+        """
+        summary = {}
+        with self.lock:
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                summary[format_name(name, labels)] = {
+                    'count': histogram.count, 'sum': histogram.sum,
+                    'avg': histogram.sum / histogram.count if histogram.count else 0.0,
+                    **{'p%d' % (100 * q): histogram.get_quantile(q) for q in QUANTILES}, 'max': histogram.max}
+            for (name, labels), value in sorted(self.counters.items()):
+                summary[format_name(name, labels)] = {'value': value}
+        return summary
+
+    def to_prometheus(self, prefix: str = 'gpu_scraper_') -> str:
+        """
+        A method to format the metrics in the Prometheus text format. The counters' names end with '_total'.
+        :param prefix: the prefix of the metrics' names.
+        :return: the text of the metrics.
+        """
+        lines = []
+        with self.lock:
+            names = sorted({name for name, _ in self.histograms})
+            for name in names:
+                lines.append('# TYPE %s%s histogram' % (prefix, name))
+                for (histogram_name, labels), histogram in sorted(self.histograms.items()):
+                    if histogram_name != name:
+                        continue
+                    total = 0
+                    for bucket, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                        total += count
+                        le = '+Inf' if bucket == float('inf') else repr(float(bucket))
+                        lines.append('%s%s_bucket%s %d' % (prefix, name, format_labels(labels + (('le', le),)), total))
+                    lines.append('%s%s_sum%s %r' % (prefix, name, format_labels(labels), histogram.sum))
+                    lines.append('%s%s_count%s %d' % (prefix, name, format_labels(labels), histogram.count))
+            names = sorted({name for name, _ in self.counters})
+            for name in names:
+                lines.append('# TYPE %s%s_total counter' % (prefix, name))
+                for (counter_name, labels), value in sorted(self.counters.items()):
+                    if counter_name == name:
+                        lines.append('%s%s_total%s %r' % (prefix, name, format_labels(labels), value))
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: str, prefix: str = 'gpu_scraper_') -> None:
+        """
+        A method to write the metrics to a Prometheus text file, e.g. to be read by the textfile collector of the node
+        exporter. The file is replaced at once, so it is never read half written.
+        :param path: the path of the file.
+        :param prefix: the prefix of the metrics' names.
+        :return: None.
+        """
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as metrics_file:
+            metrics_file.write(self.to_prometheus(prefix))
+        os.replace(temp_path, path)
+
+    def to_stats(self, stats, prefix: str = 'metrics') -> None:
+        """
+        A method to export the summary of the metrics (see get_summary) as Scrapy stats, e.g.
+        'metrics/OnlineTrade/fetch_seconds/gpu/p95'. The label values follow the store in the keys.
+        :param stats: the stats collector of the crawler.
+        :param prefix: the prefix of the stats' keys.
+        :return: None.
+        """
+        with self.lock:
+            histograms = list(self.histograms.items())
+            counters = list(self.counters.items())
+        for (name, labels), histogram in histograms:
+            key = get_stats_key(prefix, name, labels)
+            stats.set_value(key + '/count', histogram.count)
+            stats.set_value(key + '/avg', round(histogram.sum / histogram.count, 6) if histogram.count else 0.0)
+            for quantile in QUANTILES:
+                stats.set_value(key + '/p%d' % (100 * quantile), round(histogram.get_quantile(quantile), 6))
+            stats.set_value(key + '/max', round(histogram.max, 6))
+        for (name, labels), value in counters:
+            stats.set_value(get_stats_key(prefix, name, labels), value)
+
+
+def format_name(name: str, labels: Labels) -> str:
+    """
+    A method to format the name of a metric with its labels, e.g. 'fetch_seconds{page=gpu,store=Regard}'.
+    :param name: the name of the metric.
+    :param labels: the labels of the metric.
+    :return: the formatted name.
+    """
+    return name + ('{%s}' % ','.join('%s=%s' % label for label in labels) if labels else '')
+
+
+def format_labels(labels: Labels) -> str:
+    """
+    A method to format the labels of a metric in the Prometheus text format, e.g. '{page="gpu",store="Regard"}'.
+    :param labels: the labels of the metric.
+    :return: the formatted labels.
+    """
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{%s}' % ','.join('%s="%s"' % (key, value) for (key, _), value in zip(labels, escaped))
+
+
+def get_stats_key(prefix: str, name: str, labels: Labels) -> str:
+    """
+    A method to get the Scrapy stats key of a metric: the prefix, the store, the name and the other labels' values.
+    :param prefix: the prefix of the key.
+    :param name: the name of the metric.
+    :param labels: the labels of the metric.
+    :return: the key, e.g. 'metrics/OnlineTrade/extract_seconds/gpu_price'.
+    """
+    labels = dict(labels)
+    store = labels.pop('store', None)
+    parts = [prefix] + ([store] if store is not None else []) + [name] + [labels[key] for key in sorted(labels)]
+    return '/'.join(parts)
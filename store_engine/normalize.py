@@ -0,0 +1,207 @@
+"""
+The normalization of the scraped gpus in batches. Instead of cleaning the fields of every gpu as soon as it is scraped,
+a scraper can deliver the raw texts of its name, price and availability (a RawRow) and leave their cleaning to this
+stage, which cleans a whole batch (a gpus list page, or a part of a run) at once. With pandas, every field of the batch
+is cleaned by a few string operations over its column (see normalize_columns): the non-break spaces are replaced, the
+names are cut at their first parenthesis and their non-ascii words are dropped, the prices are reduced to their digits
+and checked as int64, and the availability strings are compared with OUT_OF_STOCK. Without pandas, or for batches too
+small for the overhead of pandas to pay off, the gpus are cleaned one by one by store_engine.extract, with the same
+results (see normalize_row).
+
+pandas is an optional dependency ('pip install pandas').
+"""
+import time
+from typing import Iterable, Iterator, List
+
+from store_engine import extract
+from store_engine.extract import NON_BREAK_SPACE, OUT_OF_STOCK
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+MIN_VECTORIZED_ROWS = 64
+NAME_SUFFIX_PATTERN = r' [(\[][\s\S]*'
+NON_ASCII_WORD_PATTERN = r'\S*[^\x00-\x7f]\S*'
+TRAILING_NON_DIGITS_PATTERN = r'\D+$'
+
+
+class RawRow(dict):
+    """
+    A class of a scraped gpu whose fields are not normalized yet: its 'gpu_name', 'gpu_price' and 'in_stock' are the
+    texts found by the selectors (or None when the selector did not match), and its 'gpu_model' may still contain
+    non-break spaces. The other rows (e.g. the reused rows of a previous run) are already normalized, and they are left
+    as they are.
+    """
+
+
+def normalize_row(row: RawRow, ascii_only: bool = False) -> dict:
+    """
+    A method to normalize a raw gpu by itself.
+    :param row: the raw gpu's data.
+    :param ascii_only: a boolean indicating whether to keep only the ascii words of the gpu's name.
+    :return: the normalized gpu's data (COLUMNS): an empty price if its text does not contain a price, and not in stock
+    if its availability was not found.
+    """
+    gpu_model, gpu_name, gpu_price, in_stock = (row.get(field) for field in ('gpu_model', 'gpu_name', 'gpu_price',
+                                                                             'in_stock'))
+    try:
+        gpu_price = extract.fix_price(gpu_price)
+    except (TypeError, AttributeError, ValueError):
+        gpu_price = ''
+    return {
+        **row,
+        'gpu_model': None if gpu_model is None else extract.fix_text(gpu_model),
+        'gpu_name': '' if gpu_name is None else extract.fix_gpu_name(gpu_name, ascii_only).strip(),
+        'gpu_price': gpu_price,
+        'in_stock': in_stock is not None and extract.is_in_stock(in_stock),
+    }
+
+
+def normalize_columns(gpu_models: list, gpu_names: list, gpu_prices: list, in_stock: list,
+                      ascii_only: bool = False) -> tuple:
+    """
+    A method to normalize the fields of a batch of raw gpus as columns, with pandas.
+    :param gpu_models: the model strings of the gpus (or None).
+    :param gpu_names: the name texts of the gpus (or None).
+    :param gpu_prices: the price texts of the gpus (or None).
+    :param in_stock: the availability texts of the gpus (or None).
+    :param ascii_only: a boolean indicating whether to keep only the ascii words of the gpus' names.
+    :return: the lists of the normalized models, names, prices and availabilities, as in normalize_row.
+    """
+    models = pandas.Series(gpu_models, dtype=object)
+    models = models.where(models.isna(), models.str.replace(NON_BREAK_SPACE, ' ', regex=False))
+
+    names = pandas.Series(gpu_names, dtype=object).fillna('').astype(str)
+    names = names.str.replace(NON_BREAK_SPACE, ' ', regex=False).str.replace(NAME_SUFFIX_PATTERN, '', regex=True)
+    if ascii_only:
+        names = names.str.replace(NON_ASCII_WORD_PATTERN, ' ', regex=True).str.replace(r'\s+', ' ', regex=True)
+    names = names.str.strip()
+
+    prices = pandas.Series(gpu_prices, dtype=object).fillna('').astype(str)
+    prices = prices.str.replace(NON_BREAK_SPACE, '', regex=False).str.replace(' ', '', regex=False)
+    prices = prices.str.replace(TRAILING_NON_DIGITS_PATTERN, '', regex=True)
+    values = pandas.to_numeric(prices.where(prices.str.fullmatch(r'\d+')), errors='coerce').astype('Int64')
+    prices = prices.where(values.fillna(0).ne(0).to_numpy(), '')
+
+    stock = pandas.Series(in_stock, dtype=object)
+    stock_texts = stock.fillna('').astype(str).str.replace(NON_BREAK_SPACE, ' ', regex=False).str.strip()
+    stock = stock.notna() & stock_texts.ne(OUT_OF_STOCK)
+
+    return (models.tolist(), names.tolist(), prices.tolist(), stock.astype(bool).tolist())
+
+
+def normalize_rows(rows: List[dict], ascii_only: bool = False) -> List[dict]:
+    """
+    A method to normalize a batch of gpus. The raw gpus (RawRow) are normalized together, and the other rows are
+    returned as they are, in the same order.
+    :param rows: the gpus' data.
+    :param ascii_only: a boolean indicating whether to keep only the ascii words of the gpus' names.
+    :return: the normalized gpus' data.
+    """
+    raw_indices = [index for index, row in enumerate(rows) if isinstance(row, RawRow)]
+    if not raw_indices:
+        return rows
+    rows = list(rows)
+    if pandas is None or len(raw_indices) < MIN_VECTORIZED_ROWS:
+        for index in raw_indices:
+            rows[index] = normalize_row(rows[index], ascii_only)
+        return rows
+    raw_rows = [rows[index] for index in raw_indices]
+    columns = normalize_columns(*([row.get(field) for row in raw_rows] for field in ('gpu_model', 'gpu_name',
+                                                                                     'gpu_price', 'in_stock')),
+                                ascii_only=ascii_only)
+    for index, row, gpu_model, gpu_name, gpu_price, in_stock in zip(raw_indices, raw_rows, *columns):
+        rows[index] = {**row, 'gpu_model': gpu_model, 'gpu_name': gpu_name, 'gpu_price': gpu_price,
+                       'in_stock': in_stock}
+    return rows
+
+
+def normalize_batches(rows: Iterable[dict], batch_size: int = 1000, ascii_only: bool = False) -> Iterator[dict]:
+    """
+    A method to normalize gpus as they come, batch_size gpus at once (see normalize_rows).
+    :param rows: the gpus' data.
+    :param batch_size: the number of gpus normalized at once.
+    :param ascii_only: a boolean indicating whether to keep only the ascii words of the gpus' names.
+    :return: an iterator over the normalized gpus' data, in the same order.
+    """
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield from normalize_rows(batch, ascii_only)
+            batch = []
+    yield from normalize_rows(batch, ascii_only)
+
+
+class NormalizePipeline:
+    """
+    A Scrapy item pipeline which normalizes the raw items of the spider (see store_engine.spider) in batches. An item is
+    held (its Deferred is not fired) until NORMALIZE_BATCH_SIZE items are buffered or it waited NORMALIZE_MAX_DELAY
+    seconds, and then the buffered items are normalized together and passed on to the next pipelines. It is enabled
+    when NORMALIZE_BATCH_SIZE is more than zero, in which case the spider delivers raw items. The prices which could not
+    be found are counted in the spider's metrics, like in its own normalization.
+    """
+
+    def __init__(self, batch_size: int = 1000, max_delay: float = 0.1):
+        """
+        The main constructor of the pipeline.
+        :param batch_size: the maximum number of items normalized at once.
+        :param max_delay: the maximum time in seconds an item is held. The items must not be held long: Scrapy keeps
+        their responses in memory until then, and it stops downloading when they are too many.
+        """
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.batch = []
+        self.flush_call = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        from scrapy.exceptions import NotConfigured
+
+        batch_size = crawler.settings.getint('NORMALIZE_BATCH_SIZE', 0)
+        if batch_size <= 0:
+            raise NotConfigured('NORMALIZE_BATCH_SIZE is not set')
+        return cls(batch_size, crawler.settings.getfloat('NORMALIZE_MAX_DELAY', 0.1))
+
+    def process_item(self, item, spider):
+        if not isinstance(item, RawRow):
+            return item
+        from twisted.internet import defer, reactor
+
+        deferred = defer.Deferred()
+        self.batch.append((item, deferred))
+        if len(self.batch) >= self.batch_size:
+            self.flush(spider)
+        elif self.flush_call is None:
+            self.flush_call = reactor.callLater(self.max_delay, self.flush, spider)
+        return deferred
+
+    def flush(self, spider) -> None:
+        """
+        A method to normalize the buffered items and pass them on.
+        :param spider: the spider.
+        :return: None.
+        """
+        if self.flush_call is not None and self.flush_call.active():
+            self.flush_call.cancel()
+        self.flush_call = None
+        batch, self.batch = self.batch, []
+        if not batch:
+            return
+        start = time.perf_counter()
+        items = normalize_rows([item for item, _ in batch])
+        spider.crawler.stats.inc_value('normalize/batches')
+        spider.crawler.stats.max_value('normalize/max_batch_size', len(batch))
+        spider.crawler.stats.inc_value('normalize/seconds', time.perf_counter() - start)
+        for item, (raw_item, deferred) in zip(items, batch):
+            if not item['gpu_price']:
+                spider.metrics.inc('field_failures', store=item['store_name'], field='gpu_price')
+            if raw_item.get('in_stock') is None:
+                spider.metrics.inc('field_failures', store=item['store_name'], field='in_stock')
+            deferred.callback(item)
+
+    def close_spider(self, spider):
+        self.flush(spider)
+
@@ -0,0 +1,232 @@
+"""
+A typed, columnar output of the scrapers: the gpus are written to a Parquet dataset partitioned by store and scrape
+date ('<root_dir>/store_name=<store>/scrape_date=<date>/*.parquet'), in batches, with gpu_price as an integer, fetch_ts
+as a timestamp and in_stock as a boolean. The scrape date is the date of the run, so the gpus whose previous data an
+incremental run reused (with their original fetch_ts) are in the partition of the run too. A query of the price history
+of a store or a period only reads the files of its partitions (see read_price_history).
+
+It needs pyarrow, which is an optional dependency ('pip install pyarrow').
+"""
+import datetime
+import time
+import uuid
+from typing import Iterable, List, Optional
+
+try:
+    import pyarrow
+    import pyarrow.dataset
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+PARTITION_COLUMNS = ['store_name', 'scrape_date']
+
+
+def get_schema():
+    """
+    A method to get the Arrow schema of the gpus.
+    :return: the schema.
+    """
+    check_pyarrow()
+    return pyarrow.schema([
+        ('store_name', pyarrow.string()),
+        ('scrape_date', pyarrow.string()),
+        ('gpu_model', pyarrow.string()),
+        ('gpu_name', pyarrow.string()),
+        ('fetch_ts', pyarrow.timestamp('s', tz='UTC')),
+        ('gpu_price', pyarrow.int64()),
+        ('in_stock', pyarrow.bool_()),
+        ('url', pyarrow.string()),
+    ])
+
+
+def check_pyarrow() -> None:
+    """
+    A method to check that pyarrow is installed.
+    :return: None.
+    :raises ImportError: if pyarrow is not installed.
+    """
+    if pyarrow is None:
+        raise ImportError('The Parquet output needs pyarrow (pip install pyarrow)')
+
+
+def get_scrape_date(timestamp: Optional[float] = None) -> str:
+    """
+    A method to get the scrape date of a timestamp.
+    :param timestamp: the timestamp. The default is the current time.
+    :return: the UTC date of the timestamp ('YYYY-MM-DD').
+    """
+    timestamp = time.time() if timestamp is None else timestamp
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).date().isoformat()
+
+
+def to_record(row: dict, scrape_date: Optional[str] = None) -> dict:
+    """
+    A method to convert a scraped gpu (whose values may be strings, e.g. when it is read from a csv file) to the types
+    of the schema. An empty or invalid price becomes null.
+    :param row: the gpu's data (COLUMNS).
+    :param scrape_date: the scrape date of the run ('YYYY-MM-DD'). The default is the UTC date of the gpu's fetch_ts.
+    :return: the typed gpu's data, with its scrape date.
+    """
+    fetch_ts = datetime.datetime.fromtimestamp(int(row['fetch_ts']), datetime.timezone.utc)
+    gpu_price = str(row.get('gpu_price') or '')
+    in_stock = row.get('in_stock')
+    if isinstance(in_stock, str):
+        in_stock = in_stock.lower() == 'true'
+    return {
+        'store_name': row['store_name'],
+        'scrape_date': fetch_ts.date().isoformat() if scrape_date is None else scrape_date,
+        'gpu_model': row.get('gpu_model') or None,
+        'gpu_name': row.get('gpu_name') or None,
+        'fetch_ts': fetch_ts,
+        'gpu_price': int(gpu_price) if gpu_price.isdigit() else None,
+        'in_stock': bool(in_stock),
+        'url': row.get('url'),
+    }
+
+
+class ParquetWriter:
+    """
+    A class to write scraped gpus to a Parquet dataset partitioned by store and scrape date. All the gpus of a run are
+    written with the same scrape date, whatever their fetch_ts. The gpus are kept in memory until a batch is full, and
+    every batch is written to new files (one per partition), so the files of the previous runs are kept.
+    """
+
+    def __init__(self, root_dir: str, batch_size: int = 1000, scrape_date: Optional[str] = None):
+        """
+        The main constructor of the writer.
+        :param root_dir: the directory of the dataset.
+        :param batch_size: the number of gpus written at once.
+        :param scrape_date: the scrape date of the run ('YYYY-MM-DD'). The default is the UTC date when the writer is
+        created, i.e. when the run starts.
+        :raises ImportError: if pyarrow is not installed.
+        """
+        self.schema = get_schema()
+        self.root_dir = root_dir
+        self.batch_size = batch_size
+        self.scrape_date = get_scrape_date() if scrape_date is None else scrape_date
+        self.batch: List[dict] = []
+        self.num_rows = 0
+        self.run_id = uuid.uuid4().hex
+        self.num_batches = 0
+
+    def write(self, row: dict) -> None:
+        """
+        A method to write one gpu.
+        :param row: the gpu's data (COLUMNS).
+        :return: None.
+        """
+        self.batch.append(to_record(row, self.scrape_date))
+        self.num_rows += 1
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def write_all(self, rows: Iterable[dict]) -> int:
+        """
+        A method to write gpus as they come.
+        :param rows: the gpus to write.
+        :return: the number of gpus written.
+        """
+        num_rows = self.num_rows
+        for row in rows:
+            self.write(row)
+        return self.num_rows - num_rows
+
+    def flush(self) -> None:
+        """
+        A method to write the current batch to the dataset.
+        :return: None.
+        """
+        if not self.batch:
+            return
+        table = pyarrow.Table.from_pylist(self.batch, schema=self.schema)
+        pyarrow.parquet.write_to_dataset(table, self.root_dir, partition_cols=PARTITION_COLUMNS,
+                                         basename_template='%s-%d-{i}.parquet' % (self.run_id, self.num_batches),
+                                         existing_data_behavior='overwrite_or_ignore')
+        self.num_batches += 1
+        self.batch = []
+
+    def close(self) -> None:
+        """
+        A method to write the last batch.
+        :return: None.
+        """
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def read_price_history(root_dir: str, store_name: Optional[str] = None, start_date: Optional[str] = None,
+                       end_date: Optional[str] = None, gpu_model: Optional[str] = None,
+                       columns: Optional[List[str]] = None):
+    """
+    A method to read the price history of the gpus from a Parquet dataset. The filters on the store and the dates
+    only read the files of the matching partitions.
+    :param root_dir: the directory of the dataset.
+    :param store_name: the name of the store, or None for all the stores.
+    :param start_date: the first scrape date ('YYYY-MM-DD'), or None.
+    :param end_date: the last scrape date ('YYYY-MM-DD'), or None.
+    :param gpu_model: the model of the gpus, or None for all the models.
+    :param columns: the columns to read. The default reads the store, the model, the link, fetch_ts, the price and the
+    availability.
+    :return: an Arrow table of the matching gpus.
+    """
+    check_pyarrow()
+    schema = get_schema()
+    partitioning = pyarrow.dataset.partitioning(
+        pyarrow.schema([schema.field(column) for column in PARTITION_COLUMNS]), flavor='hive')
+    dataset = pyarrow.dataset.dataset(root_dir, schema=schema, format='parquet', partitioning=partitioning)
+    field = pyarrow.dataset.field
+    conditions = []
+    if store_name is not None:
+        conditions.append(field('store_name') == store_name)
+    if start_date is not None:
+        conditions.append(field('scrape_date') >= start_date)
+    if end_date is not None:
+        conditions.append(field('scrape_date') <= end_date)
+    if gpu_model is not None:
+        conditions.append(field('gpu_model') == gpu_model)
+    condition = None
+    for new_condition in conditions:
+        condition = new_condition if condition is None else condition & new_condition
+    if columns is None:
+        columns = ['store_name', 'gpu_model', 'url', 'fetch_ts', 'gpu_price', 'in_stock']
+    return dataset.to_table(columns=columns, filter=condition)
+
+
+class ParquetPipeline:
+    """
+    A Scrapy item pipeline which writes the items to a Parquet dataset (see ParquetWriter). It is enabled by the
+    PARQUET_OUTPUT_DIR setting, e.g. 'scrapy crawl gpu_scraper -s PARQUET_OUTPUT_DIR=gpus', and its batch size is the
+    PARQUET_BATCH_SIZE setting.
+    """
+
+    def __init__(self, root_dir: str, batch_size: int = 1000):
+        """
+        The main constructor of the pipeline.
+        :param root_dir: the directory of the dataset.
+        :param batch_size: the number of items written at once.
+        """
+        self.writer = ParquetWriter(root_dir, batch_size)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        from scrapy.exceptions import NotConfigured
+
+        root_dir = crawler.settings.get('PARQUET_OUTPUT_DIR')
+        if not root_dir:
+            raise NotConfigured('PARQUET_OUTPUT_DIR is not set')
+        if pyarrow is None:
+            raise NotConfigured('The Parquet output needs pyarrow (pip install pyarrow)')
+        return cls(root_dir, crawler.settings.getint('PARQUET_BATCH_SIZE', 1000))
+
+    def process_item(self, item, spider):
+        self.writer.write(dict(item))
+        return item
+
+    def close_spider(self, spider):
+        self.writer.close()
@@ -0,0 +1,289 @@
+"""
+A record/replay stand-in of the stores' sites, to run the scrapers offline (e.g. for benchmarks, see
+store_engine.bench). The server serves the link 'https://<host>/<path>' of a store at 'http://<server>/<host>/<path>',
+from a fixture directory of saved pages. In recording mode, a page which is not saved yet is requested from the real
+site and saved, so that a first run of a scraper over the server records the pages it needs.
+
+To record the pages of the stores (while running a scraper over the server, see replay_store):
+    $ python -m store_engine.replay ./fixtures --record
+To serve them back with a latency of 50-150 ms and 5% of failed responses:
+    $ python -m store_engine.replay ./fixtures --latency 0.05 --jitter 0.1 --error-rate 0.05
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from urllib.parse import urlsplit
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 6.1; Win64; x64; rv:47.0) Gecko/20100101 Firefox/47.3'
+
+
+def replay_link(link: str, server_url: str) -> str:
+    """
+    A method to get the link of a page on the replay server.
+    :param link: the link of the page on the store's site, e.g. 'https://www.regard.ru/catalog/?page=1'.
+    :param server_url: the link of the replay server, e.g. 'http://127.0.0.1:8765'.
+    :return: the link of the page on the replay server, e.g. 'http://127.0.0.1:8765/www.regard.ru/catalog/?page=1'.
+    """
+    parts = urlsplit(link)
+    path = parts.path + ('?' + parts.query if parts.query else '')
+    return server_url.rstrip('/') + '/' + parts.netloc + path
+
+
+def replay_store(store: dict, server_url: str) -> dict:
+    """
+    A method to get the configuration of a store whose pages are requested from the replay server. The gpus' links
+    are made of base_link and the relative links of the gpus list page, so they are on the server too.
+    :param store: the store's configuration (see store_engine.get_store_config).
+    :param server_url: the link of the replay server.
+    :return: a copy of the store's configuration with the links of the replay server.
+    """
+    return {**store, 'base_link': replay_link(store['base_link'], server_url),
+            'gpu_page_link': replay_link(store['gpu_page_link'], server_url)}
+
+
+class FixtureStore:
+    """
+    A class to save the pages of the stores in a fixture directory and to read them back. Every page is saved in
+    '<fixture_dir>/<host>/<hash of the path>.body' with its status and content type in a '.json' file next to it.
+    """
+
+    def __init__(self, fixture_dir: str):
+        """
+        The main constructor of the class.
+        :param fixture_dir: the directory of the saved pages.
+        """
+        self.fixture_dir = fixture_dir
+
+    def get_path(self, host: str, path: str) -> str:
+        """
+        A method to get the path (without extension) of the saved page of a link.
+        :param host: the host of the link.
+        :param path: the path of the link (with its query).
+        :return: the path of the saved page.
+        """
+        key = hashlib.sha1(path.encode()).hexdigest()
+        return os.path.join(self.fixture_dir, host.replace(':', '_'), key)
+
+    def get(self, host: str, path: str) -> Optional[Tuple[int, str, bytes]]:
+        """
+        A method to read a saved page.
+        :param host: the host of the link.
+        :param path: the path of the link (with its query).
+        :return: the status, the content type and the content of the page, or None if it is not saved.
+        """
+        page_path = self.get_path(host, path)
+        try:
+            with open(page_path + '.json', encoding='utf-8') as meta_file:
+                meta = json.load(meta_file)
+            with open(page_path + '.body', 'rb') as body_file:
+                return meta['status'], meta['content_type'], body_file.read()
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, host: str, path: str, status: int, content_type: str, body: bytes) -> None:
+        """
+        A method to save a page. The content is written before its metadata, so that a page is never read half saved.
+        :param host: the host of the link.
+        :param path: the path of the link (with its query).
+        :param status: the status of the response.
+        :param content_type: the content type of the response.
+        :param body: the content of the response.
+        :return: None.
+        """
+        page_path = self.get_path(host, path)
+        os.makedirs(os.path.dirname(page_path), exist_ok=True)
+        with open(page_path + '.body', 'wb') as body_file:
+            body_file.write(body)
+        meta = {'url': host + path, 'status': status, 'content_type': content_type, 'saved_at': round(time.time())}
+        with open(page_path + '.json', 'w', encoding='utf-8') as meta_file:
+            json.dump(meta, meta_file, ensure_ascii=False)
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """
+    A class to handle a request of the replay server (see ReplayServer).
+    """
+
+    server: 'ReplayServer'
+
+    def do_GET(self):
+        """
+        A method to serve a page from the fixtures (or from the real site in recording mode), after the configured
+        latency. A part of the requests gets a '503 Service Unavailable' response instead (the error rate).
+        """
+        server = self.server
+        latency = server.latency + random.uniform(0, server.jitter)
+        if latency > 0:
+            time.sleep(latency)
+        if random.random() < server.error_rate:
+            server.count_request(0, error=True)
+            self.send_page(503, 'text/plain', b'Injected error')
+            return
+        host, _, path = self.path.lstrip('/').partition('/')
+        path = '/' + path
+        page = server.fixtures.get(host, path)
+        if page is None and server.record:
+            page = server.fetch(host, path)
+        if page is None:
+            server.count_request(0, missing=True)
+            self.send_page(404, 'text/plain', b'Not recorded')
+            return
+        status, content_type, body = page
+        server.count_request(len(body))
+        self.send_page(status, content_type, body)
+
+    def send_page(self, status: int, content_type: str, body: bytes) -> None:
+        """
+        A method to send a response.
+        :param status: the status of the response.
+        :param content_type: the content type of the response.
+        :param body: the content of the response.
+        :return: None.
+        """
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """
+    A class of the replay server. It counts the requests it serves, to measure the scrapers (see store_engine.bench).
+    """
+
+    daemon_threads = True
+
+    def __init__(self, fixture_dir: str, host: str = '127.0.0.1', port: int = 0, record: bool = False,
+                 upstream_scheme: str = 'https', latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 verbose: bool = False):
+        """
+        The main constructor of the server.
+        :param fixture_dir: the directory of the saved pages (see FixtureStore).
+        :param host: the address to listen on.
+        :param port: the port to listen on, 0 for any free port.
+        :param record: a boolean indicating whether the pages which are not saved are requested from the real sites
+        and saved.
+        :param upstream_scheme: the scheme of the real sites' links in recording mode.
+        :param latency: the minimum time in seconds before a response is sent.
+        :param jitter: the maximum random time in seconds added to the latency.
+        :param error_rate: the probability that a request gets a '503 Service Unavailable' response.
+        :param verbose: a boolean indicating whether every request is logged.
+        """
+        super().__init__((host, port), ReplayHandler)
+        self.fixtures = FixtureStore(fixture_dir)
+        self.record = record
+        self.upstream_scheme = upstream_scheme
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.num_requests = 0
+        self.num_bytes = 0
+        self.num_errors = 0
+        self.num_missing = 0
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        """
+        :return: the link of the server.
+        """
+        host, port = self.server_address[:2]
+        return 'http://%s:%d' % (host, port)
+
+    def count_request(self, num_bytes: int, error: bool = False, missing: bool = False) -> None:
+        """
+        A method to count a served request.
+        :param num_bytes: the size of the sent content.
+        :param error: a boolean indicating whether an error was injected.
+        :param missing: a boolean indicating whether the page was not saved.
+        :return: None.
+        """
+        with self.lock:
+            self.num_requests += 1
+            self.num_bytes += num_bytes
+            self.num_errors += error
+            self.num_missing += missing
+
+    def reset_counts(self) -> None:
+        """
+        A method to reset the counts of the served requests.
+        :return: None.
+        """
+        with self.lock:
+            self.num_requests = self.num_bytes = self.num_errors = self.num_missing = 0
+
+    def fetch(self, host: str, path: str) -> Optional[Tuple[int, str, bytes]]:
+        """
+        A method to request a page from the real site and save it (in recording mode). Only successful responses are
+        saved.
+        :param host: the host of the link.
+        :param path: the path of the link (with its query).
+        :return: the status, the content type and the content of the page, or None if it could not be requested.
+        """
+        request = urllib.request.Request('%s://%s%s' % (self.upstream_scheme, host, path),
+                                         headers={'User-Agent': USER_AGENT})
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                page = response.status, response.headers.get('Content-Type', 'text/html'), response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers.get('Content-Type', 'text/html'), e.read()
+        except Exception as e:
+            print('Error while recording %s%s:' % (host, path), e)
+            return None
+        self.fixtures.put(host, path, *page)
+        return page
+
+    def start(self) -> 'ReplayServer':
+        """
+        A method to serve in a background thread.
+        :return: the server.
+        """
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        """
+        A method to stop serving and close the server.
+        :return: None.
+        """
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Serve saved pages of the stores, or record them.')
+    arg_parser.add_argument('fixture_dir', help='the directory of the saved pages.')
+    arg_parser.add_argument('--host', default='127.0.0.1')
+    arg_parser.add_argument('--port', type=int, default=8765)
+    arg_parser.add_argument('--record', action='store_true', help='request and save the pages which are not saved.')
+    arg_parser.add_argument('--upstream-scheme', default='https')
+    arg_parser.add_argument('--latency', type=float, default=0.0, help='the minimum latency in seconds.')
+    arg_parser.add_argument('--jitter', type=float, default=0.0, help='the maximum random latency added in seconds.')
+    arg_parser.add_argument('--error-rate', type=float, default=0.0, help='the probability of a 503 response.')
+    args = arg_parser.parse_args()
+
+    server = ReplayServer(args.fixture_dir, args.host, args.port, args.record, args.upstream_scheme, args.latency,
+                          args.jitter, args.error_rate, verbose=True)
+    print('Serving %s at %s' % (args.fixture_dir, server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
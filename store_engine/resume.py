@@ -0,0 +1,39 @@
+import shutil
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+
+class FinishedJobCleaner:
+    """
+    A Scrapy extension to remove the directory of a persisted crawl (the JOBDIR setting) once the crawl finished, so
+    that the next crawl with the same JOBDIR starts from the beginning, while a crawl which was stopped (e.g. with
+    Ctrl-C, or closed because of an error) is resumed by the next one. It is enabled by the JOBDIR_CLEAR_FINISHED
+    setting.
+    """
+
+    def __init__(self, job_dir: str):
+        """
+        The main constructor of the extension.
+        :param job_dir: the directory of the persisted crawl.
+        """
+        self.job_dir = job_dir
+        self.finished = False
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        job_dir = crawler.settings.get('JOBDIR')
+        if not job_dir or not crawler.settings.getbool('JOBDIR_CLEAR_FINISHED'):
+            raise NotConfigured
+        extension = cls(job_dir)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(extension.engine_stopped, signal=signals.engine_stopped)
+        return extension
+
+    def spider_closed(self, spider, reason):
+        self.finished = reason == 'finished'
+
+    def engine_stopped(self):
+        # The directory is removed after the scheduler and the spider's state were saved in it.
+        if self.finished:
+            shutil.rmtree(self.job_dir, ignore_errors=True)
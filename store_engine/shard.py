@@ -0,0 +1,232 @@
+"""
+A sharded launcher of the Scrapy spiders, to use all the cores of the machine (the parsing of a Scrapy crawl runs on a
+single core). The work is split by store and, within a store, by gpus list pages: shard i of n scrapes the pages whose
+number minus the first page's number is i modulo n (see the spider's 'shard' argument). Every shard is a crawl in its
+own process (with its own reactor) which writes its items to its own file, and the files are merged into one output
+where every gpu appears once (its latest row). For task3, every shard can use its own tor endpoint. The shards of a
+store share its throughput profile (see store_engine.throttle), so splitting a store does not make it scraped faster
+than its profile allows; the split helps when the parsing, rather than the store, limits the crawl.
+
+To run task3 with two shards per store on four processes, each shard over one of the proxies of proxies.json (a list
+of TOR_PROXIES entries):
+    $ python -m store_engine.shard task3 --shards-per-store 2 --processes 4 --tor-proxies proxies.json -o output.csv
+"""
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from store_engine.config import load_stores
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRAPY_PROJECTS = {
+    'task2': os.path.join(ROOT_DIR, 'task2', 'scrapy_scraper'),
+    'task3': os.path.join(ROOT_DIR, 'task3', 'scrapy_tor'),
+}
+COLUMNS = ['store_name', 'gpu_model', 'gpu_name', 'fetch_ts', 'gpu_price', 'in_stock', 'url']
+
+
+def make_shards(store_names: List[str], shards_per_store: int, spider_kwargs: Optional[Dict[str, str]] = None,
+                settings: Optional[dict] = None, tor_proxies: Optional[List[dict]] = None) -> List[dict]:
+    """
+    A method to split a crawl into shards.
+    :param store_names: the names of the stores.
+    :param shards_per_store: the number of shards of the gpus list pages of every store.
+    :param spider_kwargs: the arguments of the spider, shared by the shards.
+    :param settings: the settings of the crawl, shared by the shards.
+    :param tor_proxies: the tor endpoints (TOR_PROXIES entries). The shards use them in turn, one endpoint each.
+    :return: the specifications of the shards: the arguments of their spiders and their settings. Every shard has its
+    own JOBDIR (if the crawl is persisted) and HTTPCACHE_DIR, and the share of its store's throughput profile.
+    """
+    shards = []
+    for store_name in store_names:
+        for shard_index in range(shards_per_store):
+            shard_settings = dict(settings or {})
+            if tor_proxies:
+                shard_settings['TOR_PROXIES'] = [tor_proxies[len(shards) % len(tor_proxies)]]
+            if shard_settings.get('JOBDIR'):
+                shard_settings['JOBDIR'] = os.path.join(shard_settings['JOBDIR'], 'shard-%d' % len(shards))
+            shard_settings['HTTPCACHE_DIR'] = os.path.join(shard_settings.get('HTTPCACHE_DIR') or 'httpcache',
+                                                           'shard-%d' % len(shards))
+            shard_settings['STORE_THROTTLE_SHARDS'] = shards_per_store
+            # The price history needs all the gpus of a store at once, so it is recorded after the merge.
+            shard_settings['HISTORY_DB'] = None
+            shards.append({
+                'spider_kwargs': {**(spider_kwargs or {}), 'store_names': store_name,
+                                  'shard': '%d/%d' % (shard_index, shards_per_store)},
+                'settings': shard_settings,
+            })
+    return shards
+
+
+def run_shard(project: str, shard: dict, output: str) -> int:
+    """
+    A method to run a shard in its own process.
+    :param project: the name of the Scrapy project, one of SCRAPY_PROJECTS.
+    :param shard: the specification of the shard (see make_shards).
+    :param output: the path of the shard's output file (JSON lines).
+    :return: the exit code of the process.
+    """
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [ROOT_DIR, os.environ.get('PYTHONPATH')]))}
+    command = [sys.executable, '-m', 'store_engine.shard', '--run-shard', json.dumps({**shard, 'output': output})]
+    return subprocess.call(command, cwd=SCRAPY_PROJECTS[project], env=env)
+
+
+def run_worker(shard: dict) -> None:
+    """
+    A method to run the crawl of a shard in the current process, which runs in the directory of the Scrapy project.
+    :param shard: the specification of the shard, with the path of its output file.
+    :return: None.
+    """
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
+
+    settings = get_project_settings()
+    settings.setdict(shard['settings'], priority='cmdline')
+    settings.set('FEEDS', {shard['output']: {'format': 'jsonlines', 'overwrite': not settings.get('JOBDIR')}},
+                 priority='cmdline')
+    process = CrawlerProcess(settings)
+    process.crawl('gpu_scraper', **shard['spider_kwargs'])
+    process.start()
+
+
+def read_items(paths: Iterable[str]) -> Iterable[dict]:
+    """
+    A method to read the items of the shards' output files.
+    :param paths: the paths of the files (JSON lines).
+    :return: an iterator over the items. A line which was not completely written is skipped.
+    """
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding='utf-8') as items_file:
+            for line in items_file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def merge_items(items: Iterable[dict]) -> List[dict]:
+    """
+    A method to merge the items of the shards, keeping the latest row (by fetch_ts) of every gpu.
+    :param items: the items.
+    :return: the merged items, in the order their gpus were first seen.
+    """
+    merged = {}
+    for item in items:
+        previous_item = merged.get(item['url'])
+        if previous_item is None or int(item['fetch_ts']) >= int(previous_item['fetch_ts']):
+            merged[item['url']] = item
+    return list(merged.values())
+
+
+def write_items(items: List[dict], path: str) -> None:
+    """
+    A method to write the merged items to a CSV or JSON lines file (found from the file's extension).
+    :param items: the items.
+    :param path: the path of the output file.
+    :return: None.
+    """
+    with open(path, 'w', newline='', encoding='utf-8') as output_file:
+        if path.endswith('.csv'):
+            writer = csv.DictWriter(output_file, fieldnames=COLUMNS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(items)
+        else:
+            for item in items:
+                output_file.write(json.dumps(item, ensure_ascii=False) + '\n')
+
+
+def record_history(items: List[dict], history_db: str, finished: bool) -> None:
+    """
+    A method to record the merged items in the price history. If a shard failed, the gpus which were not seen may still
+    be in the store, so the run is left open (see HistoryStore.suspend_run) and is continued by the next crawl.
+    :param items: the merged items.
+    :param history_db: the path of the price history database.
+    :param finished: a boolean indicating whether every shard finished.
+    :return: None.
+    """
+    from store_engine.history import HistoryStore, format_diff
+
+    with HistoryStore(history_db) as history:
+        for item in items:
+            history.record(item)
+        if finished:
+            print(format_diff(history.finish_run()))
+        else:
+            history.suspend_run()
+
+
+def parse_pairs(pairs: List[str]) -> dict:
+    """
+    A method to parse 'KEY=VALUE' arguments. A value which is valid JSON is decoded (e.g. numbers, lists).
+    :param pairs: the arguments.
+    :return: a dictionary of the arguments.
+    """
+    result = {}
+    for pair in pairs:
+        key, _, value = pair.partition('=')
+        try:
+            result[key] = json.loads(value)
+        except ValueError:
+            result[key] = value
+    return result
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Run a Scrapy spider in shards over many processes.')
+    arg_parser.add_argument('project', nargs='?', choices=list(SCRAPY_PROJECTS))
+    arg_parser.add_argument('-o', '--output', default='output.csv', help='the merged output (.csv or .jsonl).')
+    arg_parser.add_argument('--shards-per-store', type=int, default=1,
+                            help="the number of shards of every store, which share the store's throughput profile.")
+    arg_parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    arg_parser.add_argument('--stores', nargs='+', help='the names of the stores. The default is all the stores.')
+    arg_parser.add_argument('--tor-proxies', help='a JSON file of the tor endpoints (TOR_PROXIES entries).')
+    arg_parser.add_argument('--shards-dir',
+                            help="the directory of the shards' outputs. The default is temporary. It is required with "
+                                 "a JOBDIR, so that a resumed crawl appends to the outputs of the stopped one.")
+    arg_parser.add_argument('--history-db', help='record the merged output in this price history.')
+    arg_parser.add_argument('-a', dest='spider_kwargs', action='append', default=[], metavar='NAME=VALUE')
+    arg_parser.add_argument('-s', dest='settings', action='append', default=[], metavar='NAME=VALUE')
+    arg_parser.add_argument('--run-shard', help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.run_shard:
+        run_worker(json.loads(args.run_shard))
+        sys.exit()
+    if args.project is None:
+        arg_parser.error('the project argument is required')
+    settings = parse_pairs(args.settings)
+    if settings.get('JOBDIR') and not args.shards_dir:
+        arg_parser.error('--shards-dir is required with a JOBDIR (the outputs of a temporary directory are lost)')
+
+    tor_proxies = None
+    if args.tor_proxies:
+        with open(args.tor_proxies, encoding='utf-8') as proxies_file:
+            tor_proxies = json.load(proxies_file)
+    store_names = args.stores or [store['store_name'] for store in load_stores()]
+    shards = make_shards(store_names, args.shards_per_store, parse_pairs(args.spider_kwargs),
+                         settings, tor_proxies)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        shards_dir = os.path.abspath(args.shards_dir or temp_dir)
+        os.makedirs(shards_dir, exist_ok=True)
+        outputs = [os.path.join(shards_dir, 'shard-%d.jsonl' % i) for i in range(len(shards))]
+        with ThreadPoolExecutor(max_workers=args.processes) as executor:
+            exit_codes = list(executor.map(run_shard, [args.project] * len(shards), shards, outputs))
+        for shard, exit_code in zip(shards, exit_codes):
+            if exit_code:
+                print('Error while running the shard %s: exit code %d' % (shard['spider_kwargs'], exit_code))
+        items = merge_items(read_items(outputs))
+    write_items(items, args.output)
+    print('%d gpus from %d shards written to %s' % (len(items), len(shards), args.output))
+    finished = not any(exit_codes)
+    if args.history_db:
+        record_history(items, args.history_db, finished)
+    if not finished:
+        sys.exit(1)
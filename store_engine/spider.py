@@ -0,0 +1,370 @@
+import time
+from functools import lru_cache
+from typing import List, Optional
+from weakref import WeakKeyDictionary
+
+import scrapy
+from lxml import etree
+from scrapy import signals
+from scrapy.exceptions import StopDownload
+from store_engine import extract
+from store_engine.extract import fix_text, fix_gpu_name, get_last_page
+from store_engine.incremental import load_previous_data, get_previous_row, is_detail_refresh_due
+from store_engine.metrics import Metrics
+from store_engine.normalize import RawRow
+from store_engine.replay import replay_store
+from store_engine.stream import StreamParser, compile_stream_xpath
+from store_engine.urls import SeenSet, canonicalize_url, join_link
+
+
+@lru_cache(maxsize=None)
+def compile_xpath(query: str) -> etree.XPath:
+    """
+    A method to compile an XPath selector once, so that it is not parsed again for every page.
+    :param query: the XPath selector.
+    :return: the compiled selector.
+    """
+    return etree.XPath(query, smart_strings=False)
+
+
+def select(node, query: str) -> list:
+    """
+    A method to run an XPath selector on an element of a page.
+    :param node: the element, e.g. the root of a response (response.selector.root) or a gpu item in a gpus list page.
+    :param query: the XPath selector.
+    :return: the list of the matched elements or strings.
+    """
+    return compile_xpath(query)(node)
+
+
+def select_one(node, query: Optional[str]) -> Optional[str]:
+    """
+    A method to get the first match of an XPath selector on an element of a page.
+    :param node: the element.
+    :param query: the XPath selector, or None.
+    :return: the first matched element or string, or None if there is no match (or no selector).
+    """
+    if query is None:
+        return None
+    matches = select(node, query)
+    return matches[0] if matches else None
+
+
+class GpuSpider(scrapy.Spider):
+    """
+    The base spider of the stores, shared by the Scrapy projects. A project's spider only needs a name and its stores:
+    the stores' configurations with their 'xpath' and 'scrapy' sections (see store_engine.get_store_config). The
+    spider's metrics (see store_engine.metrics) are exported as stats when it is closed, e.g.
+    'metrics/OnlineTrade/fetch_seconds/gpu/p95' or 'metrics/Regard/field_failures/gpu_price'. When the NormalizePipeline
+    is enabled (the NORMALIZE_BATCH_SIZE setting), the spider delivers raw items (see store_engine.normalize) which the
+    pipeline normalizes in batches. With the STREAM_GPU_PAGES setting, the download of a gpu page is stopped as soon as
+    its fields were found (see store_engine.stream), and the page is not parsed again.
+    """
+
+    stores: List[dict] = []
+    raw_items = False
+    stream_gpu_pages = False
+    stream_fields = ('gpu_model_element', 'gpu_price_element', 'gpu_in_stock_element')
+    user_agent = 'Mozilla/5.0 (Windows NT 6.1; Win64; x64; rv:47.0) Gecko/20100101 Firefox/47.3'
+
+    def __init__(self, previous_output: Optional[str] = None, refresh_after: float = 24 * 3600,
+                 detail_refresh_days: int = 7, replay_server: Optional[str] = None, store_names: Optional[str] = None,
+                 shard: str = '0/1', *args, **kwargs):
+        """
+        The main constructor of the spider. Its arguments can be passed with '-a', e.g.
+        'scrapy crawl gpu_scraper -a previous_output=output.csv -O new_output.csv'.
+        :param previous_output: the path of the output csv file of a previous run. If it is given, the spider runs
+        incrementally: a gpu of the previous output is not requested again, unless its data is older than
+        refresh_after seconds, or its price in the gpus list page changed. Instead, its previous data is
+        delivered as it is (with the original fetch_ts).
+        :param refresh_after: the maximum age in seconds of a gpu's previous data before it is requested again.
+        :param detail_refresh_days: for the stores in listing-only mode, the gpu page of every gpu is still requested
+        once every detail_refresh_days days (the gpus are spread evenly over the days), to refresh its model.
+        :param replay_server: the link of a replay server (see store_engine.replay) to request the pages from instead
+        of the stores' sites, e.g. 'http://127.0.0.1:8765'.
+        :param store_names: the names of the stores to scrape, separated by commas. The default scrapes all the stores.
+        :param shard: the shard of the gpus list pages of every store which the spider scrapes, as 'index/count', e.g.
+        '1/4' scrapes the second page of every four (the pages whose number minus the first page's number is 1 modulo
+        4). It is used by the sharded launcher (see store_engine.shard). The default scrapes all the pages.
+        """
+        super().__init__(*args, **kwargs)
+        if store_names is not None:
+            names = store_names.split(',')
+            self.stores = [store for store in self.stores if store['store_name'] in names]
+        self.shard_index, self.shard_count = (int(part) for part in shard.split('/'))
+        if not 0 <= self.shard_index < self.shard_count:
+            raise ValueError('Invalid shard: %s' % shard)
+        if replay_server is not None:
+            self.stores = [replay_store(store, replay_server) for store in self.stores]
+        self.previous_data = None if previous_output is None else load_previous_data(previous_output)
+        self.refresh_after = float(refresh_after)
+        self.detail_refresh_days = int(detail_refresh_days)
+        self.scheduled_pages = {}
+        self.metrics = Metrics()
+        self.stream_parsers = WeakKeyDictionary()
+        self.seen_links = SeenSet()
+        for store in self.stores:
+            for key, query in store.items():
+                if key.endswith('_element') and query is not None:
+                    compile_xpath(query)
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.raw_items = crawler.settings.getint('NORMALIZE_BATCH_SIZE', 0) > 0
+        spider.stream_gpu_pages = crawler.settings.getbool('STREAM_GPU_PAGES')
+        spider.seen_links = SeenSet(crawler.settings.getint('DUPEFILTER_BLOOM_CAPACITY', 0))
+        if spider.stream_gpu_pages:
+            for store in spider.stores:
+                for name in spider.stream_fields:
+                    if store.get(name) is not None:
+                        compile_stream_xpath(store[name])
+            crawler.signals.connect(spider.start_stream, signal=signals.headers_received)
+            crawler.signals.connect(spider.feed_stream, signal=signals.bytes_received)
+        return spider
+
+    def start_requests(self):
+        """
+        A method to start the scraping. It goes through the stores and start scraping the first page of each store.
+        When the crawl is persisted (the JOBDIR setting), the pages scheduled so far and the gpu links seen are kept in
+        the spider's state, so a resumed crawl does not start the stores again (its pending requests are in the JOBDIR's
+        queue) nor deliver the gpus again.
+        :return:
+        """
+        if hasattr(self, 'state'):
+            self.scheduled_pages = self.state.setdefault('scheduled_pages', self.scheduled_pages)
+            self.seen_links = self.state.setdefault('seen_links', self.seen_links)
+        for store in self.stores:
+            if store['store_name'] in self.scheduled_pages:
+                continue
+            store_page_link = store['gpu_page_link']
+            page_num = self.get_first_page(store) + self.shard_index
+            page_link = store_page_link + str(page_num)
+            self.scheduled_pages[store['store_name']] = page_num
+            meta = {**store, 'page_num': page_num, 'download_slot': store['store_name']}
+            yield scrapy.Request(url=page_link, callback=self.parse, meta=meta)
+
+    def parse(self, response):
+        """
+        A method to handle a gpu page list given the response. It consists mainly of two parts. The first part is it
+        goes through each gpu in the list and scrapes them individually (in an incremental run, the gpus whose previous
+        data can be reused are delivered directly, the gpus whose canonical links were seen in an earlier page are
+        skipped, and for a store in listing-only mode, the gpus whose price and availability are found in the list page
+        are delivered without requesting their pages, see parse_listing_item).
+        The second is that it finds the last page (by checking the page iterators at the bottom), and starts scraping
+        all the pages of its shard up to it that are not scheduled yet at once. If the last page is not shown, it starts
+        scraping the next page of its shard.
+        """
+        meta = response.meta
+        root = self.get_root(response, 'list')
+        with self.metrics.timer('extract_seconds', store=meta['store_name'], field='gpu_items'):
+            gpu_items = select(root, meta['gpu_item_element'])
+        for gpu_item in gpu_items:
+            gpu_link = self.select_field(gpu_item, meta, 'gpu_link_element')
+            gpu_name = self.select_field(gpu_item, meta, 'gpu_name_element')
+            if gpu_link is None or gpu_name is None:
+                continue
+            gpu_link = canonicalize_url(join_link(meta['base_link'], gpu_link))
+            if not self.seen_links.add(gpu_link):
+                self.crawler.stats.inc_value('dedup/duplicate_links')
+                continue
+            gpu_name_fixed = fix_gpu_name(gpu_name)
+            item_data = {'gpu_name': gpu_name_fixed}
+            listing_price = self.select_field(gpu_item, meta, 'gpu_listing_price_element')
+            if listing_price is not None:
+                item_data['gpu_price'] = self.fix_price(listing_price, meta['store_name'])
+            previous_row = get_previous_row(self.previous_data, gpu_link, item_data, self.refresh_after)
+            if previous_row is not None:
+                self.crawler.stats.inc_value('incremental/reused_items')
+                yield previous_row
+                continue
+            if meta['listing_only']:
+                listing_item = self.parse_listing_item(gpu_item, meta, gpu_link, gpu_name_fixed)
+                if listing_item is not None:
+                    self.crawler.stats.inc_value('listing_only/items')
+                    yield listing_item
+                    continue
+            # The pages which are parsed as they are received are only requested with the encodings it can decompress.
+            headers = {'Accept-Encoding': 'gzip, deflate'} if self.stream_gpu_pages else None
+            yield scrapy.Request(url=gpu_link, callback=self.parse_gpu, headers=headers,
+                                 meta={**meta, 'gpu_link': gpu_link, 'gpu_name': gpu_name_fixed})
+
+        page_num = meta['page_num']
+        last_page = get_last_page(select(root, meta['page_iterator_element']))
+        last_page_num = page_num + self.shard_count if last_page is None else last_page
+        store_name = meta['store_name']
+        for new_page_num in range(self.scheduled_pages[store_name] + 1, last_page_num + 1):
+            if (new_page_num - self.get_first_page(meta)) % self.shard_count != self.shard_index:
+                continue
+            page_link = meta['gpu_page_link'] + str(new_page_num)
+            yield scrapy.Request(url=page_link, callback=self.parse, meta={**meta, 'page_num': new_page_num})
+        self.scheduled_pages[store_name] = max(self.scheduled_pages[store_name], last_page_num)
+
+    def get_first_page(self, store: dict) -> int:
+        """
+        A method to get the number of the first gpus list page of a store.
+        :param store: the store's information.
+        :return: the page number.
+        """
+        return 0 if store['page_start_from_zero'] else 1
+
+    def parse_listing_item(self, gpu_item, meta: dict, gpu_link: str, gpu_name: str) -> Optional[dict]:
+        """
+        A method to deliver a gpu of a store in listing-only mode using only its item in the gpus list page. The price
+        and the availability are taken from the list page, and the model is taken from the list page if the store has
+        a selector for it, otherwise from the output of the previous run.
+        :param gpu_item: the element of the gpu's item in the gpus list page.
+        :param meta: the store's information.
+        :param gpu_link: the link of the gpu page.
+        :param gpu_name: the fixed name of the gpu.
+        :return: the gpu's data, or None if its gpu page needs to be requested: the model, the price or the availability
+        is missing, or a refresh of its details is due.
+        """
+        if is_detail_refresh_due(gpu_link, self.detail_refresh_days):
+            return None
+        gpu_model = None
+        if meta['gpu_listing_model_element'] is not None:
+            gpu_model = self.select_field(gpu_item, meta, 'gpu_listing_model_element')
+        elif self.previous_data is not None and gpu_link in self.previous_data:
+            gpu_model = self.previous_data[gpu_link]['gpu_model'] or None
+        listing_price = self.select_field(gpu_item, meta, 'gpu_listing_price_element')
+        in_stock = self.select_field(gpu_item, meta, 'gpu_listing_in_stock_element')
+        if gpu_model is None or listing_price is None or in_stock is None:
+            return None
+        return self.make_gpu_item(meta, gpu_model, listing_price, in_stock, gpu_link, gpu_name)
+
+    def parse_gpu(self, response):
+        """
+        A method to deliver an object to write to the output file. It combines all required information about the gpu
+        in one dictionary to write it.
+        """
+        meta = response.meta
+        root = self.get_root(response, 'gpu')
+        yield self.make_gpu_item(meta, self.select_field(root, meta, 'gpu_model_element'),
+                                 self.select_field(root, meta, 'gpu_price_element'),
+                                 self.select_field(root, meta, 'gpu_in_stock_element'), meta['gpu_link'],
+                                 meta['gpu_name'])
+
+    def start_stream(self, headers, body_length: int, request, spider):
+        """
+        A method called when the headers of a response are received. For a gpu page, it starts a parser which is fed
+        the body as it is received (see feed_stream).
+        """
+        if spider is self and request.callback == self.parse_gpu:
+            parser = StreamParser({name: request.meta[name] for name in self.stream_fields
+                                   if request.meta.get(name) is not None},
+                                  headers.get('Content-Type'), headers.get('Content-Encoding'))
+            parser.body_length = body_length
+            self.stream_parsers[request] = parser
+
+    def feed_stream(self, data: bytes, request, spider):
+        """
+        A method called when a chunk of the body of a response is received. It stops the download of a gpu page as soon
+        as all its fields were found.
+        """
+        parser = self.stream_parsers.get(request)
+        if parser is not None and parser.feed(data):
+            raise StopDownload(fail=False)
+
+    def get_root(self, response, page_type: str):
+        """
+        A method to parse a response of a store, and record its fetch latency, its size, its number of retries and its
+        parse time. The page which was parsed as it was received is not parsed again, and its stopped download is
+        counted in the stats ('stream/stopped_pages', and 'stream/skipped_bytes' when the size of the page is known).
+        :param response: the response.
+        :param page_type: the type of the page, 'list' or 'gpu', which labels the metrics.
+        :return: the root element of the page.
+        """
+        store_name = response.meta['store_name']
+        if 'download_latency' in response.meta:
+            self.metrics.observe('fetch_seconds', response.meta['download_latency'], store=store_name, page=page_type)
+        self.metrics.observe('response_bytes', len(response.body), store=store_name, page=page_type)
+        retries = response.meta.get('retry_times', 0)
+        if retries:
+            self.metrics.inc('retries', retries, store=store_name, page=page_type)
+        parser = self.stream_parsers.pop(response.request, None) if response.request is not None else None
+        if parser is not None and parser.done:
+            start = time.perf_counter()
+            root = parser.close()
+            self.metrics.observe('parse_seconds', parser.parse_seconds + time.perf_counter() - start,
+                                 store=store_name, page=page_type)
+            if 'download_stopped' in response.flags:
+                self.crawler.stats.inc_value('stream/stopped_pages')
+                if parser.body_length > 0:
+                    self.crawler.stats.inc_value('stream/skipped_bytes', parser.body_length - parser.num_bytes)
+            return root
+        with self.metrics.timer('parse_seconds', store=store_name, page=page_type):
+            return response.selector.root
+
+    def select_field(self, node, meta: dict, selector_name: str) -> Optional[str]:
+        """
+        A method to select a field of a page with the store's selector, and record its extraction time.
+        :param node: the element, e.g. the root of a gpu page or a gpu item in a gpus list page.
+        :param meta: the store's information.
+        :param selector_name: the name of the field's selector, e.g. 'gpu_price_element'.
+        :return: the first match of the selector, or None if there is no match (or no selector).
+        """
+        with self.metrics.timer('extract_seconds', store=meta['store_name'], field=selector_name[:-len('_element')]):
+            return select_one(node, meta[selector_name])
+
+    def closed(self, reason):
+        """
+        A method called when the spider is closed. It exports the spider's metrics as stats.
+        """
+        self.metrics.to_stats(self.crawler.stats)
+
+    def make_gpu_item(self, meta: dict, gpu_model: Optional[str], gpu_price: Optional[str], in_stock: Optional[str],
+                      gpu_link: str, gpu_name: str) -> dict:
+        """
+        A method to combine all required information about the gpu in one dictionary to write it.
+        :param meta: the store's information.
+        :param gpu_model: the model string of the gpu.
+        :param gpu_price: the price string of the gpu.
+        :param in_stock: the availability string of the gpu.
+        :param gpu_link: the link of the gpu page.
+        :param gpu_name: the fixed name of the gpu.
+        :return: the gpu's data, which is a raw item (with the price and availability strings) when the items are
+        normalized by the NormalizePipeline.
+        """
+        if gpu_model is None:
+            self.metrics.inc('field_failures', store=meta['store_name'], field='gpu_model')
+        if self.raw_items:
+            return RawRow(store_name=meta['store_name'], gpu_model=gpu_model, gpu_name=gpu_name,
+                          fetch_ts=round(time.time()), gpu_price=gpu_price, in_stock=in_stock, url=gpu_link)
+        return {
+            'store_name': meta['store_name'],
+            'gpu_model': None if gpu_model is None else fix_text(gpu_model),
+            'gpu_name': gpu_name,
+            'fetch_ts': round(time.time()),
+            'gpu_price': self.fix_price(gpu_price, meta['store_name']),
+            'in_stock': self.is_in_stock(in_stock, meta['store_name']),
+            'url': gpu_link
+        }
+
+    def fix_price(self, price: Optional[str], store_name: str) -> str:
+        """
+        A method to fix the price by eliminating the spaces and the currency.
+        :param price: a price string which needs to be fixed.
+        :param store_name: the name of the store, which labels the failures.
+        :return: a modified version of the price, or an empty string if it does not contain a price.
+        """
+        try:
+            return extract.fix_price(price)
+        except Exception as e:
+            print("Error while finding the GPU's price:", e)
+            self.metrics.inc('field_failures', store=store_name, field='gpu_price')
+            return ''
+
+    def is_in_stock(self, in_stock: Optional[str], store_name: str) -> bool:
+        """
+        A method to find if the gpu is available in stock given the availability string.
+        :param in_stock: the availability string.
+        :param store_name: the name of the store, which labels the failures.
+        :return: a boolean for the gpu's availability in stock.
+        """
+        try:
+            return extract.is_in_stock(in_stock)
+        except Exception as e:
+            print("Error while finding if the GPU's is in-stock (assuming it is not):", e)
+            self.metrics.inc('field_failures', store=store_name, field='in_stock')
+            return False
@@ -0,0 +1,198 @@
+"""
+The streaming parse of the gpu pages. A gpu page is only needed for a few fields (its price, its availability and one
+feature row), which are usually near its top, yet the whole page is downloaded and parsed. A StreamParser is fed the
+body of a page as it is received, parses it incrementally (with lxml's HTMLPullParser), and tells when the first match
+of every field's XPath selector is final, i.e. the element which contains it (and the table row around it, if there
+is one) is closed. The scraper then stops the download, and only the beginning of the page was transferred and parsed.
+The requests-based scraper (task1) reads its responses in chunks (see task1.fetcher), and the Scrapy spiders stop their
+downloads from the bytes_received signal (see store_engine.spider).
+
+The selectors must not depend on what follows their matches in the page: the selectors with 'last()', or which count
+the following nodes, are rejected (e.g. a feature's value is selected with 'following-sibling::td[1]' rather than
+'td[last()]').
+"""
+import codecs
+import re
+import time
+import zlib
+from functools import lru_cache
+from typing import Dict, Optional
+
+from lxml import etree
+
+HEAD_SIZE = 4096
+CHARSET_PATTERN = re.compile(rb'charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+META_PATTERN = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+DECOMPRESSED_ENCODINGS = ('gzip', 'x-gzip', 'deflate')
+UNSTREAMABLE_PATTERN = re.compile(r'\blast\s*\(|\bcount\s*\(\s*following')
+ROW_TAGS = ('tr',)
+
+
+@lru_cache(maxsize=None)
+def compile_stream_xpath(query: str) -> etree.XPath:
+    """
+    A method to compile an XPath selector once. The strings it matches know their parent elements, so that it can be
+    found whether they are complete.
+    :param query: the XPath selector.
+    :return: the compiled selector.
+    :raises ValueError: if the selector depends on the rest of the page (it uses 'last()', or counts the following
+    nodes), so that its first match in a part of the page may not be its first match in the whole page.
+    """
+    if UNSTREAMABLE_PATTERN.search(query):
+        raise ValueError('The selector %r depends on the rest of the page, which cannot be streamed' % query)
+    return etree.XPath(query, smart_strings=True)
+
+
+def get_charset(text: Optional[bytes], pattern: re.Pattern = CHARSET_PATTERN) -> Optional[str]:
+    """
+    A method to find a known character encoding in a text, e.g. a 'Content-Type' header or the head of a page.
+    :param text: the text, or None.
+    :param pattern: the pattern of the encoding's declaration, whose group is the encoding's name.
+    :return: the name of the encoding, or None if it is not declared or not known.
+    """
+    match = pattern.search(text) if text else None
+    if match is None:
+        return None
+    try:
+        return codecs.lookup(match.group(1).decode('ascii')).name
+    except (LookupError, UnicodeDecodeError):
+        return None
+
+
+class StreamParser:
+    """
+    A class to parse a page as its body is received, until the first matches of the fields' selectors are found. The
+    body is decompressed when it is compressed with gzip or deflate. The page's encoding is taken from its
+    'Content-Type' header, or from a '<meta>' declaration in its first HEAD_SIZE bytes; when it is not declared (or the
+    body is compressed otherwise), the parser gives up and the page needs to be read and parsed as usual.
+    """
+
+    def __init__(self, queries: Dict[str, str], content_type: Optional[bytes] = None,
+                 content_encoding: Optional[bytes] = None):
+        """
+        The main constructor of the parser.
+        :param queries: the XPath selectors of the fields by their names (see compile_stream_xpath).
+        :param content_type: the 'Content-Type' header of the response, or None.
+        :param content_encoding: the 'Content-Encoding' header of the response, or None if the body is received as it
+        is (e.g. it is decompressed by the HTTP client).
+        """
+        self.queries = {name: compile_stream_xpath(query) for name, query in queries.items()}
+        self.values: Dict[str, object] = {}
+        self.encoding = get_charset(content_type)
+        self.head = b''
+        self.parser = None
+        self.root = None
+        self.closed_elements = set()
+        self.num_bytes = 0
+        self.parse_seconds = 0.0
+        self.failed = False
+        self.done = not self.queries
+        content_encoding = (content_encoding or b'identity').decode('latin-1').strip().lower()
+        self.decompressor = None
+        if content_encoding in DECOMPRESSED_ENCODINGS:
+            # 32 finds the gzip or zlib header by itself.
+            self.decompressor = zlib.decompressobj(zlib.MAX_WBITS | 32)
+        elif content_encoding != 'identity':
+            self.failed = True
+
+    def feed(self, data: bytes) -> bool:
+        """
+        A method to parse the next chunk of the body.
+        :param data: the chunk, as it is received.
+        :return: a boolean indicating whether all the fields were found, so that the rest of the body is not needed.
+        """
+        if self.done or self.failed:
+            return self.done
+        self.num_bytes += len(data)
+        start = time.perf_counter()
+        try:
+            if self.decompressor is not None:
+                data = self.decompressor.decompress(data)
+            if self.parser is None:
+                self.head += data
+                if not self.start_parser():
+                    return False
+                data, self.head = self.head, b''
+            self.parser.feed(data)
+            for event, element in self.parser.read_events():
+                if self.root is None:
+                    self.root = element
+                if event == 'end':
+                    self.closed_elements.add(element)
+            self.done = self.root is not None and self.find_values()
+        except (zlib.error, etree.LxmlError, LookupError) as e:
+            print('Error while parsing the page as it is received (reading it all):', e)
+            self.failed = True
+        finally:
+            self.parse_seconds += time.perf_counter() - start
+        return self.done
+
+    def start_parser(self) -> bool:
+        """
+        A method to start the incremental parser once the page's encoding is known.
+        :return: a boolean indicating whether the parser was started. It is not started while the head of the page is
+        read, and never if the encoding is not declared in it.
+        """
+        if self.encoding is None:
+            self.encoding = get_charset(self.head[:HEAD_SIZE], META_PATTERN)
+        if self.encoding is None:
+            if len(self.head) >= HEAD_SIZE:
+                self.failed = True
+            return False
+        self.parser = etree.HTMLPullParser(events=('start', 'end'), encoding=self.encoding)
+        return True
+
+    def find_values(self) -> bool:
+        """
+        A method to look for the fields which were not found yet in the page parsed so far.
+        :return: a boolean indicating whether all the fields were found.
+        """
+        for name, query in self.queries.items():
+            if name in self.values:
+                continue
+            matches = query(self.root)
+            if matches and self.is_complete(matches[0]):
+                self.values[name] = matches[0]
+        return len(self.values) == len(self.queries)
+
+    def is_complete(self, match) -> bool:
+        """
+        A method to find whether a match of a selector is final: the element which contains it is closed, so that its
+        text is complete, and no earlier match can follow in the page. A match in a table row is final once the row is
+        closed, since a selector often picks a cell by the other cells of its row.
+        :param match: the match, an element or a string.
+        :return: a boolean indicating whether the match is final.
+        """
+        if isinstance(match, etree._Element):
+            element = match
+        else:
+            get_parent = getattr(match, 'getparent', None)
+            element = None if get_parent is None else get_parent()
+            if element is None:
+                return False
+            if getattr(match, 'is_tail', False):
+                element = element.getparent()
+            elif getattr(match, 'is_attribute', False):
+                return self.is_row_closed(element)
+        return element is not None and element in self.closed_elements and self.is_row_closed(element)
+
+    def is_row_closed(self, element) -> bool:
+        """
+        A method to find whether the table row around an element (if there is one) is closed.
+        :param element: the element.
+        :return: a boolean indicating whether the row is closed, True if the element is not in a row.
+        """
+        row = next(element.iterancestors(*ROW_TAGS), None)
+        return row is None or row in self.closed_elements
+
+    def close(self):
+        """
+        A method to finish the parse of the page received so far.
+        :return: the root element of the page, or None if the page was not parsed.
+        """
+        if self.parser is None:
+            return None
+        try:
+            return self.parser.close()
+        except etree.LxmlError:
+            return self.root
@@ -0,0 +1,99 @@
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+
+class StoreThrottle:
+    """
+    An extension to apply the throughput profile of each store to its own downloader slot. The requests of a store carry
+    its name in 'download_slot' and its profile in 'throttle' (see the spider's stores), with the keys:
+        concurrency: the maximum number of requests to the store in parallel.
+        start_delay, min_delay, max_delay: the first delay in seconds between two requests to the store, and its limits.
+        target_concurrency: the average number of requests which the store should be processing in parallel. The delay
+        is adjusted to the store's latency like AutoThrottle does: a store answering in `latency` seconds gets a request
+        every `latency / target_concurrency` seconds.
+    The requests without a profile use the global settings. When a store is scraped by many crawls at the same time (the
+    STORE_THROTTLE_SHARDS setting, see store_engine.shard), every crawl gets its share of the profile.
+    """
+
+    def __init__(self, crawler):
+        if not crawler.settings.getbool('STORE_THROTTLE_ENABLED'):
+            raise NotConfigured
+        self.crawler = crawler
+        self.debug = crawler.settings.getbool('STORE_THROTTLE_DEBUG')
+        self.shards = max(1, crawler.settings.getint('STORE_THROTTLE_SHARDS', 1))
+        self.profiles = {}
+        crawler.signals.connect(self.request_reached_downloader, signal=signals.request_reached_downloader)
+        crawler.signals.connect(self.response_downloaded, signal=signals.response_downloaded)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def split_profile(self, profile: dict) -> dict:
+        """
+        A method to get the share of a store's throughput profile of this crawl, when the store is scraped by
+        STORE_THROTTLE_SHARDS crawls at the same time: the concurrency is divided between them, and the delays are
+        multiplied, so that together they keep to the store's profile.
+        :param profile: the store's profile.
+        :return: the crawl's profile.
+        """
+        if self.shards == 1:
+            return profile
+        profile = dict(profile)
+        if 'concurrency' in profile:
+            profile['concurrency'] = max(1, profile['concurrency'] // self.shards)
+        for key in ('start_delay', 'min_delay', 'max_delay'):
+            if key in profile:
+                profile[key] *= self.shards
+        profile['target_concurrency'] = profile.get('target_concurrency', 1.0) / self.shards
+        return profile
+
+    def get_slot(self, request):
+        """
+        A method to get the downloader slot of a request and the throughput profile of its store.
+        :param request: the request.
+        :return: the slot and the profile, or None instead of the slot if the request has no profile.
+        """
+        key = request.meta.get('download_slot')
+        profile = self.profiles.get(key)
+        if profile is None:
+            profile = request.meta.get('throttle')
+            if key is None or profile is None:
+                return None, None
+        return self.crawler.engine.downloader.slots.get(key), profile
+
+    def request_reached_downloader(self, request, spider):
+        """
+        A method to apply the store's concurrency and first delay to its slot, the first time a request of the store
+        reaches the downloader (the slot is created by then, but no request has been sent through it yet).
+        """
+        key = request.meta.get('download_slot')
+        if key in self.profiles:
+            return
+        slot, profile = self.get_slot(request)
+        if slot is None:
+            return
+        profile = self.profiles[key] = self.split_profile(profile)
+        slot.concurrency = profile.get('concurrency', slot.concurrency)
+        slot.delay = max(profile.get('min_delay', 0.0), profile.get('start_delay', slot.delay))
+        if self.debug:
+            spider.logger.info('Store throttle of %s: concurrency %d, delay %.2f s', key, slot.concurrency, slot.delay)
+
+    def response_downloaded(self, response, request, spider):
+        """
+        A method to adjust the delay of the store's slot to the latency of the response.
+        """
+        slot, profile = self.get_slot(request)
+        latency = request.meta.get('download_latency')
+        if slot is None or latency is None:
+            return
+        target_delay = latency / profile.get('target_concurrency', 1.0)
+        new_delay = max(target_delay, (slot.delay + target_delay) / 2.0)
+        new_delay = min(max(profile.get('min_delay', 0.0), new_delay), profile.get('max_delay', 60.0))
+        # the error pages are small and fast, so they should not make the delay smaller
+        if response.status != 200 and new_delay <= slot.delay:
+            return
+        if self.debug:
+            spider.logger.info('Store throttle of %s: latency %.2f s, delay %.2f s -> %.2f s',
+                               request.meta['download_slot'], latency, slot.delay, new_delay)
+        slot.delay = new_delay
@@ -0,0 +1,193 @@
+"""
+The canonical links of the gpus, to request and deliver every gpu once. A gpu can be found in many gpus list pages of a
+crawl (when the catalogue shifts while it is crawled, or when it is listed twice), and its links may differ by their
+host ('regard.ru' against 'www.regard.ru'), the order of their query parameters, their tracking parameters ('utm_*',
+'gclid', ...) or their fragment. A link is canonicalized (see canonicalize_url) before it is requested or delivered,
+and it is reduced to a fingerprint which ignores its scheme and the 'www.' of its host (see url_fingerprint). The
+fingerprints of the links seen in a crawl are kept in a SeenSet: a set of FINGERPRINT_SIZE bytes per link, or for very
+large catalogues, a Bloom filter of a fixed size (about 1.8 bytes per link for 0.1% of false positives, where a new
+link is taken for a seen one and skipped).
+
+The requests-based scraper (task1) skips the gpu links it has seen (see GpuScraper.get_new_gpu_items), and the Scrapy
+spiders do the same in their gpus list pages (see store_engine.spider), on top of their duplicate filter, which
+fingerprints the requests by their canonical links (see store_engine.dupefilter).
+"""
+import hashlib
+import math
+import threading
+from typing import Union
+from urllib.parse import urlsplit, urlunsplit
+
+FINGERPRINT_SIZE = 16
+TRACKING_PARAMS = frozenset(['gclid', 'yclid', 'ysclid', 'fbclid', 'dclid', 'msclkid', '_openstat'])
+TRACKING_PREFIXES = ('utm_',)
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def join_link(base_link: str, href: str) -> str:
+    """
+    A method to make the link of a page from the base link of its store and a link found in a page of the store.
+    :param base_link: the base link of the store, e.g. 'https://regard.ru'.
+    :param href: the link found, either absolute ('https://www.regard.ru/...', '//www.regard.ru/...') or relative to
+    the store's root ('/catalog/...').
+    :return: the absolute link. A link relative to the store's root is appended to the base link, which may have a path
+    (e.g. on the replay server, see store_engine.replay).
+    """
+    href = href.strip()
+    if urlsplit(href).scheme:
+        return href
+    if href.startswith('//'):
+        return urlsplit(base_link).scheme + ':' + href
+    return base_link.rstrip('/') + '/' + href.lstrip('/')
+
+
+def is_tracking_param(name: str) -> bool:
+    """
+    A method to find whether a query parameter only tracks the visit, and does not change the page.
+    :param name: the name of the parameter.
+    :return: a boolean indicating whether the parameter is a tracking parameter.
+    """
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def canonicalize_url(link: str) -> str:
+    """
+    A method to get the canonical form of a link, which is still the link of the same page: its scheme and host are in
+    lower case without the default port, its path is '/' if it is empty, its tracking parameters and its fragment are
+    dropped, and its query parameters are sorted by name (their values keep their encoding and their order).
+    :param link: the link, e.g. 'HTTPS://www.Regard.ru:443/catalog/1.htm?utm_source=x&b=2&a=1#reviews'.
+    :return: the canonical link, e.g. 'https://www.regard.ru/catalog/1.htm?a=1&b=2'.
+    """
+    parts = urlsplit(link.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    default_port = DEFAULT_PORTS.get(scheme)
+    if default_port is not None and netloc.endswith(':%d' % default_port):
+        netloc = netloc[:-len(':%d' % default_port)]
+    params = [param for param in parts.query.split('&') if param and not is_tracking_param(param.split('=', 1)[0])]
+    params.sort(key=lambda param: param.split('=', 1)[0])
+    return urlunsplit((scheme, netloc, parts.path or '/', '&'.join(params), ''))
+
+
+def url_fingerprint(link: str) -> bytes:
+    """
+    A method to get the fingerprint of a link: the hash of its canonical form (see canonicalize_url) without its scheme
+    and the 'www.' of its host, so that the aliases of a page have the same fingerprint.
+    :param link: the link.
+    :return: the fingerprint, of FINGERPRINT_SIZE bytes.
+    """
+    parts = urlsplit(canonicalize_url(link))
+    host = parts.netloc[4:] if parts.netloc.startswith('www.') else parts.netloc
+    key = host + parts.path + ('?' + parts.query if parts.query else '')
+    return hashlib.sha1(key.encode('utf-8')).digest()[:FINGERPRINT_SIZE]
+
+
+class BloomFilter:
+    """
+    A class of a Bloom filter of fingerprints: a bit array of a fixed size, in which every fingerprint sets a few bits.
+    A fingerprint which was added is always found, and a fingerprint which was not added is found with a probability
+    of about error_rate while the filter holds at most capacity fingerprints (more beyond it).
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        """
+        The main constructor of the filter.
+        :param capacity: the number of fingerprints the filter is sized for.
+        :param error_rate: the probability of a false positive at capacity.
+        """
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def get_positions(self, fingerprint: bytes) -> list:
+        """
+        A method to get the positions of the bits of a fingerprint, by double hashing its two halves.
+        :param fingerprint: the fingerprint, e.g. of FINGERPRINT_SIZE bytes.
+        :return: the positions of its num_hashes bits.
+        """
+        half = len(fingerprint) // 2
+        first_hash = int.from_bytes(fingerprint[:half], 'big')
+        second_hash = int.from_bytes(fingerprint[half:], 'big') | 1
+        return [(first_hash + i * second_hash) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, fingerprint: bytes) -> bool:
+        """
+        A method to add a fingerprint to the filter.
+        :param fingerprint: the fingerprint.
+        :return: a boolean indicating whether the fingerprint is new, False if it was (probably) added before.
+        """
+        is_new = False
+        for position in self.get_positions(fingerprint):
+            mask = 1 << (position & 7)
+            if not self.bits[position >> 3] & mask:
+                self.bits[position >> 3] |= mask
+                is_new = True
+        return is_new
+
+    def __contains__(self, fingerprint: bytes) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.get_positions(fingerprint))
+
+
+class SeenSet:
+    """
+    A thread-safe set of the links seen in a crawl, which keeps their fingerprints (see url_fingerprint): exactly in a
+    set, or in a Bloom filter of a fixed size for very large catalogues.
+    """
+
+    def __init__(self, bloom_capacity: int = 0, error_rate: float = 0.001):
+        """
+        The main constructor of the set.
+        :param bloom_capacity: if it is more than zero, the fingerprints are kept in a Bloom filter sized for this
+        number of links. The default keeps them exactly.
+        :param error_rate: the probability that the Bloom filter takes a new link for a seen one, at its capacity.
+        """
+        self.bloom_capacity = bloom_capacity
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.fingerprints: Union[set, BloomFilter] = set()
+        self.clear()
+
+    def clear(self) -> None:
+        """
+        A method to forget all the links seen, e.g. before a new crawl.
+        :return: None.
+        """
+        with self.lock:
+            self.fingerprints = BloomFilter(self.bloom_capacity, self.error_rate) if self.bloom_capacity > 0 else set()
+
+    def add(self, link: str) -> bool:
+        """
+        A method to add a link to the set.
+        :param link: the link.
+        :return: a boolean indicating whether the link is new, False if the link or one of its aliases was seen.
+        """
+        return self.add_fingerprint(url_fingerprint(link))
+
+    def add_fingerprint(self, fingerprint: bytes) -> bool:
+        """
+        A method to add a fingerprint to the set.
+        :param fingerprint: the fingerprint.
+        :return: a boolean indicating whether the fingerprint is new.
+        """
+        with self.lock:
+            if isinstance(self.fingerprints, BloomFilter):
+                return self.fingerprints.add(fingerprint)
+            if fingerprint in self.fingerprints:
+                return False
+            self.fingerprints.add(fingerprint)
+            return True
+
+    def __contains__(self, link: str) -> bool:
+        with self.lock:
+            return url_fingerprint(link) in self.fingerprints
+
+    def __getstate__(self):
+        # The set is kept in the spiders' state (see store_engine.spider), which is pickled.
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
@@ -0,0 +1,404 @@
+"""
+An asynchronous version of the requests-based scraper, on asyncio. A single thread keeps many requests in flight: the
+pages are requested with httpx over pooled connections (multiplexed over HTTP/2 when the store supports it), and they
+are parsed in an executor, so the event loop never waits for BeautifulSoup. AsyncGpuScraper takes the same arguments as
+GpuScraper, and returns the same rows (COLUMNS).
+
+It needs httpx, which is an optional dependency ('pip install httpx[http2]', where the 'http2' extra installs h2).
+
+To scrape all the stores at once to output.csv:
+    $ python -m task1.async_scraper output.csv
+"""
+import asyncio
+import sys
+import time
+from collections import deque
+from concurrent.futures import Executor
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import requests
+from bs4 import BeautifulSoup
+from store_engine.stream import StreamParser
+from task1.fetcher import Fetcher, RETRY_STATUS_CODES, STREAM_CHUNK_SIZE
+from task1.gpu_scraper import GpuScraper
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import h2
+except ImportError:
+    h2 = None
+
+
+def check_httpx() -> None:
+    """
+    A method to check that httpx is installed.
+    :return: None.
+    :raises ImportError: if httpx is not installed.
+    """
+    if httpx is None:
+        raise ImportError('The asynchronous scraper needs httpx (pip install httpx[http2])')
+
+
+class AsyncFetcher(Fetcher):
+    """
+    A class to fetch web pages asynchronously with an httpx client, with the retries and the cache of Fetcher. The
+    client keeps up to pool_maxsize connections open to every host, and uses HTTP/2 when h2 is installed and the host
+    supports it, in which case many requests share a connection. The errors are raised as requests' exceptions, like
+    the ones of Fetcher.
+    """
+
+    def __init__(self, *args, http2: bool = True, **kwargs):
+        """
+        The main constructor of the fetcher. It takes the arguments of Fetcher.
+        :param http2: a boolean indicating whether to use HTTP/2 when the host supports it (it needs h2).
+        :raises ImportError: if httpx is not installed.
+        """
+        check_httpx()
+        super().__init__(*args, **kwargs)
+        self.http2 = http2 and h2 is not None
+        self.client = None
+
+    @classmethod
+    def from_fetcher(cls, fetcher: Fetcher) -> 'AsyncFetcher':
+        """
+        A method to make an asynchronous fetcher with the options and the cache of a fetcher.
+        :param fetcher: the fetcher.
+        :return: the asynchronous fetcher.
+        """
+        return cls(fetcher.timeout, fetcher.max_retries, fetcher.backoff_factor, fetcher.max_backoff,
+                   fetcher.pool_maxsize, fetcher.headers, fetcher.cache)
+
+    def get_client(self):
+        """
+        A method to get the client of the fetcher. It is created on the first request, in the running event loop.
+        :return: the httpx client.
+        """
+        if self.client is None:
+            connect_timeout, read_timeout = self.timeout if isinstance(self.timeout, tuple) else (self.timeout,) * 2
+            self.client = httpx.AsyncClient(
+                headers=self.headers, http2=self.http2, follow_redirects=True,
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                limits=httpx.Limits(max_connections=self.pool_maxsize, max_keepalive_connections=self.pool_maxsize))
+        return self.client
+
+    async def get(self, link: str, stream_queries: Optional[Dict[str, str]] = None):
+        """
+        A method to request a web page given its link, like Fetcher.get.
+        :param link: the link of the web page.
+        :param stream_queries: if it is given, the XPath selectors of the fields needed from the page. The download of
+        the page is stopped as soon as they were found (over HTTP/2, only its stream is closed, not its connection).
+        :return: the successful response, with its 'from_cache' and 'retries' attributes.
+        :raises requests.RequestException: if the request still fails after all the retries. The connection errors and
+        the timeouts are retried, and the other errors of httpx (e.g. too many redirects) are raised at once.
+        """
+        headers = self.cache.get_validators(link) if self.cache is not None else {}
+        retry_num = 0
+        while True:
+            try:
+                response = await self.send(link, headers, stream_queries)
+            except httpx.HTTPError as e:
+                if not isinstance(e, httpx.TransportError):
+                    raise requests.RequestException('%s: %s' % (type(e).__name__, e)) from e
+                if retry_num >= self.max_retries:
+                    raise requests.ConnectionError('%s: %s' % (type(e).__name__, e)) from e
+                await asyncio.sleep(self.get_retry_delay(retry_num))
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or retry_num >= self.max_retries:
+                    response.retries = retry_num
+                    return self.handle_response(link, response)
+                await asyncio.sleep(self.get_retry_delay(retry_num, response))
+            retry_num += 1
+
+    async def send(self, link: str, headers: dict, stream_queries: Optional[Dict[str, str]] = None):
+        """
+        A method to send a request and read its response.
+        :param link: the link of the web page.
+        :param headers: the headers of the request.
+        :param stream_queries: the XPath selectors of the fields needed from the page, or None to read it all.
+        :return: the response, whose 'truncated' attribute tells whether its download was stopped.
+        """
+        async with self.get_client().stream('GET', link, headers=headers) as response:
+            chunks = []
+            response.truncated = False
+            parser = None
+            if stream_queries is not None and response.status_code == 200:
+                parser = StreamParser(stream_queries, response.headers.get('Content-Type', '').encode('latin-1'))
+            async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+                chunks.append(chunk)
+                if parser is not None and parser.feed(chunk):
+                    response.truncated = True
+                    break
+            response._content = b''.join(chunks)
+        return response
+
+    def handle_response(self, link: str, response):
+        """
+        A method to check the final response of a request, and to update the cache with it (unless its download was
+        stopped), like Fetcher.handle_response.
+        :param link: the link of the web page.
+        :param response: the final response of the request.
+        :return: the successful response.
+        :raises requests.HTTPError: if the response is not successful.
+        """
+        response.from_cache = False
+        if response.status_code == 304 and self.cache is not None:
+            body = self.cache.get_body(link)
+            if body is not None:
+                self.cache.refresh(link)
+                response.status_code = 200
+                response._content = body
+                response.from_cache = True
+                return response
+        if not 200 <= response.status_code < 300:
+            raise requests.HTTPError('%d Error for url: %s' % (response.status_code, link), response=response)
+        if self.cache is not None and not response.truncated:
+            self.cache.store(link, response)
+        return response
+
+    async def aclose(self) -> None:
+        """
+        A method to close the client of the fetcher (and its connections).
+        :return: None.
+        """
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+
+class AsyncGpuScraper(GpuScraper):
+    """
+    A class to scrap a site like GpuScraper, asynchronously. The gpus list pages are read ahead as in GpuScraper, the
+    gpus of the list pages are scraped as soon as their pages are read, and up to max_workers requests to the store
+    are in flight at the same time (which can be hundreds). The coroutines are the methods whose names start with 'a';
+    scrape and iter_scrape run them in a new event loop.
+    """
+
+    def __init__(self, *args, executor: Optional[Executor] = None, **kwargs):
+        """
+        The main constructor of the scraper. It takes the arguments of GpuScraper, and its fetcher is an AsyncFetcher
+        (a Fetcher is turned into an AsyncFetcher with the same options and cache).
+        :param executor: the executor which parses the pages. The default is the default executor of the event loop
+        (a thread pool).
+        :raises ImportError: if httpx is not installed.
+        """
+        super().__init__(*args, **kwargs)
+        if not isinstance(self.fetcher, AsyncFetcher):
+            self.fetcher = AsyncFetcher.from_fetcher(self.fetcher)
+        self.executor = executor
+        self.requests_limit = None
+
+    def fetch(self, link: str, page_type: str, stream_queries: Optional[Dict[str, str]] = None):
+        raise TypeError('The pages of an AsyncGpuScraper are fetched with afetch')
+
+    async def run_in_executor(self, function, *args):
+        """
+        A method to run a function in the executor of the scraper, e.g. to parse a page.
+        :param function: the function.
+        :param args: the arguments of the function.
+        :return: the result of the function.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def afetch(self, link: str, page_type: str, stream_queries: Optional[Dict[str, str]] = None):
+        """
+        A method to request a page of the store like GpuScraper.fetch, with at most max_workers requests in flight.
+        :param link: the link of the page.
+        :param page_type: the type of the page, 'list' or 'gpu', which labels the metrics.
+        :param stream_queries: if it is given, the download of the page is stopped as soon as these XPath selectors
+        were found.
+        :return: the successful response.
+        :raises requests.RequestException: if the page could not be read.
+        """
+        if self.requests_limit is None:
+            self.requests_limit = asyncio.Semaphore(self.max_workers)
+        async with self.requests_limit:
+            start = time.perf_counter()
+            try:
+                page = await self.fetcher.get(link, stream_queries)
+            finally:
+                self.metrics.observe('fetch_seconds', time.perf_counter() - start, store=self.store_name,
+                                     page=page_type)
+        self.metrics.observe('response_bytes', len(page.content), store=self.store_name, page=page_type)
+        if page.retries:
+            self.metrics.inc('retries', page.retries, store=self.store_name, page=page_type)
+        if page.truncated:
+            self.metrics.inc('stopped_downloads', store=self.store_name, page=page_type)
+        return page
+
+    async def aread_page(self, page_num: int) -> BeautifulSoup:
+        """
+        A method to read a gpus list page of the store given its number, like GpuScraper.read_page.
+        :param page_num: the page number.
+        :return: the contents of the gpus list page.
+        :raises requests.RequestException: if the page could not be read.
+        """
+        page = await self.afetch(self.gpu_page_link + str(page_num), 'list')
+        return await self.run_in_executor(self.parse_page, page.content, self.page_strainer, 'list')
+
+    async def aiter_pages(self, start_page: Optional[int] = None) -> AsyncIterator[BeautifulSoup]:
+        """
+        A method to go through the gpus list pages of the store in order, like GpuScraper.iter_pages. As soon as a page
+        shows the number of the last page, all the pages up to it are requested.
+        :param start_page: the number of the first page. The default is the first page of the store.
+        :return: an asynchronous iterator over the contents of the gpus list pages.
+        """
+        page_num = (0 if self.page_start_from_zero else 1) if start_page is None else start_page
+        pages = {page_num: asyncio.ensure_future(self.aread_page(page_num))}
+        next_page_num = page_num + 1
+        try:
+            while page_num in pages:
+                page_content = await pages.pop(page_num)
+                last_page = self.get_last_page(page_content)
+                last_page_num = page_num + 1 if last_page is None else last_page - self.page_start_from_zero
+                for new_page_num in range(next_page_num, last_page_num + 1):
+                    pages[new_page_num] = asyncio.ensure_future(self.aread_page(new_page_num))
+                next_page_num = max(next_page_num, last_page_num + 1)
+                yield page_content
+                page_num += 1
+        finally:
+            for page in pages.values():
+                page.cancel()
+
+    async def ascrape_gpu(self, gpu_link: str) -> Optional[Tuple[dict, float]]:
+        """
+        A method to scrape a single gpu given its link, like GpuScraper.scrape_gpu. The page is parsed in the executor.
+        :param gpu_link: the link of the gpu page.
+        :return: a dictionary containing the gpu's data, and the timestamp of the fetch process. If the gpu page could
+        not be read, it returns None.
+        """
+        try:
+            page = await self.afetch(gpu_link, 'gpu', self.stream_queries)
+        except requests.RequestException as e:
+            print("Error while reading the GPU's page (skipping it):", e)
+            return None
+        now = time.time()
+        gpu_data = await self.run_in_executor(self.get_gpu_data, gpu_link, page)
+        return self.make_row(gpu_link, gpu_data, now), now
+
+    async def ascrape_page(self, page_content: BeautifulSoup) -> List[dict]:
+        """
+        A method to scrape the gpus in a gpus list page given its content, like GpuScraper.iter_page. All the gpus of
+        the page are requested at once.
+        :param page_content: the contents of the gpus list page.
+        :return: the scraped gpus, in the order of the list.
+        """
+        gpu_items = await self.run_in_executor(self.get_new_gpu_items, page_content)
+        previous_rows = [self.get_previous_row(gpu_link, item_data) for gpu_link, item_data in gpu_items]
+        gpu_links = [gpu_link for (gpu_link, _), previous_row in zip(gpu_items, previous_rows) if previous_row is None]
+        results = await asyncio.gather(*(self.ascrape_gpu(gpu_link) for gpu_link in gpu_links))
+        return list(self.normalize_rows(self.collect_results(previous_rows, iter(results))))
+
+    async def aiter_scrape(self) -> AsyncIterator[dict]:
+        """
+        A method to run the scraping process, like GpuScraper.iter_scrape. The gpus of a list page are scraped while the
+        next list pages are read and their gpus are scraped, and the gpus are returned in the order of the pages.
+        :return: an asynchronous iterator over the scraped gpus, each as a dictionary (COLUMNS).
+        """
+        pending = deque()
+        try:
+            async for page_content in self.aiter_pages():
+                pending.append(asyncio.ensure_future(self.ascrape_page(page_content)))
+                while pending and pending[0].done():
+                    for gpu_data in pending.popleft().result():
+                        yield gpu_data
+            while pending:
+                for gpu_data in await pending.popleft():
+                    yield gpu_data
+        finally:
+            for page in pending:
+                page.cancel()
+
+    async def ascrape(self) -> Tuple[List[dict], float]:
+        """
+        A method to run the scraping process, like GpuScraper.scrape. The connections of the fetcher are closed at the
+        end.
+        :return: the scraped gpus, and the timestamp of the last fetch process.
+        """
+        self.data = []
+        self.seen_links.clear()
+        try:
+            async for gpu_data in self.aiter_scrape():
+                self.append_data(gpu_data)
+        finally:
+            await self.fetcher.aclose()
+            self.requests_limit = None
+        return self.data, self.last_scrape
+
+    def scrape(self) -> Tuple[List[dict], float]:
+        """
+        A method to run the scraping process in a new event loop (see ascrape).
+        :return: the scraped gpus, and the timestamp of the last fetch process.
+        """
+        return asyncio.run(self.ascrape())
+
+    def iter_scrape(self) -> Iterator[dict]:
+        """
+        A method to run the scraping process in a new event loop (see ascrape). The gpus are returned once all of them
+        were scraped.
+        :return: an iterator over the scraped gpus.
+        """
+        return iter(self.scrape()[0])
+
+
+async def iter_stores(scrapers: List[AsyncGpuScraper]) -> AsyncIterator[dict]:
+    """
+    A method to scrape many stores at the same time in the running event loop. A store which fails is stopped, and the
+    other stores go on.
+    :param scrapers: the scrapers of the stores.
+    :return: an asynchronous iterator over the scraped gpus, as soon as they are scraped (the stores are mixed).
+    """
+    results = asyncio.Queue()
+    done = object()
+
+    async def scrape_store(scraper: AsyncGpuScraper) -> None:
+        try:
+            async for gpu_data in scraper.aiter_scrape():
+                await results.put(gpu_data)
+        except requests.RequestException as e:
+            print("Error while reading the GPUs list page of %s (stopping the store):" % scraper.store_name, e)
+        finally:
+            await scraper.fetcher.aclose()
+            scraper.requests_limit = None
+            await results.put(done)
+
+    for scraper in scrapers:
+        scraper.seen_links.clear()
+    tasks = [asyncio.ensure_future(scrape_store(scraper)) for scraper in scrapers]
+    try:
+        num_running = len(tasks)
+        while num_running:
+            gpu_data = await results.get()
+            if gpu_data is done:
+                num_running -= 1
+            else:
+                yield gpu_data
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def write_stores(scrapers: List[AsyncGpuScraper], output: str) -> int:
+    """
+    A method to scrape many stores at the same time (see iter_stores), and write the gpus to a file as they come.
+    :param scrapers: the scrapers of the stores.
+    :param output: the path of the output file (csv or jsonl).
+    :return: the number of gpus written.
+    """
+    from task1.writers import RowWriter
+
+    with RowWriter(output, mode='w') as writer:
+        async for gpu_data in iter_stores(scrapers):
+            writer.write(gpu_data)
+        return writer.num_rows
+
+
+if __name__ == '__main__':
+    from task1.main import stores
+
+    output_file = sys.argv[1] if len(sys.argv) > 1 else 'output.csv'
+    gpu_scrapers = [AsyncGpuScraper(**store, batch_normalize=True, stream=True) for store in stores]
+    print('%d gpus written to %s' % (asyncio.run(write_stores(gpu_scrapers, output_file)), output_file))
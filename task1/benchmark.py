@@ -0,0 +1,85 @@
+"""
+A micro-benchmark of the HTML parsing backends of GpuScraper. It parses saved gpu pages of a store with each backend and
+prints the time spent per gpu page on parsing and finding the gpu's information.
+
+To save some gpu pages of a store (using the store's first gpus list page):
+    $ python -m task1.benchmark OnlineTrade ./pages/onlinetrade --save 20
+To run the benchmark over the saved pages:
+    $ python -m task1.benchmark OnlineTrade ./pages/onlinetrade
+"""
+import argparse
+import glob
+import importlib.util
+import os
+import time
+from typing import Dict, List
+
+from bs4 import BeautifulSoup
+from task1.gpu_scraper import GpuScraper
+from task1.main import stores
+
+
+PARSERS = ['html.parser', 'lxml', 'html5lib']
+
+
+def save_pages(gpu_scraper: GpuScraper, pages_dir: str, num_pages: int) -> None:
+    """
+    A method to save the gpu pages of the first gpus list page of a store.
+    :param gpu_scraper: the scraper of the store.
+    :param pages_dir: the directory to save the pages in.
+    :param num_pages: the maximum number of gpu pages to save.
+    :return: None.
+    """
+    os.makedirs(pages_dir, exist_ok=True)
+    page_content = next(gpu_scraper.iter_pages())
+    for i, gpu_link in enumerate(gpu_scraper.get_gpu_links(page_content)[:num_pages]):
+        with open(os.path.join(pages_dir, '%03d.html' % i), 'wb') as page_file:
+            page_file.write(gpu_scraper.fetcher.get(gpu_link).content)
+
+
+def run_benchmark(store: dict, pages: List[bytes], repeat: int = 3) -> Dict[str, float]:
+    """
+    A method to measure the time of parsing the given gpu pages and finding their information with each backend.
+    :param store: the store's parameters (as in main.py).
+    :param pages: the contents of the saved gpu pages.
+    :param repeat: the number of times the pages are parsed. The best time is kept.
+    :return: a dictionary from the backend's name to the time per gpu page in milliseconds.
+    """
+    results = {}
+    for parser in PARSERS:
+        if parser != 'html.parser' and importlib.util.find_spec(parser) is None:
+            continue
+        for parse_only in (False, True):
+            gpu_scraper = GpuScraper(**{**store, 'parser': parser, 'parse_only': parse_only})
+            best_time = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                for page in pages:
+                    gpu_content = BeautifulSoup(page, parser, parse_only=gpu_scraper.gpu_strainer)
+                    gpu_scraper.handle_gpu_item(gpu_content)
+                elapsed = time.perf_counter() - start
+                best_time = elapsed if best_time is None else min(best_time, elapsed)
+            name = parser + (' + parse_only' if gpu_scraper.gpu_strainer is not None else '')
+            results[name] = 1000 * best_time / len(pages)
+    return results
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Benchmark the HTML parsing backends over saved gpu pages.')
+    arg_parser.add_argument('store_name', choices=[store['store_name'] for store in stores])
+    arg_parser.add_argument('pages_dir', help='the directory of the saved gpu pages (*.html).')
+    arg_parser.add_argument('--save', type=int, metavar='N', help='save N gpu pages of the store first.')
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args()
+
+    store = next(store for store in stores if store['store_name'] == args.store_name)
+    if args.save:
+        save_pages(GpuScraper(**store), args.pages_dir, args.save)
+    pages = []
+    for page_path in sorted(glob.glob(os.path.join(args.pages_dir, '*.html'))):
+        with open(page_path, 'rb') as page_file:
+            pages.append(page_file.read())
+    if not pages:
+        raise SystemExit('No saved pages in %s' % args.pages_dir)
+    for name, ms_per_page in run_benchmark(store, pages, args.repeat).items():
+        print('%-30s %8.2f ms per gpu page' % (name, ms_per_page))
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+import requests
+
+
+class ResponseCache:
+    """
+    A class to cache web pages on disk between runs, keyed by their links. Along with the page's body, it keeps the
+    page's 'ETag' and 'Last-Modified' headers (to make conditional requests), and optionally the result of parsing the
+    page, so that it can be reused when the page did not change.
+    """
+
+    def __init__(self, cache_dir: str = 'httpcache', max_age: float = 7 * 24 * 3600, max_size: int = 512 * 1024 ** 2):
+        """
+        The main constructor of the cache. It removes the entries which exceed the given limits.
+        :param cache_dir: the directory of the cache.
+        :param max_age: the maximum age of an entry in seconds, counted from the time the page was last downloaded.
+        :param max_size: the maximum total size of the cache in bytes. The oldest entries are removed first.
+        """
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.prune()
+
+    def get_path(self, link: str) -> str:
+        """
+        A method to get the path of the entry of the given link, without its extension.
+        :param link: the link of the page.
+        :return: the path of the entry.
+        """
+        key = hashlib.sha1(link.encode()).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def read_meta(self, link: str) -> Optional[dict]:
+        """
+        A method to read the metadata of the entry of the given link.
+        :param link: the link of the page.
+        :return: the metadata as a dictionary, or None if there is no entry of the link, or it is too old.
+        """
+        try:
+            with open(self.get_path(link) + '.json', encoding='utf-8') as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+        if meta.get('url') != link or time.time() - meta['stored_at'] > self.max_age:
+            return None
+        return meta
+
+    def write_meta(self, link: str, meta: dict) -> None:
+        """
+        A method to write the metadata of the entry of the given link.
+        :param link: the link of the page.
+        :param meta: the metadata as a dictionary.
+        :return: None.
+        """
+        path = self.get_path(link) + '.json'
+        temp_path = '%s.%d.tmp' % (path, threading.get_ident())
+        with open(temp_path, 'w', encoding='utf-8') as meta_file:
+            json.dump(meta, meta_file, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    def get_validators(self, link: str) -> dict:
+        """
+        A method to get the headers of a conditional request for the given link.
+        :param link: the link of the page.
+        :return: a dictionary of the 'If-None-Match' and 'If-Modified-Since' headers, which is empty if the page is not
+        cached.
+        """
+        meta = self.read_meta(link)
+        if meta is None or not os.path.exists(self.get_path(link) + '.body'):
+            return {}
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def get_body(self, link: str) -> Optional[bytes]:
+        """
+        A method to get the cached body of the page of the given link.
+        :param link: the link of the page.
+        :return: the body of the page, or None if it is not cached.
+        """
+        if self.read_meta(link) is None:
+            return None
+        try:
+            with open(self.get_path(link) + '.body', 'rb') as body_file:
+                return body_file.read()
+        except OSError:
+            return None
+
+    def store(self, link: str, response: requests.Response) -> None:
+        """
+        A method to store a downloaded page if it has an 'ETag' or a 'Last-Modified' header (otherwise it could not be
+        requested conditionally). Any parsing result stored for the old page is dropped.
+        :param link: the link of the page.
+        :param response: the response of the page.
+        :return: None.
+        """
+        etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+        path = self.get_path(link)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = '%s.%d.tmp' % (path, threading.get_ident())
+        with open(temp_path, 'wb') as body_file:
+            body_file.write(response.content)
+        os.replace(temp_path, path + '.body')
+        self.write_meta(link, {'url': link, 'etag': etag, 'last_modified': last_modified, 'stored_at': time.time()})
+
+    def refresh(self, link: str) -> None:
+        """
+        A method to mark the cached page of the given link as downloaded now, after the server confirmed that the page
+        did not change.
+        :param link: the link of the page.
+        :return: None.
+        """
+        meta = self.read_meta(link)
+        if meta is not None:
+            self.write_meta(link, {**meta, 'stored_at': time.time()})
+            try:
+                os.utime(self.get_path(link) + '.body')
+            except OSError:
+                pass
+
+    def get_result(self, link: str, result_key: str) -> Optional[dict]:
+        """
+        A method to get the stored result of parsing the cached page of the given link.
+        :param link: the link of the page.
+        :param result_key: a key identifying how the result was found (e.g. the selectors used), so that results of an
+        older configuration are not reused.
+        :return: the result, or None if there is no stored result of the cached page for this key.
+        """
+        meta = self.read_meta(link)
+        if meta is None or meta.get('result_key') != result_key:
+            return None
+        return meta.get('result')
+
+    def store_result(self, link: str, result_key: str, result: dict) -> None:
+        """
+        A method to store the result of parsing the cached page of the given link.
+        :param link: the link of the page.
+        :param result_key: a key identifying how the result was found.
+        :param result: the result as a JSON serializable dictionary.
+        :return: None.
+        """
+        meta = self.read_meta(link)
+        if meta is not None:
+            self.write_meta(link, {**meta, 'result_key': result_key, 'result': result})
+
+    def prune(self) -> None:
+        """
+        A method to remove the entries older than max_age, then the oldest entries until the total size of the cache
+        is at most max_size.
+        :return: None.
+        """
+        with self.lock:
+            entries = []
+            now = time.time()
+            for dir_path, _, file_names in os.walk(self.cache_dir):
+                for file_name in file_names:
+                    if not file_name.endswith('.body'):
+                        continue
+                    path = os.path.join(dir_path, file_name[:-len('.body')])
+                    try:
+                        stored_at = os.stat(path + '.body').st_mtime
+                        size = os.stat(path + '.body').st_size + os.stat(path + '.json').st_size
+                    except OSError:
+                        stored_at, size = 0, 0
+                    entries.append((stored_at, size, path))
+            entries.sort(reverse=True)
+            total_size = 0
+            for stored_at, size, path in entries:
+                total_size += size
+                if now - stored_at > self.max_age or total_size > self.max_size:
+                    for extension in ('.body', '.json'):
+                        try:
+                            os.remove(path + extension)
+                        except OSError:
+                            pass
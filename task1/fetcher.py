@@ -0,0 +1,187 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from store_engine.stream import StreamParser
+from task1.cache import ResponseCache
+
+
+USER_AGENT = ('Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_1) AppleWebKit/537.36 (KHTML, like Gecko) '
+              'Chrome/39.0.2171.95 Safari/537.36')
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+STREAM_CHUNK_SIZE = 16 * 1024
+
+
+class Fetcher:
+    """
+    A class to fetch web pages over pooled, keep-alive HTTP sessions (one session per host). Failed requests are retried
+    with an exponential backoff and jitter.
+    """
+
+    def __init__(self, timeout: Union[float, Tuple[float, float]] = (10, 30), max_retries: int = 3,
+                 backoff_factor: float = 1.0, max_backoff: float = 60.0, pool_maxsize: int = 10,
+                 headers: Optional[Dict[str, str]] = None, cache: Optional[ResponseCache] = None):
+        """
+        The main constructor of the fetcher.
+        :param timeout: the timeout of a request in seconds, either one number or a (connect, read) pair.
+        :param max_retries: the maximum number of times a request is retried after a connection error or a response
+        with one of the RETRY_STATUS_CODES.
+        :param backoff_factor: the delay in seconds before the first retry. It is doubled after each retry.
+        :param max_backoff: the maximum delay in seconds between two tries, unless the server asks for a longer delay
+        using the 'Retry-After' header.
+        :param pool_maxsize: the maximum number of connections kept open to the same host.
+        :param headers: the headers sent with every request. The default sends only a browser's 'User-Agent'.
+        :param cache: if it is given, the pages in the cache are requested conditionally, and their cached bodies are
+        reused when the server answers that they did not change ('304 Not Modified').
+        """
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.pool_maxsize = pool_maxsize
+        self.headers = {'User-Agent': USER_AGENT} if headers is None else headers
+        self.cache = cache
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def get_session(self, link: str) -> requests.Session:
+        """
+        A method to get the session of the host of the given link. The session is created on the first request to the
+        host, and then reused so that its connections are kept alive.
+        :param link: the link that needs to be requested.
+        :return: the session of the link's host.
+        """
+        host = urlsplit(link).netloc
+        with self.lock:
+            session = self.sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                session.headers.update(self.headers)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self.sessions[host] = session
+        return session
+
+    def get_retry_delay(self, retry_num: int, response: Optional[requests.Response] = None) -> float:
+        """
+        A method to find how long to wait before retrying a request. It uses the 'Retry-After' header of the response
+        if there is one, otherwise an exponential backoff with full jitter.
+        :param retry_num: the number of the retry (starting from zero).
+        :param response: the failed response, or None if the request failed with a connection error.
+        :return: the delay in seconds.
+        """
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after:
+                try:
+                    if retry_after.strip().isdigit():
+                        return float(retry_after)
+                    return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    pass
+        backoff = min(self.max_backoff, self.backoff_factor * 2 ** retry_num)
+        return random.uniform(0, backoff)
+
+    def get(self, link: str, stream_queries: Optional[Dict[str, str]] = None) -> requests.Response:
+        """
+        A method to request a web page given its link. Connection errors, timeouts and responses with one of the
+        RETRY_STATUS_CODES are retried up to max_retries times.
+        :param link: the link of the web page.
+        :param stream_queries: if it is given, the XPath selectors of the fields needed from the page. The page is then
+        read in chunks, and the download is stopped as soon as the first matches of all the selectors were found (see
+        read_content). A page whose download was stopped is not cached.
+        :return: the successful response. Its 'from_cache' attribute tells whether its content was taken from the cache
+        (because the page did not change), and its 'retries' attribute is the number of times it was retried.
+        :raises requests.RequestException: if the request still fails after all the retries.
+        """
+        session = self.get_session(link)
+        headers = self.cache.get_validators(link) if self.cache is not None else {}
+        retry_num = 0
+        while True:
+            try:
+                response = session.get(link, headers=headers, timeout=self.timeout, stream=stream_queries is not None)
+                if stream_queries is not None and response.status_code == 200:
+                    self.read_content(response, stream_queries)
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+                if retry_num >= self.max_retries:
+                    raise
+                time.sleep(self.get_retry_delay(retry_num))
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or retry_num >= self.max_retries:
+                    response.retries = retry_num
+                    return self.handle_response(link, response)
+                # A streamed response was not read, so its connection is only released once it is closed.
+                response.close()
+                time.sleep(self.get_retry_delay(retry_num, response))
+            retry_num += 1
+
+    def read_content(self, response: requests.Response, stream_queries: Dict[str, str]) -> None:
+        """
+        A method to read the content of a streamed response until the fields needed from the page were found (see
+        store_engine.stream). The rest of the page is not downloaded: the connection is closed instead of being reused.
+        :param response: the response, whose content was not read yet.
+        :param stream_queries: the XPath selectors of the fields.
+        :return: None. The content read is the response's content, and its 'truncated' attribute tells whether the
+        download was stopped.
+        """
+        parser = StreamParser(stream_queries, response.headers.get('Content-Type', '').encode('latin-1'))
+        chunks = []
+        response.truncated = False
+        try:
+            for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                chunks.append(chunk)
+                if parser.feed(chunk):
+                    response.truncated = True
+                    break
+        finally:
+            response.close()
+        response._content = b''.join(chunks)
+        response._content_consumed = True
+
+    def handle_response(self, link: str, response: requests.Response) -> requests.Response:
+        """
+        A method to check the final response of a request, and to update the cache with it. A '304 Not Modified'
+        response is turned into a successful response with the cached content. A page whose download was stopped is not
+        cached, since its cached content would be reused as the whole page.
+        :param link: the link of the web page.
+        :param response: the final response of the request.
+        :return: the successful response.
+        :raises requests.HTTPError: if the response is not successful.
+        """
+        response.from_cache = False
+        if response.status_code == 304 and self.cache is not None:
+            body = self.cache.get_body(link)
+            if body is not None:
+                self.cache.refresh(link)
+                response.status_code = 200
+                response._content = body
+                response.from_cache = True
+                return response
+        response.raise_for_status()
+        if response.status_code == 304:
+            raise requests.HTTPError('304 Not Modified without a cached page for url: %s' % link, response=response)
+        if self.cache is not None and not getattr(response, 'truncated', False):
+            self.cache.store(link, response)
+        return response
+
+    def close(self) -> None:
+        """
+        A method to close all the sessions of the fetcher (and their connections).
+        :return: None.
+        """
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
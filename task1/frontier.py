@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Set
+
+
+class Frontier:
+    """
+    A class to checkpoint the progress of a crawl to disk, so that an interrupted run continues where it stopped. The
+    progress is kept in a journal (a JSONL file) which is appended to as the crawl goes: the gpus list pages which were
+    handled, the end of the list pages of a store, and the gpu links waiting to be scraped. The gpus which were already
+    scraped are the ones in the output file (see add_done). The journal is removed once the run is done (see clear).
+    """
+
+    def __init__(self, path: str = 'frontier.jsonl'):
+        """
+        The main constructor of the frontier. It loads the journal of an interrupted run, if there is one.
+        :param path: the path of the journal.
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.next_pages: Dict[str, int] = {}
+        self.listed_stores: Set[str] = set()
+        self.pending: Dict[str, Dict[str, None]] = {}
+        self.done_urls: Set[str] = set()
+        self.resumed = False
+        if os.path.exists(path):
+            self.load()
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def load(self) -> None:
+        """
+        A method to load the journal of an interrupted run. A last line which was not completely written is ignored.
+        :return: None.
+        """
+        with open(self.path, encoding='utf-8') as journal:
+            for line in journal:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                self.resumed = True
+                store_name = event['store']
+                if event['event'] == 'page':
+                    self.next_pages[store_name] = max(self.next_pages.get(store_name, 0), event['page'] + 1)
+                elif event['event'] == 'listed':
+                    self.listed_stores.add(store_name)
+                elif event['event'] == 'pending':
+                    self.pending.setdefault(store_name, {})[event['url']] = None
+
+    def write(self, event: dict) -> None:
+        """
+        A method to append an event to the journal.
+        :param event: the event.
+        :return: None.
+        """
+        self.file.write(json.dumps(event, ensure_ascii=False) + '\n')
+        self.file.flush()
+
+    def add_done(self, urls: Iterable[str]) -> None:
+        """
+        A method to mark gpus as scraped, i.e. the gpus which were written to the output file before the run was
+        interrupted.
+        :param urls: the links of the gpus.
+        :return: None.
+        """
+        with self.lock:
+            self.done_urls.update(urls)
+
+    def get_next_page(self, store_name: str) -> Optional[int]:
+        """
+        A method to get the number of the first gpus list page of a store which was not handled.
+        :param store_name: the name of the store.
+        :return: the page number, or None if no page of the store was handled.
+        """
+        with self.lock:
+            return self.next_pages.get(store_name)
+
+    def is_listed(self, store_name: str) -> bool:
+        """
+        A method to find whether all the gpus list pages of a store were handled.
+        :param store_name: the name of the store.
+        :return: a boolean indicating whether the list pages of the store are done.
+        """
+        with self.lock:
+            return store_name in self.listed_stores
+
+    def get_pending(self, store_name: str) -> List[str]:
+        """
+        A method to get the links of the gpus of a store which were found but not scraped.
+        :param store_name: the name of the store.
+        :return: the links of the gpus, in the order they were found.
+        """
+        with self.lock:
+            return [url for url in self.pending.get(store_name, {}) if url not in self.done_urls]
+
+    def add_pending(self, store_name: str, url: str) -> bool:
+        """
+        A method to add the link of a gpu found in a gpus list page.
+        :param store_name: the name of the store.
+        :param url: the link of the gpu.
+        :return: a boolean indicating whether the gpu is new, False if it was already found or scraped.
+        """
+        with self.lock:
+            store_pending = self.pending.setdefault(store_name, {})
+            if url in store_pending or url in self.done_urls:
+                return False
+            store_pending[url] = None
+            self.write({'event': 'pending', 'store': store_name, 'url': url})
+            return True
+
+    def page_done(self, store_name: str, page_num: int) -> None:
+        """
+        A method to mark a gpus list page as handled, once all its gpus were added.
+        :param store_name: the name of the store.
+        :param page_num: the page number.
+        :return: None.
+        """
+        with self.lock:
+            self.next_pages[store_name] = max(self.next_pages.get(store_name, 0), page_num + 1)
+            self.write({'event': 'page', 'store': store_name, 'page': page_num})
+
+    def listing_done(self, store_name: str) -> None:
+        """
+        A method to mark all the gpus list pages of a store as handled.
+        :param store_name: the name of the store.
+        :return: None.
+        """
+        with self.lock:
+            self.listed_stores.add(store_name)
+            self.write({'event': 'listed', 'store': store_name})
+
+    def clear(self) -> None:
+        """
+        A method to remove the journal once the run is done.
+        :return: None.
+        """
+        self.close()
+        os.remove(self.path)
+
+    def close(self) -> None:
+        """
+        A method to close the journal.
+        :return: None.
+        """
+        if not self.file.closed:
+            self.file.close()
@@ -1,8 +1,18 @@
+import hashlib
 import time
-from typing import Tuple, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple, List, Optional, Iterator, Dict
 
-from bs4 import BeautifulSoup
-from task1.utils import read_link, get_fixed_text
+import requests
+import soupsieve
+from bs4 import BeautifulSoup, SoupStrainer
+from store_engine import extract, incremental
+from store_engine.metrics import Metrics
+from store_engine.normalize import RawRow, normalize_rows
+from store_engine.stream import compile_stream_xpath
+from store_engine.urls import SeenSet, canonicalize_url, join_link
+from task1.fetcher import Fetcher
+from task1.utils import parse_content, get_fixed_text, get_strainer
 
 
 COLUMNS = ['store_name', 'gpu_model', 'gpu_name', 'fetch_ts', 'gpu_price', 'in_stock', 'url']
@@ -15,7 +25,13 @@ class GpuScraper:
 
     def __init__(self, base_link: str, gpu_page_link: str, store_name: str, gpu_features_element: str,
                  gpu_name_element: str, gpu_price_element: str, in_stock_element: str, gpu_link_element: str,
-                 page_iterator_element: str, page_start_from_zero: bool, gpu_model_key: str, feature_separator: str):
+                 page_iterator_element: str, page_start_from_zero: bool, gpu_model_key: str, feature_separator: str,
+                 max_workers: int = 1, fetcher: Optional[Fetcher] = None, parser: str = 'html.parser',
+                 parse_only: bool = True, gpu_item_element: Optional[str] = None,
+                 gpu_item_name_element: Optional[str] = None, gpu_item_price_element: Optional[str] = None,
+                 previous_data: Optional[Dict[str, dict]] = None, refresh_after: float = 24 * 3600,
+                 metrics: Optional[Metrics] = None, batch_normalize: bool = False, stream: bool = False,
+                 seen_links: Optional[SeenSet] = None):
         """
         The main constructor of the scraper, it is used to store the information related to the site that needs to be
         scraped.
@@ -33,6 +49,36 @@ class GpuScraper:
         represents the key value of the gpu model.
         :param feature_separator: when features of some gpu are scraped, they are like (key, value) pairs separated by
         some string, for example ':'. This argument is for this separator.
+        :param max_workers: the maximum number of gpu pages (and, separately, of gpus list pages) of this store that are
+        fetched at the same time. The default (1) fetches them one after another.
+        :param fetcher: the fetcher used to read the store's pages. If it is not given, a new fetcher that keeps up to
+        2 * max_workers connections open to the store is created (the list pages are read ahead with the gpu pages).
+        :param parser: the parser used by BeautifulSoup to parse the store's pages, for example 'html.parser' or 'lxml'.
+        :param parse_only: a boolean indicating whether to parse only the parts of the pages which the selectors can
+        match (see get_strainer), instead of the whole pages.
+        :param gpu_item_element: the CSS selector of a gpu item (card) in the gpu list page. It is needed to find the
+        name and the price of the gpus in the gpu list page.
+        :param gpu_item_name_element: the CSS selector of the name element in a gpu item of the gpu list page.
+        :param gpu_item_price_element: the CSS selector of the price element in a gpu item of the gpu list page.
+        :param previous_data: the output of a previous run, as a dictionary from the gpus' links to their data (see
+        load_previous_data). If it is given, the scraper runs incrementally: a gpu of the previous output is not
+        fetched again, unless its data is older than refresh_after seconds, or its price in the gpu list page changed.
+        Instead, its previous data is returned as it is (with the original fetch_ts).
+        :param refresh_after: the maximum age in seconds of a gpu's previous data before it is fetched again.
+        :param metrics: the metrics which the scraper records, labelled with its store name: the fetch latency, the
+        parse time and the size of the pages, the extraction time of every field, the retries and the fields which
+        could not be found (see store_engine.metrics). It can be shared by the scrapers of many stores.
+        :param batch_normalize: a boolean indicating whether to leave the cleaning of the gpus' names, prices and
+        availabilities to a batch normalization stage (see store_engine.normalize). The scraped gpus are then raw rows
+        (RawRow), which iter_page and scrape normalize a gpus list page at once, and which the caller of scrape_gpu
+        needs to normalize (e.g. with normalize_batches).
+        :param stream: a boolean indicating whether to stop the download of a gpu page as soon as its name, price,
+        availability and model feature were found (see store_engine.stream), so that only the beginning of the page is
+        downloaded and parsed. It needs cssselect, to translate the CSS selectors to XPath.
+        :param seen_links: the set of the gpu links seen in a run (see store_engine.urls), which can be shared by the
+        scrapers of many stores. A gpu whose link (or an alias of it) was seen in an earlier gpus list page is skipped,
+        so it is neither fetched nor returned twice. The default is a new exact set. It is cleared when scrape or
+        iter_scrape starts.
         """
         self.base_link = base_link
         self.gpu_page_link = gpu_page_link
@@ -46,9 +92,55 @@ class GpuScraper:
         self.page_start_from_zero = page_start_from_zero
         self.gpu_model_key = gpu_model_key
         self.feature_separator = feature_separator
+        self.gpu_item_element = gpu_item_element
+        self.gpu_item_name_element = gpu_item_name_element
+        self.gpu_item_price_element = gpu_item_price_element
+        self.previous_data = previous_data
+        self.refresh_after = refresh_after
+        self.metrics = Metrics() if metrics is None else metrics
+        self.batch_normalize = batch_normalize
+        self.max_workers = max_workers
+        self.fetcher = Fetcher(pool_maxsize=2 * max_workers) if fetcher is None else fetcher
+        self.parser = parser
+        self.selectors = {name: soupsieve.compile(selector) for name, selector in [
+            ('gpu_features_element', gpu_features_element), ('gpu_name_element', gpu_name_element),
+            ('gpu_price_element', gpu_price_element), ('in_stock_element', in_stock_element),
+            ('gpu_link_element', gpu_link_element), ('page_iterator_element', page_iterator_element),
+            ('gpu_item_element', gpu_item_element), ('gpu_item_name_element', gpu_item_name_element),
+            ('gpu_item_price_element', gpu_item_price_element)] if selector is not None}
+        self.result_key = hashlib.sha1(repr((gpu_features_element, gpu_name_element, gpu_price_element,
+                                             in_stock_element, gpu_model_key, feature_separator,
+                                             batch_normalize)).encode()).hexdigest()
+        page_selectors = [gpu_link_element, page_iterator_element] + ([gpu_item_element] if gpu_item_element else [])
+        self.page_strainer = get_strainer(page_selectors) if parse_only else None
+        self.gpu_strainer = get_strainer([gpu_features_element, gpu_name_element, gpu_price_element,
+                                          in_stock_element]) if parse_only else None
+        self.stream_queries = self.get_stream_queries() if stream else None
+        self.seen_links = SeenSet() if seen_links is None else seen_links
         self.data = None
         self.last_scrape = None
 
+    def get_stream_queries(self) -> Dict[str, str]:
+        """
+        A method to get the XPath selectors of the fields of a gpu page, for the streaming parse of the page. The
+        features' selector only matches the feature of the gpu model.
+        :return: the XPath selectors by the fields' names.
+        :raises ValueError: if a selector cannot be streamed (see store_engine.stream.compile_stream_xpath).
+        """
+        from cssselect import HTMLTranslator
+
+        translator = HTMLTranslator()
+        model_key = "'%s'" % self.gpu_model_key if "'" not in self.gpu_model_key else '"%s"' % self.gpu_model_key
+        queries = {
+            'gpu_model': '(%s)[contains(., %s)]' % (translator.css_to_xpath(self.gpu_features_element), model_key),
+            'gpu_name': translator.css_to_xpath(self.gpu_name_element),
+            'gpu_price': translator.css_to_xpath(self.gpu_price_element),
+            'in_stock': translator.css_to_xpath(self.in_stock_element),
+        }
+        for query in queries.values():
+            compile_stream_xpath(query)
+        return queries
+
     def scrape(self) -> Tuple[List[dict], float]:
         """
         A method to run the scraping process. It goes through the gpus list pages one by one, then iterates over all the
@@ -58,16 +150,90 @@ class GpuScraper:
         :return: the output of the scraping process as a list of dictionaries (each element represents a gpu).
         COLUMNS, and the timestamp of the last fetch process.
         """
-        page_num = 0 if self.page_start_from_zero else 1
         self.data = []
-        while True:
-            page_content = read_link(self.gpu_page_link + str(page_num))
+        self.seen_links.clear()
+        for page_content in self.iter_pages():
             self.handle_page(page_content)
-            if self.is_last_page(page_content, page_num + self.page_start_from_zero):
-                break
-            page_num += 1
         return self.data, self.last_scrape
 
+    def iter_scrape(self) -> Iterator[dict]:
+        """
+        A method to run the scraping process like scrape, but each gpu is returned as soon as its information is
+        collected instead of being stored in the object's data.
+        :return: an iterator over the scraped gpus, each as a dictionary (COLUMNS).
+        """
+        self.seen_links.clear()
+        for page_content in self.iter_pages():
+            yield from self.iter_page(page_content)
+
+    def iter_pages(self, start_page: Optional[int] = None) -> Iterator[BeautifulSoup]:
+        """
+        A method to go through the gpus list pages of the store in order. As soon as a page shows the number of the last
+        page (in its page iterators), all the pages up to it are read ahead, max_workers pages at the same time, while
+        the caller handles the current page. If the last page is not shown, the pages are read one by one.
+        :param start_page: the number of the first page, e.g. to continue an interrupted run. The default is the first
+        page of the store.
+        :return: an iterator over the contents of the gpus list pages, whose numbers follow each other.
+        """
+        page_num = (0 if self.page_start_from_zero else 1) if start_page is None else start_page
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pages = {page_num: executor.submit(self.read_page, page_num)}
+            next_page_num = page_num + 1
+            while page_num in pages:
+                page_content = pages.pop(page_num).result()
+                last_page = self.get_last_page(page_content)
+                last_page_num = page_num + 1 if last_page is None else last_page - self.page_start_from_zero
+                for new_page_num in range(next_page_num, last_page_num + 1):
+                    pages[new_page_num] = executor.submit(self.read_page, new_page_num)
+                next_page_num = max(next_page_num, last_page_num + 1)
+                yield page_content
+                page_num += 1
+
+    def read_page(self, page_num: int) -> BeautifulSoup:
+        """
+        A method to read a gpus list page of the store given its number.
+        :param page_num: the page number.
+        :return: the contents of the gpus list page.
+        :raises requests.RequestException: if the page could not be read.
+        """
+        page = self.fetch(self.gpu_page_link + str(page_num), 'list')
+        return self.parse_page(page.content, self.page_strainer, 'list')
+
+    def fetch(self, link: str, page_type: str, stream_queries: Optional[Dict[str, str]] = None) -> requests.Response:
+        """
+        A method to request a page of the store, and record its fetch latency (including the retries), its size and
+        its number of retries.
+        :param link: the link of the page.
+        :param page_type: the type of the page, 'list' or 'gpu', which labels the metrics.
+        :param stream_queries: if it is given, the download of the page is stopped as soon as these XPath selectors
+        were found (see Fetcher.get).
+        :return: the successful response.
+        :raises requests.RequestException: if the page could not be read.
+        """
+        start = time.perf_counter()
+        try:
+            page = self.fetcher.get(link, stream_queries) if stream_queries is not None else self.fetcher.get(link)
+        finally:
+            self.metrics.observe('fetch_seconds', time.perf_counter() - start, store=self.store_name, page=page_type)
+        self.metrics.observe('response_bytes', len(page.content), store=self.store_name, page=page_type)
+        retries = getattr(page, 'retries', 0)
+        if retries:
+            self.metrics.inc('retries', retries, store=self.store_name, page=page_type)
+        if getattr(page, 'truncated', False):
+            self.metrics.inc('stopped_downloads', store=self.store_name, page=page_type)
+        return page
+
+    def parse_page(self, content: bytes, parse_only: Optional[SoupStrainer], page_type: str) -> BeautifulSoup:
+        """
+        A method to parse the content of a page of the store with its parser, and record the parse time.
+        :param content: the content of the page.
+        :param parse_only: if it is given, only the parts of the page matching it are parsed.
+        :param page_type: the type of the page, 'list' or 'gpu', which labels the metrics.
+        :return: the contents of the page as BeautifulSoup.
+        """
+        with self.metrics.timer('parse_seconds', store=self.store_name, page=page_type):
+            return parse_content(content, self.parser, parse_only)
+
     def get_gpu_model(self, gpu_content: BeautifulSoup) -> str:
         """
         A method to get the gpu model given the gpu page content. It goes through the features of the gpu, and finds its
@@ -76,21 +242,12 @@ class GpuScraper:
         :return: the gpu model. If it does not find the field of the gpu model, it returns an empty string.
         """
         try:
-            features = gpu_content.select(self.gpu_features_element)
-            value = ''
-            for feature in features:
-                try:
-                    feature_text = get_fixed_text(feature)
-                    key, value = feature_text.split(self.feature_separator, 1)
-                    if key == self.gpu_model_key:
-                        value_list = [word for word in value.split() if word.isascii()]
-                        value = ' '.join(value_list)
-                        break
-                except:
-                    continue
-            return value
+            feature_elements = self.selectors['gpu_features_element'].select(gpu_content)
+            features = [get_fixed_text(feature) for feature in feature_elements]
+            return extract.get_gpu_model(features, self.gpu_model_key, self.feature_separator)
         except Exception as e:
             print("Error while finding the GPU's model:", e)
+            self.metrics.inc('field_failures', store=self.store_name, field='gpu_model')
             return ''
 
     def get_gpu_name(self, gpu_content: BeautifulSoup):
@@ -98,38 +255,52 @@ class GpuScraper:
         A method to get the gpu name given the gpu page content. It selects the name element, and finds the name. If it
         does not find the field of the gpu name, it returns an empty string.
         :param gpu_content: the contents of the gpu page.
-        :return: the gpu name. If it does not find the field of the gpu name, it returns an empty string.
+        :return: the gpu name. If it does not find the field of the gpu name, it returns an empty string. With
+        batch_normalize, it returns the text of the name element, or None if it does not find it.
         """
         try:
-            gpu_name_element = gpu_content.select(self.gpu_name_element)[0]
+            gpu_name_element = self.selectors['gpu_name_element'].select(gpu_content)[0]
             gpu_name = get_fixed_text(gpu_name_element)
-            gpu_name = gpu_name.split(' (')[0]
-            gpu_name = gpu_name.split(' [')[0]
-            gpu_name_list = [word for word in gpu_name.split() if word.isascii()]
-            gpu_name = ' '.join(gpu_name_list)
-            return gpu_name
+            return gpu_name if self.batch_normalize else self.fix_gpu_name(gpu_name)
         except Exception as e:
             print("Error while finding the GPU's name:", e)
-            return ''
+            self.metrics.inc('field_failures', store=self.store_name, field='gpu_name')
+            return None if self.batch_normalize else ''
 
     def get_gpu_price(self, gpu_content: BeautifulSoup) -> str:
         """
         A method to get the gpu price given the gpu page content. It selects the price element and finds the price. If
         it does not find the field of the gpu price, it returns an empty string.
         :param gpu_content: the contents of the gpu page.
-        :return: the gpu price. If it does not find the field of the gpu price, it returns an empty string.
+        :return: the gpu price. If it does not find the field of the gpu price, it returns an empty string. With
+        batch_normalize, it returns the text of the price element, or None if it does not find it.
         """
         try:
-            gpu_price_element = gpu_content.select(self.gpu_price_element)[0]
+            gpu_price_element = self.selectors['gpu_price_element'].select(gpu_content)[0]
             gpu_price = get_fixed_text(gpu_price_element)
-            gpu_price = gpu_price.replace(' ', '')
-            while not gpu_price[-1].isdigit():
-                gpu_price = gpu_price[:-1]
-            assert int(gpu_price)
-            return gpu_price
+            return gpu_price if self.batch_normalize else self.fix_price(gpu_price)
         except Exception as e:
             print("Error while finding the GPU's price:", e)
-            return ''
+            self.metrics.inc('field_failures', store=self.store_name, field='gpu_price')
+            return None if self.batch_normalize else ''
+
+    def fix_gpu_name(self, gpu_name: str) -> str:
+        """
+        A method to fix the gpu name. It takes rid of the parts that are inside parenthesis and the words which are not
+        ascii.
+        :param gpu_name: the original gpu name.
+        :return: a modified version of the gpu name.
+        """
+        return extract.fix_gpu_name(gpu_name, ascii_only=True)
+
+    def fix_price(self, gpu_price: str) -> str:
+        """
+        A method to fix the price by eliminating the spaces and the currency.
+        :param gpu_price: a price string which needs to be fixed.
+        :return: a modified version of the price.
+        :raises ValueError: if the string does not contain a price.
+        """
+        return extract.fix_price(gpu_price)
 
     def get_in_stock(self, gpu_content: BeautifulSoup) -> bool:
         """
@@ -138,30 +309,34 @@ class GpuScraper:
         available in stock.
         :param gpu_content: the contents of the gpu page.
         :return: a boolean indicating whether the gpu is available in stock. If it does not find the field of the gpu
-        in-stock, it assumes it is not available in stock (returns False).
+        in-stock, it assumes it is not available in stock (returns False). With batch_normalize, it returns the text of
+        the in-stock element, or None if it does not find it.
         """
         try:
-            in_stock_element = gpu_content.select(self.in_stock_element)[0]
+            in_stock_element = self.selectors['in_stock_element'].select(gpu_content)[0]
             in_stock = get_fixed_text(in_stock_element)
-            if in_stock != '= 0 шт.':
-                return True
-            return False
+            return in_stock if self.batch_normalize else extract.is_in_stock(in_stock)
         except Exception as e:
             print("Error while finding if the GPU's is in-stock (assuming it is not):", e)
-            return False
+            self.metrics.inc('field_failures', store=self.store_name, field='in_stock')
+            return None if self.batch_normalize else False
 
     def handle_gpu_item(self, gpu_content: BeautifulSoup) -> dict:
         """
         a method for finding a gpu item following information: its model, its name, its price, and if it is available in
-        stock. It stores these information in a dictionary, and returns this dictionary.
+        stock. It stores these information in a dictionary, and returns this dictionary. The extraction time of every
+        field is recorded.
         :param gpu_content: the contents of the gpu page.
         :return: a dictionary containing the gpu info: its model, its name, its price, and if it is available in stock.
         """
-        gpu_data = {'gpu_model': self.get_gpu_model(gpu_content).strip(),
-                    'gpu_name': self.get_gpu_name(gpu_content).strip(),
-                    'gpu_price': self.get_gpu_price(gpu_content),
-                    'in_stock': self.get_in_stock(gpu_content)
-                    }
+        gpu_data = {}
+        for field, get_field in (('gpu_model', self.get_gpu_model), ('gpu_name', self.get_gpu_name),
+                                 ('gpu_price', self.get_gpu_price), ('in_stock', self.get_in_stock)):
+            with self.metrics.timer('extract_seconds', store=self.store_name, field=field):
+                gpu_data[field] = get_field(gpu_content)
+        gpu_data['gpu_model'] = gpu_data['gpu_model'].strip()
+        if not self.batch_normalize:
+            gpu_data['gpu_name'] = gpu_data['gpu_name'].strip()
         return gpu_data
 
     def is_last_page(self, page_content: BeautifulSoup, page_num: int) -> bool:
@@ -172,16 +347,18 @@ class GpuScraper:
         :param page_num: the page number of the given page.
         :return: a boolean indicating whether the given page is the last page.
         """
-        page_iterator_elements = page_content.select(self.page_iterator_element)
-        for page_iterator_element in page_iterator_elements[::-1]:
-            element_text = get_fixed_text(page_iterator_element)
-            element_text = element_text.replace(' ', '')
-            if element_text.isdigit():
-                last_page_iterator = int(element_text)
-                break
-        else:
-            return False
-        return last_page_iterator <= page_num
+        last_page_iterator = self.get_last_page(page_content)
+        return last_page_iterator is not None and last_page_iterator <= page_num
+
+    def get_last_page(self, page_content: BeautifulSoup) -> Optional[int]:
+        """
+        A method to find the number of the last gpu list page given the content of a gpu list page. It finds the last
+        page iterator in the page which is a number.
+        :param page_content: the contents of the gpus list page.
+        :return: the number of the last page (as shown in the page iterators), or None if there is no such iterator.
+        """
+        page_iterator_elements = self.selectors['page_iterator_element'].select(page_content)
+        return extract.get_last_page(get_fixed_text(element) for element in page_iterator_elements)
 
     def append_data(self, new_data: dict) -> None:
         """
@@ -191,6 +368,186 @@ class GpuScraper:
         """
         self.data.append(new_data)
 
+    def scrape_gpu(self, gpu_link: str, raise_errors: bool = False) -> Optional[Tuple[dict, float]]:
+        """
+        A method to scrape a single gpu given its link. It reads the gpu page and finds the necessary information. If
+        the fetcher has a cache and the gpu page did not change since it was cached, the information found the last
+        time is reused.
+        :param gpu_link: the link of the gpu page.
+        :param raise_errors: a boolean indicating whether to raise the error when the gpu page could not be read,
+        instead of returning None.
+        :return: a dictionary containing the gpu's data (COLUMNS, a RawRow with batch_normalize), and the timestamp of
+        the fetch process. If the gpu page could not be read, it returns None.
+        :raises requests.RequestException: if the gpu page could not be read and raise_errors is True.
+        """
+        try:
+            page = self.fetch(gpu_link, 'gpu', self.stream_queries)
+        except requests.RequestException as e:
+            if raise_errors:
+                raise
+            print("Error while reading the GPU's page (skipping it):", e)
+            return None
+        now = time.time()
+        return self.make_row(gpu_link, self.get_gpu_data(gpu_link, page), now), now
+
+    def get_gpu_data(self, gpu_link: str, page: requests.Response) -> dict:
+        """
+        A method to find the information of a gpu in its page. If the fetcher has a cache and the gpu page did not
+        change since it was cached, the information found the last time is reused.
+        :param gpu_link: the link of the gpu page.
+        :param page: the successful response of the gpu page.
+        :return: a dictionary containing the gpu info (see handle_gpu_item).
+        """
+        cache = self.fetcher.cache
+        gpu_data = cache.get_result(gpu_link, self.result_key) if cache is not None and page.from_cache else None
+        if gpu_data is None:
+            gpu_data = self.handle_gpu_item(self.parse_page(page.content, self.gpu_strainer, 'gpu'))
+            if cache is not None:
+                cache.store_result(gpu_link, self.result_key, gpu_data)
+        return gpu_data
+
+    def make_row(self, gpu_link: str, gpu_data: dict, fetch_time: float) -> dict:
+        """
+        A method to make the output row of a scraped gpu.
+        :param gpu_link: the link of the gpu page.
+        :param gpu_data: the gpu info (see handle_gpu_item).
+        :param fetch_time: the timestamp of the fetch process.
+        :return: a dictionary containing the gpu's data (COLUMNS, a RawRow with batch_normalize).
+        """
+        gpu_data = {**gpu_data, 'store_name': self.store_name, 'fetch_ts': int(fetch_time), 'url': gpu_link}
+        return RawRow(gpu_data) if self.batch_normalize else gpu_data
+
+    def get_gpu_items(self, page_content: BeautifulSoup) -> List[Tuple[str, dict]]:
+        """
+        A method to get the gpus in a gpus list page given its content. For each gpu, it finds its link, and when the
+        gpu items' selectors are given, its name and price as shown in the list page. The extraction time of the whole
+        list is recorded as the 'gpu_items' field.
+        :param page_content: the contents of the gpus list page.
+        :return: a list of (link, data) pairs, where the data is a dictionary that may contain the gpu's 'gpu_name' and
+        'gpu_price'.
+        """
+        with self.metrics.timer('extract_seconds', store=self.store_name, field='gpu_items'):
+            return self.find_gpu_items(page_content)
+
+    def get_new_gpu_items(self, page_content: BeautifulSoup) -> List[Tuple[str, dict]]:
+        """
+        A method to get the gpus in a gpus list page like get_gpu_items, without the gpus whose links were seen in the
+        run (see seen_links). The gpus skipped are counted in the 'duplicate_links' metric.
+        :param page_content: the contents of the gpus list page.
+        :return: a list of (link, data) pairs of the new gpus.
+        """
+        gpu_items = self.get_gpu_items(page_content)
+        new_gpu_items = [(gpu_link, item_data) for gpu_link, item_data in gpu_items if self.seen_links.add(gpu_link)]
+        if len(new_gpu_items) < len(gpu_items):
+            self.metrics.inc('duplicate_links', len(gpu_items) - len(new_gpu_items), store=self.store_name)
+        return new_gpu_items
+
+    def find_gpu_items(self, page_content: BeautifulSoup) -> List[Tuple[str, dict]]:
+        """
+        A method to find the gpus in a gpus list page given its content (see get_gpu_items).
+        :param page_content: the contents of the gpus list page.
+        :return: a list of (link, data) pairs.
+        """
+        if 'gpu_item_element' not in self.selectors:
+            gpu_link_items = self.selectors['gpu_link_element'].select(page_content)
+            return [(canonicalize_url(join_link(self.base_link, gpu_link_item['href'])), {})
+                    for gpu_link_item in gpu_link_items]
+        gpu_items = []
+        for gpu_item in self.selectors['gpu_item_element'].select(page_content):
+            gpu_link_item = self.selectors['gpu_link_element'].select_one(gpu_item)
+            if gpu_link_item is None:
+                continue
+            item_data = {}
+            name_element = self.select_item_field(gpu_item, 'gpu_item_name_element')
+            if name_element is not None:
+                item_data['gpu_name'] = self.fix_gpu_name(get_fixed_text(name_element)).strip()
+            price_element = self.select_item_field(gpu_item, 'gpu_item_price_element')
+            if price_element is not None:
+                try:
+                    item_data['gpu_price'] = self.fix_price(get_fixed_text(price_element))
+                except Exception:
+                    pass
+            gpu_items.append((canonicalize_url(join_link(self.base_link, gpu_link_item['href'])), item_data))
+        return gpu_items
+
+    def select_item_field(self, gpu_item: BeautifulSoup, selector_name: str) -> Optional[BeautifulSoup]:
+        """
+        A method to select a field of a gpu item in the gpus list page.
+        :param gpu_item: the gpu item element.
+        :param selector_name: the name of the field's selector, e.g. 'gpu_item_price_element'.
+        :return: the field's element, or None if the selector is not given or does not match.
+        """
+        selector = self.selectors.get(selector_name)
+        return None if selector is None else selector.select_one(gpu_item)
+
+    def get_gpu_links(self, page_content: BeautifulSoup) -> List[str]:
+        """
+        A method to get the links of the gpus in a gpus list page given its content.
+        :param page_content: the contents of the gpus list page.
+        :return: a list of the gpu pages' links.
+        """
+        return [gpu_link for gpu_link, _ in self.get_gpu_items(page_content)]
+
+    def get_previous_row(self, gpu_link: str, item_data: dict) -> Optional[dict]:
+        """
+        A method to find whether the previous data of a gpu can be reused in an incremental run. It can be reused if it
+        is not older than refresh_after seconds, and the gpu's price in the gpus list page did not change.
+        :param gpu_link: the link of the gpu page.
+        :param item_data: the data of the gpu in the gpus list page (see get_gpu_items).
+        :return: the previous data of the gpu, or None if the gpu needs to be fetched.
+        """
+        return incremental.get_previous_row(self.previous_data, gpu_link, item_data, self.refresh_after)
+
+    def iter_page(self, page_content: BeautifulSoup) -> Iterator[dict]:
+        """
+        A method to scrape the gpus in a gpus list page given its content. When max_workers is more than one, the gpu
+        pages are fetched concurrently, but the gpus are still returned in the order of the list. In an incremental
+        run, the gpus whose previous data can be reused are not fetched, and the gpus which were seen in an earlier page
+        are skipped. With batch_normalize, the gpus of the page are normalized at once, after all of them are scraped.
+        :param page_content: the contents of the gpus list page.
+        :return: an iterator over the scraped gpus, each as a dictionary (COLUMNS).
+        """
+        gpu_items = self.get_new_gpu_items(page_content)
+        previous_rows = [self.get_previous_row(gpu_link, item_data) for gpu_link, item_data in gpu_items]
+        gpu_links = [gpu_link for (gpu_link, _), previous_row in zip(gpu_items, previous_rows) if previous_row is None]
+        if self.max_workers > 1 and len(gpu_links) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(gpu_links))) as executor:
+                rows = self.collect_results(previous_rows, executor.map(self.scrape_gpu, gpu_links))
+                yield from self.normalize_rows(rows)
+        else:
+            yield from self.normalize_rows(self.collect_results(previous_rows, map(self.scrape_gpu, gpu_links)))
+
+    def normalize_rows(self, rows: Iterator[dict]) -> Iterator[dict]:
+        """
+        A method to normalize the raw gpus scraped with batch_normalize at once (see store_engine.normalize). Without
+        batch_normalize, the gpus are returned as they come.
+        :param rows: the scraped gpus.
+        :return: an iterator over the normalized gpus.
+        """
+        if not self.batch_normalize:
+            return rows
+        return iter(normalize_rows(list(rows), ascii_only=True))
+
+    def collect_results(self, previous_rows: List[Optional[dict]],
+                        results: Iterator[Optional[Tuple[dict, float]]]) -> Iterator[dict]:
+        """
+        A method to merge the reused previous data of the gpus of a list page with the results of scrape_gpu (in the
+        order of the list). It skips the gpus that could not be read, and keeps the timestamp of the last fetch process.
+        :param previous_rows: the reused previous data of each gpu in the list, or None for the gpus that are fetched.
+        :param results: the results of scrape_gpu for the gpus that are fetched.
+        :return: an iterator over the scraped gpus.
+        """
+        for previous_row in previous_rows:
+            if previous_row is not None:
+                yield previous_row
+                continue
+            result = next(results)
+            if result is None:
+                continue
+            gpu_data, fetch_time = result
+            self.last_scrape = fetch_time if self.last_scrape is None else max(self.last_scrape, fetch_time)
+            yield gpu_data
+
     def handle_page(self, page_content: BeautifulSoup):
         """
         A method to handle a gpus list page given its content. It goes through each gpu in the list, enters its link,
@@ -198,14 +555,8 @@ class GpuScraper:
         :param page_content: the contents of the gpus list page.
         :return: None.
         """
-        gpu_links = page_content.select(self.gpu_link_element)
-        for gpu_link_item in gpu_links:
-            gpu_link = self.base_link + gpu_link_item['href']
-            gpu_content = read_link(gpu_link)
-            now = time.time()
-            self.last_scrape = now
-            gpu_data = self.handle_gpu_item(gpu_content)
-            self.append_data({**gpu_data, 'store_name': self.store_name, 'fetch_ts': int(now), 'url': gpu_link})
+        for gpu_data in self.iter_page(page_content):
+            self.append_data(gpu_data)
 
     def get_data(self) -> Tuple[List[dict], float]:
         """
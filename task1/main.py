@@ -1,48 +1,93 @@
-import csv
+import os
+import sys
 
+from store_engine import get_store_config, load_previous_data, load_stores
+from store_engine import parquet
+from store_engine.history import HistoryStore, format_diff
+from store_engine.metrics import Metrics
+from store_engine.normalize import normalize_batches
+from task1.cache import ResponseCache
+from task1.fetcher import Fetcher
+from task1.frontier import Frontier
 from task1.gpu_scraper import *
+from task1.pipeline import ScrapePipeline
+from task1.writers import RowWriter
 
 OUTPUT_FILE = 'output.csv'
+# The run writes to this file, which replaces OUTPUT_FILE once the run is done: the previous output, which the
+# incremental run reuses, is kept until then.
+TEMP_OUTPUT_FILE = OUTPUT_FILE + '.tmp'
+CACHE_DIR = 'httpcache'
+METRICS_FILE = 'metrics.prom'
+PARQUET_DIR = 'gpus'
+HISTORY_DB = 'history.sqlite'
+FRONTIER_FILE = 'frontier.jsonl'
+NORMALIZE_BATCH_SIZE = 1000
+REFRESH_AFTER = 24 * 3600
 
-stores = [
-        {
-            'store_name': 'OnlineTrade',
-            'base_link': 'https://www.onlinetrade.ru/',
-            'gpu_page_link': 'https://www.onlinetrade.ru/catalogue/videokarty-c338/?page=',
-            'gpu_features_element': 'li.featureList__item',
-            'gpu_name_element': 'div.productPage__card  h1',
-            'gpu_price_element': 'span.js__actualPrice',
-            'in_stock_element': 'span.catalog__displayedItem__availabilityCount label',
-            'gpu_link_element': 'div.indexGoods__item__flexCover > div > a[href]',
-            'page_iterator_element': 'div.paginator > div.paginator__links > a',
-            'gpu_model_key': 'Графический процессор',
-            'feature_separator': ':',
-            'page_start_from_zero': True
-        },
-        {
-            'store_name': 'Regard',
-            'base_link': 'https://regard.ru',
-            'gpu_page_link': 'https://www.regard.ru/catalog/group4000.htm/page',
-            'gpu_features_element': '#tabs-1 > table tr',
-            'gpu_name_element': '#goods_head',
-            'gpu_price_element': '#hits-long > div.content > div.block.bblock-long.lot > div.bcontent.lot > div.goods_price > div.price_block > span.price.lot > span',
-            'in_stock_element': '#hits-long > div.content > div.block.bblock-long.lot > div.bcontent.lot > div.goods_price > div.action_block.left > div > div',
-            'gpu_link_element': '#hits > div.content > div.block > div.bcontent > div.aheader > a',
-            'page_iterator_element': '#hits > div.content > div.pagination > a',
-            'gpu_model_key': 'Серия',
-            'feature_separator': '  ',
-            'page_start_from_zero': False
-        }
-]
+stores = [get_store_config(store, 'css', 'requests') for store in load_stores()]
+
+
+def end_run(pipeline: ScrapePipeline, history: HistoryStore, frontier: Frontier,
+            temp_output_file: str = TEMP_OUTPUT_FILE, output_file: str = OUTPUT_FILE) -> bool:
+    """
+    A method to end a run. If every page was read, the run is finished: its diff is printed, the frontier's journal is
+    removed and the temporary output replaces the output. Otherwise, the output is incomplete, so the history run is
+    left open, and the temporary output and the journal are kept: the next run continues the run and scrapes again the
+    pages which failed.
+    :param pipeline: the pipeline of the run.
+    :param history: the price history of the run.
+    :param frontier: the frontier of the run.
+    :param temp_output_file: the path of the run's temporary output.
+    :param output_file: the path of the output.
+    :return: a boolean indicating whether the run was finished.
+    """
+    if pipeline.failed:
+        history.suspend_run()
+        print("Error while scraping the stores (%d stores and %d GPUs failed, keeping %s and %s for the next run):"
+              % (len(pipeline.failed_stores), len(pipeline.failed_links), temp_output_file, frontier.path),
+              ', '.join(pipeline.failed_stores + pipeline.failed_links))
+        return False
+    print(format_diff(history.finish_run()))
+    frontier.clear()
+    os.replace(temp_output_file, output_file)
+    return True
 
 
 if __name__ == '__main__':
-    all_data = []
-    for store in stores:
-        gpu_scraper = GpuScraper(**store)
-        store_data, last_scrape = gpu_scraper.scrape()
-        all_data += store_data
-    with open(OUTPUT_FILE, 'w') as csv_file:
-        writer = csv.DictWriter(csv_file, fieldnames=COLUMNS)
-        writer.writeheader()
-        writer.writerows(all_data)
+    cache = ResponseCache(CACHE_DIR)
+    previous_data = load_previous_data(OUTPUT_FILE)
+    # If the last run was interrupted, it is continued: the gpus already in its temporary output are not scraped again.
+    frontier = Frontier(FRONTIER_FILE)
+    done_data = load_previous_data(TEMP_OUTPUT_FILE) if frontier.resumed else {}
+    frontier.add_done(done_data)
+    metrics = Metrics()
+    gpu_scrapers = [GpuScraper(**store, fetcher=Fetcher(pool_maxsize=2 * store['max_workers'], cache=cache),
+                               previous_data=previous_data, refresh_after=REFRESH_AFTER, metrics=metrics,
+                               batch_normalize=True, stream=True)
+                    for store in stores]
+    # The gpus are also written to a Parquet dataset when pyarrow is installed (see store_engine.parquet).
+    parquet_writer = parquet.ParquetWriter(PARQUET_DIR) if parquet.pyarrow is not None else None
+    history = HistoryStore(HISTORY_DB)
+    for row in done_data.values():
+        history.record(row)
+    try:
+        with RowWriter(TEMP_OUTPUT_FILE, file_format='csv', mode='a' if frontier.resumed else 'w') as writer:
+            # The scrapers deliver raw gpus, which are normalized NORMALIZE_BATCH_SIZE at once (see
+            # store_engine.normalize).
+            pipeline = ScrapePipeline(gpu_scrapers, frontier=frontier)
+            rows = normalize_batches(pipeline.run(), NORMALIZE_BATCH_SIZE, ascii_only=True)
+            for row in rows:
+                writer.write(row)
+                history.record(row)
+                if parquet_writer is not None:
+                    parquet_writer.write(row)
+        finished = end_run(pipeline, history, frontier)
+    finally:
+        frontier.close()
+        history.close()
+        if parquet_writer is not None:
+            parquet_writer.close()
+        metrics.write_prometheus(METRICS_FILE)
+    if not finished:
+        sys.exit(1)
@@ -0,0 +1,161 @@
+import queue
+import threading
+from typing import Iterator, List, Optional
+
+import requests
+from task1.frontier import Frontier
+from task1.gpu_scraper import GpuScraper
+
+# The statuses of the gpu pages which were removed from the store. They are skipped, and they do not fail the run.
+GONE_STATUS_CODES = (404, 410)
+
+
+class ScrapePipeline:
+    """
+    A class to scrape many stores at the same time as a producer/consumer pipeline. Each store has a producer that
+    crawls its gpus list pages ahead and puts the gpu links into the store's bounded queue, and a pool of workers (its
+    scraper's max_workers) which takes the links from the queue and scrapes the gpus. The stores do not share their
+    queues nor their workers, so a slow store does not hold the workers of the others. With a frontier, the progress of
+    the crawl is checkpointed, and an interrupted run continues where it stopped. The gpu pages and the stores' list
+    pages which could not be read are recorded (see failed), so that a run whose output is incomplete is not taken for
+    a finished one.
+    """
+
+    done = object()
+
+    def __init__(self, scrapers: List[GpuScraper], num_workers: Optional[int] = None, queue_size: int = 100,
+                 frontier: Optional[Frontier] = None):
+        """
+        The main constructor of the pipeline.
+        :param scrapers: the scrapers of the stores that need to be scraped.
+        :param num_workers: the number of workers scraping the gpu pages of every store. The default is the store's
+        max_workers.
+        :param queue_size: the maximum number of gpu links waiting in the queue of every store. A producer waits when
+        its queue is full, so the list pages are not crawled too far ahead of the gpu pages.
+        :param frontier: the frontier which checkpoints the gpus list pages handled and the gpu links found. If it is
+        loaded from an interrupted run, the links found but not scraped are scraped first, and the list pages continue
+        from the first page which was not handled. The caller marks the gpus as scraped (see Frontier.add_done).
+        """
+        self.scrapers = scrapers
+        self.frontier = frontier
+        self.num_workers = [scraper.max_workers if num_workers is None else num_workers for scraper in scrapers]
+        self.links = [queue.Queue(maxsize=queue_size) for _ in scrapers]
+        self.results = queue.Queue()
+        self.failed_links: List[str] = []
+        self.failed_stores: List[str] = []
+
+    @property
+    def failed(self) -> bool:
+        """
+        :return: a boolean indicating whether a gpu page or a gpus list page could not be read in the last run, so that
+        some gpus are missing from its results.
+        """
+        return bool(self.failed_links or self.failed_stores)
+
+    def run(self) -> Iterator[dict]:
+        """
+        A method to run the pipeline. The data of every gpu is returned as soon as it is scraped, so the gpus of
+        different stores are mixed.
+        :return: an iterator over the scraped gpus, each as a dictionary (COLUMNS).
+        """
+        self.failed_links = []
+        self.failed_stores = []
+        for seen_links in {id(scraper.seen_links): scraper.seen_links for scraper in self.scrapers}.values():
+            seen_links.clear()
+        producers = [threading.Thread(target=self.produce, args=(store_index,), daemon=True)
+                     for store_index in range(len(self.scrapers))]
+        workers = [[threading.Thread(target=self.work, args=(store_index,), daemon=True) for _ in range(num_workers)]
+                   for store_index, num_workers in enumerate(self.num_workers)]
+        for thread in producers + [worker for store_workers in workers for worker in store_workers]:
+            thread.start()
+        threading.Thread(target=self.finish, args=(producers, workers), daemon=True).start()
+        while True:
+            result = self.results.get()
+            if result is self.done:
+                break
+            store_index, gpu_data, fetch_time = result
+            scraper = self.scrapers[store_index]
+            if fetch_time is not None:
+                scraper.last_scrape = fetch_time if scraper.last_scrape is None else max(scraper.last_scrape,
+                                                                                          fetch_time)
+            yield gpu_data
+
+    def produce(self, store_index: int) -> None:
+        """
+        A method to crawl the gpus list pages of a store and put the links of its gpus into its queue. In an
+        incremental run, the gpus whose previous data can be reused are put directly into the results.
+        :param store_index: the index of the store's scraper.
+        :return: None.
+        """
+        scraper = self.scrapers[store_index]
+        store_name = scraper.store_name
+        frontier = self.frontier
+        page_num = 0 if scraper.page_start_from_zero else 1
+        if frontier is not None:
+            for gpu_link in frontier.get_pending(store_name):
+                self.links[store_index].put(gpu_link)
+            if frontier.is_listed(store_name):
+                return
+            next_page = frontier.get_next_page(store_name)
+            page_num = page_num if next_page is None else next_page
+        try:
+            for page_content in scraper.iter_pages(page_num):
+                for gpu_link, item_data in scraper.get_new_gpu_items(page_content):
+                    if frontier is not None and not frontier.add_pending(store_name, gpu_link):
+                        continue
+                    previous_row = scraper.get_previous_row(gpu_link, item_data)
+                    if previous_row is not None:
+                        self.results.put((store_index, previous_row, None))
+                    else:
+                        self.links[store_index].put(gpu_link)
+                if frontier is not None:
+                    frontier.page_done(store_name, page_num)
+                page_num += 1
+            if frontier is not None:
+                frontier.listing_done(store_name)
+        except requests.RequestException as e:
+            print("Error while reading the GPUs list page of %s (stopping the store):" % scraper.store_name, e)
+            self.failed_stores.append(store_name)
+
+    def work(self, store_index: int) -> None:
+        """
+        A method to scrape the gpu links in the queue of a store until its producer is done. The gpus whose pages could
+        not be read are recorded in failed_links, except for the pages which were removed (GONE_STATUS_CODES).
+        :param store_index: the index of the store's scraper.
+        :return: None.
+        """
+        scraper = self.scrapers[store_index]
+        while True:
+            gpu_link = self.links[store_index].get()
+            if gpu_link is self.done:
+                break
+            try:
+                result = scraper.scrape_gpu(gpu_link, raise_errors=True)
+            except requests.HTTPError as e:
+                if e.response is not None and e.response.status_code in GONE_STATUS_CODES:
+                    print("Error while scraping the GPU's page (it was removed, skipping it):", e)
+                    continue
+                print("Error while scraping the GPU's page (skipping it):", e)
+                self.failed_links.append(gpu_link)
+                continue
+            except Exception as e:
+                print("Error while scraping the GPU's page (skipping it):", e)
+                self.failed_links.append(gpu_link)
+                continue
+            self.results.put((store_index, *result))
+
+    def finish(self, producers: List[threading.Thread], workers: List[List[threading.Thread]]) -> None:
+        """
+        A method to stop the workers of every store after its producer is done, and then mark the end of the results.
+        :param producers: the producers' threads.
+        :param workers: the workers' threads of every store.
+        :return: None.
+        """
+        for store_index, producer in enumerate(producers):
+            producer.join()
+            for _ in workers[store_index]:
+                self.links[store_index].put(self.done)
+        for store_workers in workers:
+            for worker in store_workers:
+                worker.join()
+        self.results.put(self.done)
@@ -1,19 +1,65 @@
+import re
+from typing import List, Optional
 
-from bs4 import BeautifulSoup
-import requests
+from bs4 import BeautifulSoup, SoupStrainer
+from task1.fetcher import Fetcher
 
 
-def read_link(link: str) -> BeautifulSoup:
+default_fetcher = Fetcher()
+
+
+def read_link(link: str, fetcher: Optional[Fetcher] = None, parser: str = 'html.parser',
+              parse_only: Optional[SoupStrainer] = None) -> BeautifulSoup:
     """
     A method to read a web page given its link. It returns the contents of the page.
     :param link: the link of the web page.
+    :param fetcher: the fetcher used to request the page. If it is not given, a fetcher shared by the module is used.
+    :param parser: the parser used by BeautifulSoup, for example 'html.parser' or 'lxml'.
+    :param parse_only: if it is given, only the parts of the page matching it are parsed.
     :return: the contents of the page as BeautifulSoup.
+    :raises requests.RequestException: if the page could not be read.
+    """
+    page = (fetcher or default_fetcher).get(link)
+    return parse_content(page.content, parser, parse_only)
+
+
+def parse_content(content: bytes, parser: str = 'html.parser',
+                  parse_only: Optional[SoupStrainer] = None) -> BeautifulSoup:
+    """
+    A method to parse the content of a web page.
+    :param content: the content of the page.
+    :param parser: the parser used by BeautifulSoup, for example 'html.parser' or 'lxml'.
+    :param parse_only: if it is given, only the parts of the page matching it are parsed.
+    :return: the contents of the page as BeautifulSoup.
+    """
+    return BeautifulSoup(content, parser, parse_only=parse_only)
+
+
+def get_strainer(selectors: List[str]) -> Optional[SoupStrainer]:
+    """
+    A method to make a strainer which keeps only the parts of a page that the given CSS selectors can match. It looks
+    at the first (outermost) element of each selector, and keeps the subtrees of the elements with its class, or its
+    id. When the selectors cannot be covered that way (e.g. the first element of some selector is only a tag name), it
+    returns None, which means that the whole page needs to be parsed.
+    :param selectors: the CSS selectors that are used on the page.
+    :return: the strainer, or None if the whole page needs to be parsed.
     """
-    headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_1) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/39.0.2171.95 Safari/537.36'}
-    page = requests.get(link, headers=headers)
-    assert page.status_code == 200
-    content = BeautifulSoup(page.content, 'html.parser')
-    return content
+    classes, ids = [], []
+    for selector in selectors:
+        if ',' in selector:
+            return None
+        first_element = re.match(r'\s*[\w-]*((?:[#.][\w-]+)*)', selector).group(1)
+        first_class = re.search(r'\.([\w-]+)', first_element)
+        first_id = re.search(r'#([\w-]+)', first_element)
+        if first_class:
+            classes.append(first_class.group(1))
+        if first_id:
+            ids.append(first_id.group(1))
+    if len(classes) == len(selectors):
+        return SoupStrainer(attrs={'class': classes})
+    if len(ids) == len(selectors):
+        return SoupStrainer(attrs={'id': ids})
+    return None
 
 
 def get_fixed_text(soup: BeautifulSoup, new_space: str = ' ') -> str:
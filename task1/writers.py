@@ -0,0 +1,78 @@
+import csv
+import json
+import os
+from typing import Iterable, List, Optional
+
+from task1.gpu_scraper import COLUMNS
+
+
+class RowWriter:
+    """
+    A class to write scraped gpus to a CSV or JSONL file as soon as they are scraped. The file is flushed every few
+    rows, so the rows written before a failure are kept in the file.
+    """
+
+    formats = ('csv', 'jsonl')
+
+    def __init__(self, path: str, fieldnames: List[str] = COLUMNS, file_format: Optional[str] = None,
+                 mode: str = 'a', flush_every: int = 20):
+        """
+        The main constructor of the writer. It opens the output file.
+        :param path: the path of the output file.
+        :param fieldnames: the columns of the output, in order.
+        :param file_format: either 'csv' or 'jsonl'. If it is not given, it is found from the file's extension.
+        :param mode: 'a' to append to the file, or 'w' to overwrite it. The CSV header is only written when the file is
+        empty.
+        :param flush_every: the number of rows written between two flushes of the file.
+        """
+        self.path = path
+        self.fieldnames = fieldnames
+        self.file_format = file_format or os.path.splitext(path)[1].lstrip('.').lower()
+        if self.file_format not in self.formats:
+            raise ValueError('Unsupported output format: %s' % self.file_format)
+        self.flush_every = flush_every
+        self.num_rows = 0
+        self.file = open(path, mode, newline='' if self.file_format == 'csv' else None, encoding='utf-8')
+        self.csv_writer = None
+        if self.file_format == 'csv':
+            self.csv_writer = csv.DictWriter(self.file, fieldnames=fieldnames, extrasaction='ignore')
+            if self.file.tell() == 0:
+                self.csv_writer.writeheader()
+
+    def write(self, row: dict) -> None:
+        """
+        A method to write one row to the output file.
+        :param row: a dictionary containing the row's data.
+        :return: None.
+        """
+        if self.csv_writer is not None:
+            self.csv_writer.writerow(row)
+        else:
+            self.file.write(json.dumps({key: row.get(key) for key in self.fieldnames}, ensure_ascii=False) + '\n')
+        self.num_rows += 1
+        if self.num_rows % self.flush_every == 0:
+            self.file.flush()
+
+    def write_all(self, rows: Iterable[dict]) -> int:
+        """
+        A method to write rows to the output file as they come.
+        :param rows: the rows to write, for example the iterator returned by GpuScraper.iter_scrape.
+        :return: the number of rows written.
+        """
+        num_rows = self.num_rows
+        for row in rows:
+            self.write(row)
+        return self.num_rows - num_rows
+
+    def close(self) -> None:
+        """
+        A method to flush and close the output file.
+        :return: None.
+        """
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -7,6 +7,12 @@
 #     https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
 #     https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import os
+import sys
+
+# The stores, the base spider, the cache and the throttle are in the store_engine package at the root of the repository.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..')))
+
 BOT_NAME = 'scrapy_scraper'
 
 SPIDER_MODULES = ['scrapy_scraper.spiders']
@@ -20,7 +26,9 @@ NEWSPIDER_MODULE = 'scrapy_scraper.spiders'
 ROBOTSTXT_OBEY = False
 
 # Configure maximum concurrent requests performed by Scrapy (default: 16)
-#CONCURRENT_REQUESTS = 32
+# The concurrency and the delay of each store are set by its 'throttle' profile in the spider's stores (see
+# STORE_THROTTLE_ENABLED), so the global limit only needs to be above their sum.
+CONCURRENT_REQUESTS = 32
 
 # Configure a delay for requests for the same website (default: 0)
 # See https://docs.scrapy.org/en/latest/topics/settings.html#download-delay
@@ -62,9 +70,37 @@ ROBOTSTXT_OBEY = False
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
-#ITEM_PIPELINES = {
-#    'scrapy_scraper.pipelines.ScrapyScraperPipeline': 300,
-#}
+ITEM_PIPELINES = {
+    'store_engine.normalize.NormalizePipeline': 200,
+    'store_engine.parquet.ParquetPipeline': 300,
+    'store_engine.history.HistoryPipeline': 400,
+}
+
+# The spider delivers raw items whose names, prices and availabilities are normalized by the NormalizePipeline in
+# batches: up to NORMALIZE_BATCH_SIZE items at once, held at most NORMALIZE_MAX_DELAY seconds. With
+# NORMALIZE_BATCH_SIZE = 0, the spider normalizes every item by itself.
+NORMALIZE_BATCH_SIZE = 1000
+NORMALIZE_MAX_DELAY = 0.1
+
+# The download of a gpu page is stopped as soon as its model, price and availability were found, and the page is parsed
+# as it is received instead of once downloaded (see store_engine.stream).
+STREAM_GPU_PAGES = True
+
+# The requests are filtered by the fingerprints of their canonical links, so the aliases of a page (e.g. 'regard.ru' and
+# 'www.regard.ru', or its tracking parameters) are requested once (see store_engine.urls). The fingerprints are kept in
+# a set, or in a Bloom filter sized for DUPEFILTER_BLOOM_CAPACITY links when it is more than zero (for very large
+# catalogues, at the cost of 0.1% of new links skipped).
+DUPEFILTER_CLASS = 'store_engine.dupefilter.CanonicalDupeFilter'
+DUPEFILTER_BLOOM_CAPACITY = 0
+
+# The items are also written to a Parquet dataset partitioned by store and scrape date when PARQUET_OUTPUT_DIR is set,
+# e.g. 'scrapy crawl gpu_scraper -s PARQUET_OUTPUT_DIR=gpus' (it needs pyarrow).
+PARQUET_OUTPUT_DIR = None
+PARQUET_BATCH_SIZE = 1000
+
+# The items are recorded in a SQLite price history (a gpu's version is written only when its name, price or availability
+# changed) when HISTORY_DB is set, e.g. 'scrapy crawl gpu_scraper -s HISTORY_DB=history.sqlite'.
+HISTORY_DB = None
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
@@ -79,10 +115,29 @@ ROBOTSTXT_OBEY = False
 # Enable showing throttling stats for every response received:
 #AUTOTHROTTLE_DEBUG = False
 
+# Apply the 'throttle' profile of each store (concurrency, start/min/max delay and latency-driven target concurrency)
+# to its own downloader slot. It replaces AutoThrottle, which uses one profile for all the stores.
+EXTENSIONS = {
+    'store_engine.throttle.StoreThrottle': 500,
+    'store_engine.resume.FinishedJobCleaner': 600,
+}
+STORE_THROTTLE_ENABLED = True
+STORE_THROTTLE_DEBUG = False
+
+# A crawl can be persisted with JOBDIR, e.g. 'scrapy crawl gpu_scraper -s JOBDIR=crawls/gpu_scraper -o output.jsonl':
+# when it is stopped (Ctrl-C once) or closed before it finished, the next crawl with the same JOBDIR continues it. The
+# directory is removed once the crawl finished, so the next crawl starts from the beginning.
+JOBDIR_CLEAR_FINISHED = True
+
 # Enable and configure HTTP caching (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
-#HTTPCACHE_ENABLED = True
-#HTTPCACHE_EXPIRATION_SECS = 0
-#HTTPCACHE_DIR = 'httpcache'
-#HTTPCACHE_IGNORE_HTTP_CODES = []
-#HTTPCACHE_STORAGE = 'scrapy.extensions.httpcache.FilesystemCacheStorage'
+# The cached pages are always revalidated with conditional requests (ETag/Last-Modified), and are reused when the
+# store answers '304 Not Modified'. Entries older than HTTPCACHE_EXPIRATION_SECS are refetched, and the oldest entries
+# are removed when the cache is larger than HTTPCACHE_MAX_SIZE bytes.
+HTTPCACHE_ENABLED = True
+HTTPCACHE_EXPIRATION_SECS = 7 * 24 * 3600
+HTTPCACHE_MAX_SIZE = 512 * 1024 ** 2
+HTTPCACHE_DIR = 'httpcache'
+HTTPCACHE_IGNORE_HTTP_CODES = []
+HTTPCACHE_POLICY = 'store_engine.httpcache.RevalidatePolicy'
+HTTPCACHE_STORAGE = 'store_engine.httpcache.PrunedFilesystemCacheStorage'
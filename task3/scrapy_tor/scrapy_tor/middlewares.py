@@ -1,43 +1,289 @@
 from stem import Signal
 from stem.control import Controller
+from scrapy import signals
 from scrapy.downloadermiddlewares.httpproxy import HttpProxyMiddleware
+from scrapy.utils.defer import maybe_deferred_to_future
+from scrapy_tor.rotation import CircuitStats, RotationPolicy
+from twisted.internet import defer, task, threads
+import itertools
 import os
+import time
+from typing import List, Optional
 from dotenv import load_dotenv
 
 
 load_dotenv()
-N = int(os.getenv('ALLOWED_REQUESTS'))
+N = int(os.getenv('ALLOWED_REQUESTS', 0))
+NEWNYM_INTERVAL = 10
+DEFAULT_TOR_PROXIES = [{'proxy': 'http://127.0.0.1:8118', 'control_port': 9051}]
 
 
-def new_tor_identity():
+class TorEndpoint:
     """
-    A method to change the tor identity.
+    A class to represent one proxy of the pool (for example a Privoxy in front of its own tor instance), along with the
+    control port of its tor instance, which is used to change its identity. The identity is changed in a thread over a
+    control connection that is kept open, so the crawl is not blocked while tor builds the new circuits.
     """
-    with Controller.from_port(port=9051) as controller:
-        controller.authenticate(password=os.getenv('PASSWORD'))
-        controller.signal(Signal.NEWNYM)
+
+    def __init__(self, proxy: str, control_port: Optional[int] = None, password: Optional[str] = None,
+                 newnym_interval: float = NEWNYM_INTERVAL):
+        """
+        The main constructor of the endpoint.
+        :param proxy: the url of the proxy, e.g. 'http://127.0.0.1:8118'.
+        :param control_port: the control port of the tor instance behind the proxy. If it is not given, the identity of
+        the endpoint is never changed (e.g. a plain proxy).
+        :param password: the password of the control port. The default is the 'PASSWORD' environment variable.
+        :param newnym_interval: the minimum time in seconds between two changes of the identity (tor ignores NEWNYM
+        signals sent more often than every 10 seconds).
+        """
+        self.proxy = proxy
+        self.control_port = control_port
+        self.password = password
+        self.newnym_interval = newnym_interval
+        self.num_requests = 0
+        self.in_flight = 0
+        self.stats = CircuitStats()
+        self.controller = None
+        self.rotation = None
+        self.last_rotation = 0.0
+        self.waiting = []
+
+    def is_rotating(self) -> bool:
+        """
+        A method to find whether the identity of the endpoint is being changed.
+        :return: a boolean indicating whether the identity is being changed.
+        """
+        return self.rotation is not None
+
+    def rotate(self) -> defer.Deferred:
+        """
+        A method to start changing the tor identity of the endpoint (if it has a control port and it is not already
+        being changed). The NEWNYM signal is delayed to respect newnym_interval, and sent in a thread.
+        :return: a deferred which fires (with None) when the identity is changed.
+        """
+        self.num_requests = 0
+        self.stats.reset()
+        if self.control_port is None:
+            return defer.succeed(None)
+        if self.rotation is None:
+            from twisted.internet import reactor
+            delay = max(0.0, self.last_rotation + self.newnym_interval - time.time())
+            self.rotation = task.deferLater(reactor, delay, threads.deferToThread, self.send_newnym)
+            self.rotation.addErrback(self.rotation_failed)
+            self.rotation.addBoth(self.rotation_done)
+        return self.wait()
+
+    def wait(self) -> defer.Deferred:
+        """
+        A method to wait until the identity of the endpoint is changed.
+        :return: a deferred which fires (with None) when the identity is changed, or right away if it is not being
+        changed.
+        """
+        if self.rotation is None:
+            return defer.succeed(None)
+        waiter = defer.Deferred()
+        self.waiting.append(waiter)
+        return waiter
+
+    def send_newnym(self) -> None:
+        """
+        A method to send the NEWNYM signal to the tor instance of the endpoint. The control connection is opened and
+        authenticated on the first use, then kept open. It runs in a thread.
+        :return: None.
+        """
+        if self.controller is None or not self.controller.is_alive():
+            self.controller = Controller.from_port(port=self.control_port)
+            self.controller.authenticate(password=os.getenv('PASSWORD') if self.password is None else self.password)
+        try:
+            self.controller.signal(Signal.NEWNYM)
+        except Exception:
+            self.close()
+            raise
+
+    def rotation_failed(self, failure) -> None:
+        """
+        A method to report a failed change of the identity. The endpoint keeps serving requests with its old identity.
+        :param failure: the failure of the change.
+        :return: None.
+        """
+        print("Error while changing the tor identity of %s:" % self.proxy, failure.getErrorMessage())
+
+    def rotation_done(self, _) -> None:
+        """
+        A method to release the requests waiting for the change of the identity once it is done.
+        :return: None.
+        """
+        self.rotation = None
+        self.last_rotation = time.time()
+        waiting, self.waiting = self.waiting, []
+        for waiter in waiting:
+            waiter.callback(None)
+
+    def close(self) -> None:
+        """
+        A method to close the control connection of the endpoint.
+        :return: None.
+        """
+        if self.controller is not None:
+            self.controller.close()
+            self.controller = None
 
 
 class ProxyMiddleware(HttpProxyMiddleware):
+    """
+    A downloader middleware to send the requests through a pool of tor proxies (TOR_PROXIES). Each request is sent
+    through the endpoint with the fewest requests in progress ('least_loaded'), or through the endpoints in turn
+    ('round_robin'), depending on TOR_PROXY_SELECTION. The identity of every endpoint is changed on its own, when the
+    RotationPolicy finds that its circuit degraded (banned, failing or slow), while the other endpoints keep serving
+    requests. Only the requests bound to an endpoint whose identity is being changed are held back until the change is
+    done. The requests that got a ban are retried (through another circuit) a limited number of times with a backoff.
+    The decisions are counted in the crawler's stats ('tor/...').
+    """
+
+    selections = ('least_loaded', 'round_robin')
+
+    def __init__(self, endpoints: List[TorEndpoint], selection: str = 'least_loaded',
+                 policy: Optional[RotationPolicy] = None, stats=None, auth_encoding: str = 'latin-1'):
+        """
+        The main constructor of the middleware.
+        :param endpoints: the endpoints of the pool.
+        :param selection: the way an endpoint is chosen for each request, either 'least_loaded' or 'round_robin'.
+        :param policy: the policy deciding when the identity of an endpoint is changed and how the banned requests are
+        retried. The default changes it after a ban, or every N requests if the 'ALLOWED_REQUESTS' environment
+        variable is set.
+        :param stats: the crawler's stats collector, to count the decisions of the policy.
+        :param auth_encoding: the encoding of the proxies' credentials (see HttpProxyMiddleware).
+        """
+        super().__init__(auth_encoding)
+        if not endpoints:
+            raise ValueError('The pool of tor proxies is empty')
+        if selection not in self.selections:
+            raise ValueError('Unsupported proxy selection: %s' % selection)
+        self.endpoints = endpoints
+        self.selection = selection
+        self.policy = RotationPolicy([403, 429], ['captcha'], max_requests=N) if policy is None else policy
+        self.stats = stats
+        self.turns = itertools.cycle(range(len(endpoints)))
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        newnym_interval = settings.getfloat('TOR_NEWNYM_INTERVAL', NEWNYM_INTERVAL)
+        endpoints = [TorEndpoint(endpoint['proxy'], endpoint.get('control_port'), endpoint.get('password'),
+                                 newnym_interval)
+                     for endpoint in settings.getlist('TOR_PROXIES') or DEFAULT_TOR_PROXIES]
+        middleware = cls(endpoints, settings.get('TOR_PROXY_SELECTION', 'least_loaded'),
+                         RotationPolicy.from_settings(settings, N), crawler.stats,
+                         settings.get('HTTPPROXY_AUTH_ENCODING', 'latin-1'))
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def spider_closed(self, spider):
+        for index, endpoint in enumerate(self.endpoints):
+            endpoint.close()
+            if self.stats is not None:
+                self.stats.set_value('tor/endpoint/%d/success_rate' % index, round(endpoint.stats.success_rate, 3))
+                if endpoint.stats.latency is not None:
+                    self.stats.set_value('tor/endpoint/%d/latency' % index, round(endpoint.stats.latency, 3))
+
+    def inc_stat(self, key: str) -> None:
+        """
+        A method to increment a counter of the crawler's stats (if the middleware has them).
+        :param key: the name of the counter.
+        :return: None.
+        """
+        if self.stats is not None:
+            self.stats.inc_value(key)
 
-    num_requests = 0
+    def check_endpoint(self, endpoint: TorEndpoint) -> defer.Deferred:
+        """
+        A method to change the identity of an endpoint if the policy finds that it should be changed.
+        :param endpoint: the endpoint.
+        :return: a deferred which fires (with None) when the endpoint can be used.
+        """
+        if not endpoint.is_rotating():
+            reason = self.policy.get_rotation_reason(endpoint.stats, endpoint.num_requests)
+            if reason is not None:
+                self.inc_stat('tor/rotations/%s' % reason)
+                return endpoint.rotate()
+        return endpoint.wait()
+
+    def choose_endpoint(self) -> int:
+        """
+        A method to choose the endpoint of the next request. The endpoints whose identity is being changed are skipped,
+        unless all of them are.
+        :return: the index of the chosen endpoint.
+        """
+        start = next(self.turns)
+        indices = [(start + i) % len(self.endpoints) for i in range(len(self.endpoints))]
+        indices = [index for index in indices if not self.endpoints[index].is_rotating()] or indices
+        if self.selection == 'round_robin':
+            return indices[0]
+        return min(indices, key=lambda index: self.endpoints[index].in_flight)
+
+    def release_endpoint(self, request) -> Optional[TorEndpoint]:
+        """
+        A method to mark the request as no longer in progress on its endpoint.
+        :param request: the finished request.
+        :return: the endpoint of the request, or None if it was not sent through the pool.
+        """
+        index = request.meta.pop('tor_endpoint', None)
+        if index is None:
+            return None
+        endpoint = self.endpoints[index]
+        endpoint.in_flight -= 1
+        return endpoint
+
+    async def process_response(self, request, response, spider):
+        """
+        This method is used to update the health of the request's endpoint with the response, and to change its TOR
+        identity if it degraded. If the response shows a ban, the request is retried after a delay (which the method
+        waits for), until it has been retried TOR_MAX_RETRIES times.
+        """
+        endpoint = self.release_endpoint(request)
+        banned = self.policy.is_ban(response)
+        if endpoint is not None:
+            endpoint.stats.record(response.status == 200 and not banned, request.meta.get('download_latency'), banned)
+            self.check_endpoint(endpoint)
+        retries = request.meta.pop('tor_retries', 0)
+        if not banned:
+            return response
+        self.inc_stat('tor/bans')
+        delay = self.policy.get_retry_delay(retries)
+        if delay is None:
+            self.inc_stat('tor/retries/max_reached')
+            return response
+        self.inc_stat('tor/retries/count')
+        retry_request = request.replace(dont_filter=True)
+        retry_request.meta['tor_retries'] = retries + 1
+        if delay > 0:
+            from twisted.internet import reactor
+            await maybe_deferred_to_future(task.deferLater(reactor, delay, lambda: None))
+        return retry_request
 
-    def process_response(self, request, response, spider):
+    def process_exception(self, request, exception, spider):
         """
-        This method is used to change the TOR identity when the response's status of some request is not successful.
+        This method is used to release the request's endpoint when the request fails, and to update its health.
         """
-        if response.status != 200:
-            new_tor_identity()
-            return request
-        return response
+        endpoint = self.release_endpoint(request)
+        if endpoint is not None:
+            endpoint.stats.record(False)
+            self.check_endpoint(endpoint)
 
-    def process_request(self, request, spider):
+    async def process_request(self, request, spider):
         """
-        This method is used to change the TOR identity every N requests.
+        This method is used to choose the endpoint of the request, and to change the TOR identity of the endpoint when
+        the policy asks for it (e.g. every TOR_ALLOWED_REQUESTS requests sent through it). If the identity of the
+        endpoint is being changed, the method waits for it before the request goes on.
         """
-        if ProxyMiddleware.num_requests == N:
-            new_tor_identity()
-            ProxyMiddleware.num_requests = 1
-        else:
-            ProxyMiddleware.num_requests += 1
-        request.meta['proxy'] = 'http://127.0.0.1:8118'
+        if 'tor_endpoint' in request.meta:
+            return
+        index = self.choose_endpoint()
+        endpoint = self.endpoints[index]
+        endpoint.in_flight += 1
+        request.meta['tor_endpoint'] = index
+        request.meta['proxy'] = endpoint.proxy
+        self.inc_stat('tor/endpoint/%d/requests' % index)
+        waiter = self.check_endpoint(endpoint)
+        endpoint.num_requests += 1
+        await maybe_deferred_to_future(waiter)
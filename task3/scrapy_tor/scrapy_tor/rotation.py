@@ -0,0 +1,129 @@
+from typing import List, Optional
+
+
+class CircuitStats:
+    """
+    A class to keep track of the health of a tor circuit (an endpoint of the pool) since its last change of identity:
+    the moving averages of its success rate and latency, and the number of bans in a row.
+    """
+
+    def __init__(self, smoothing: float = 0.2):
+        """
+        The main constructor of the stats.
+        :param smoothing: the weight of the newest sample in the exponential moving averages.
+        """
+        self.smoothing = smoothing
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        A method to forget the samples of the circuit, after its identity is changed.
+        :return: None.
+        """
+        self.num_samples = 0
+        self.success_rate = 1.0
+        self.latency = None
+        self.bans_in_row = 0
+
+    def record(self, success: bool, latency: Optional[float] = None, banned: bool = False) -> None:
+        """
+        A method to add the result of a request sent through the circuit.
+        :param success: a boolean indicating whether the request was successful.
+        :param latency: the time in seconds to get the response, if there is one.
+        :param banned: a boolean indicating whether the response shows that the circuit is banned.
+        :return: None.
+        """
+        self.num_samples += 1
+        self.success_rate += self.smoothing * (float(success) - self.success_rate)
+        if latency is not None:
+            self.latency = latency if self.latency is None else self.latency + self.smoothing * (latency - self.latency)
+        self.bans_in_row = self.bans_in_row + 1 if banned else 0
+
+
+class RotationPolicy:
+    """
+    A class to decide when the identity of a tor circuit should be changed (only when the circuit degrades: it is
+    banned, its success rate drops, or it becomes too slow), and how the requests that failed are retried.
+    """
+
+    def __init__(self, ban_codes: List[int], ban_markers: List[str], max_bans: int = 1, min_success_rate: float = 0.5,
+                 max_latency: float = 20.0, min_samples: int = 5, max_requests: int = 0, max_retries: int = 3,
+                 retry_backoff: float = 2.0, max_retry_backoff: float = 60.0):
+        """
+        The main constructor of the policy.
+        :param ban_codes: the response statuses which mean that the circuit is banned, e.g. 403 and 429.
+        :param ban_markers: the strings which mean that the circuit is banned when they are found in a response's body
+        (case-insensitive), e.g. 'captcha'.
+        :param max_bans: the number of bans in a row after which the circuit is changed.
+        :param min_success_rate: the success rate (moving average) under which the circuit is changed.
+        :param max_latency: the latency in seconds (moving average) over which the circuit is changed.
+        :param min_samples: the number of requests sent through a circuit before its success rate and latency are
+        trusted.
+        :param max_requests: the number of requests sent through a circuit after which it is changed anyway (0 means no
+        limit).
+        :param max_retries: the maximum number of times a request is retried after a ban or a failure.
+        :param retry_backoff: the delay in seconds before the first retry of a request. It is doubled after each retry.
+        :param max_retry_backoff: the maximum delay in seconds before a retry.
+        """
+        self.ban_codes = set(ban_codes)
+        self.ban_markers = [marker.lower().encode() for marker in ban_markers]
+        self.max_bans = max_bans
+        self.min_success_rate = min_success_rate
+        self.max_latency = max_latency
+        self.min_samples = min_samples
+        self.max_requests = max_requests
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+
+    @classmethod
+    def from_settings(cls, settings, max_requests: int = 0):
+        # The codes set with '-s TOR_BAN_CODES=403,429' are strings.
+        ban_codes = [int(code) for code in settings.getlist('TOR_BAN_CODES', [403, 429])]
+        return cls(ban_codes, settings.getlist('TOR_BAN_MARKERS', ['captcha']),
+                   settings.getint('TOR_MAX_BANS', 1), settings.getfloat('TOR_MIN_SUCCESS_RATE', 0.5),
+                   settings.getfloat('TOR_MAX_LATENCY', 20.0), settings.getint('TOR_MIN_SAMPLES', 5),
+                   settings.getint('TOR_ALLOWED_REQUESTS', max_requests), settings.getint('TOR_MAX_RETRIES', 3),
+                   settings.getfloat('TOR_RETRY_BACKOFF', 2.0), settings.getfloat('TOR_MAX_RETRY_BACKOFF', 60.0))
+
+    def is_ban(self, response) -> bool:
+        """
+        A method to find whether a response shows that its circuit is banned.
+        :param response: the response.
+        :return: a boolean indicating whether the circuit is banned.
+        """
+        if response.status in self.ban_codes:
+            return True
+        if not self.ban_markers:
+            return False
+        body = response.body.lower()
+        return any(marker in body for marker in self.ban_markers)
+
+    def get_rotation_reason(self, stats: CircuitStats, num_requests: int) -> Optional[str]:
+        """
+        A method to find whether the identity of a circuit should be changed given its stats.
+        :param stats: the stats of the circuit.
+        :param num_requests: the number of requests sent through the circuit since its last change.
+        :return: the reason of the change ('ban', 'success_rate', 'latency' or 'max_requests'), or None if the circuit
+        should be kept.
+        """
+        if stats.bans_in_row >= self.max_bans:
+            return 'ban'
+        if stats.num_samples >= self.min_samples:
+            if stats.success_rate < self.min_success_rate:
+                return 'success_rate'
+            if stats.latency is not None and stats.latency > self.max_latency:
+                return 'latency'
+        if 0 < self.max_requests <= num_requests:
+            return 'max_requests'
+        return None
+
+    def get_retry_delay(self, retries: int) -> Optional[float]:
+        """
+        A method to find how long to wait before retrying a request.
+        :param retries: the number of times the request was already retried.
+        :return: the delay in seconds, or None if the request should not be retried anymore.
+        """
+        if retries >= self.max_retries:
+            return None
+        return min(self.max_retry_backoff, self.retry_backoff * 2 ** retries)
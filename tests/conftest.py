@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The tests import the packages of the repository (store_engine, task1) and of the Scrapy projects (scrapy_tor).
+for path in (ROOT_DIR, os.path.join(ROOT_DIR, 'task3', 'scrapy_tor')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+import requests
+
+from task1.async_scraper import AsyncFetcher, AsyncGpuScraper
+
+httpx = pytest.importorskip('httpx')
+
+BASE_LINK = 'https://www.onlinetrade.ru'
+LINK = BASE_LINK + '/p1'
+GPU_PAGE = ('<html><body><h1>ASUS GeForce RTX 3060</h1><span class="price">75 999 ₽</span>'
+            '<span class="stock">в наличии</span><ul><li class="feature">Графический процессор: RTX 3060</li></ul>'
+            '</body></html>').encode('utf-8')
+
+
+def make_scraper():
+    fetcher = AsyncFetcher(max_retries=2, backoff_factor=0, http2=False)
+    return AsyncGpuScraper(BASE_LINK, BASE_LINK + '/gpus?page=', 'OnlineTrade', 'li.feature', 'h1', 'span.price',
+                           'span.stock', 'a.gpu[href]', 'div.pages > a', False, 'Графический процессор', ':',
+                           fetcher=fetcher)
+
+
+def scrape_gpu(handler):
+    """
+    Scrapes the gpu of LINK with an AsyncGpuScraper whose requests are answered by the handler, and returns its result
+    and the requests sent.
+    """
+    sent_requests = []
+
+    def handle(request):
+        sent_requests.append(request)
+        return handler(request)
+
+    async def run(scraper):
+        scraper.fetcher.client = httpx.AsyncClient(transport=httpx.MockTransport(handle), follow_redirects=True)
+        try:
+            return await scraper.ascrape_gpu(LINK)
+        finally:
+            await scraper.fetcher.aclose()
+
+    return asyncio.run(run(make_scraper())), sent_requests
+
+
+@pytest.mark.parametrize('status', [200, 203])
+def test_successful_statuses_are_scraped(status):
+    result, sent_requests = scrape_gpu(lambda request: httpx.Response(status, content=GPU_PAGE))
+    row, _ = result
+    assert len(sent_requests) == 1
+    assert (row['url'], row['gpu_price'], row['gpu_model']) == (LINK, '75999', 'RTX 3060')
+
+
+def test_error_statuses_raise_with_their_response():
+    async def fetch(scraper):
+        scraper.fetcher.client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(404)))
+        try:
+            return await scraper.afetch(LINK, 'gpu')
+        finally:
+            await scraper.fetcher.aclose()
+
+    with pytest.raises(requests.HTTPError) as error:
+        asyncio.run(fetch(make_scraper()))
+    assert error.value.response.status_code == 404
+    result, sent_requests = scrape_gpu(lambda request: httpx.Response(404))
+    assert result is None and len(sent_requests) == 1
+
+
+def test_connection_errors_are_retried():
+    def refuse(request):
+        raise httpx.ConnectError('Connection refused', request=request)
+
+    result, sent_requests = scrape_gpu(refuse)
+    assert result is None and len(sent_requests) == 3
+
+
+def test_other_httpx_errors_are_not_retried():
+    # The page redirects to itself until the client gives up with httpx.TooManyRedirects, which is not a TransportError.
+    result, sent_requests = scrape_gpu(lambda request: httpx.Response(302, headers={'Location': LINK}))
+    assert result is None and len(sent_requests) == 21
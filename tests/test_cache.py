@@ -0,0 +1,59 @@
+import os
+import time
+
+from task1.cache import ResponseCache
+
+LINK = 'https://www.onlinetrade.ru/p1.html'
+
+
+class FakeResponse:
+    def __init__(self, content=b'<html>gpu</html>', **headers):
+        self.content = content
+        self.headers = headers
+
+
+def test_store_and_validators(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    assert cache.get_validators(LINK) == {} and cache.get_body(LINK) is None
+    cache.store(LINK, FakeResponse(ETag='"v1"', **{'Last-Modified': 'Mon, 15 Nov 2021 10:00:00 GMT'}))
+    assert cache.get_validators(LINK) == {'If-None-Match': '"v1"',
+                                          'If-Modified-Since': 'Mon, 15 Nov 2021 10:00:00 GMT'}
+    assert cache.get_body(LINK) == b'<html>gpu</html>'
+
+
+def test_pages_without_validators_are_not_stored(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    cache.store(LINK, FakeResponse())
+    assert cache.get_body(LINK) is None
+
+
+def test_results_are_dropped_with_their_page(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    cache.store(LINK, FakeResponse(ETag='"v1"'))
+    cache.store_result(LINK, 'key', {'gpu_price': '1000'})
+    assert cache.get_result(LINK, 'key') == {'gpu_price': '1000'}
+    assert cache.get_result(LINK, 'other key') is None
+    cache.store(LINK, FakeResponse(b'<html>new</html>', ETag='"v2"'))
+    assert cache.get_result(LINK, 'key') is None
+
+
+def test_old_entries_expire_and_refresh(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_age=60)
+    cache.store(LINK, FakeResponse(ETag='"v1"'))
+    meta = cache.read_meta(LINK)
+    cache.write_meta(LINK, {**meta, 'stored_at': time.time() - 120})
+    assert cache.get_body(LINK) is None
+    cache.write_meta(LINK, {**meta, 'stored_at': time.time() - 30})
+    cache.refresh(LINK)
+    assert time.time() - cache.read_meta(LINK)['stored_at'] < 5
+
+
+def test_prune_keeps_the_newest_entries(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    links = ['https://www.onlinetrade.ru/p%d.html' % i for i in range(3)]
+    for i, link in enumerate(links):
+        cache.store(link, FakeResponse(b'x' * 1000, ETag='"v"'))
+        os.utime(cache.get_path(link) + '.body', (1000 + i, time.time() - 100 + i))
+    entry_size = sum(os.path.getsize(cache.get_path(links[0]) + extension) for extension in ('.body', '.json'))
+    ResponseCache(str(tmp_path), max_size=2 * entry_size + 100)
+    assert [cache.get_body(link) is not None for link in links] == [False, True, True]
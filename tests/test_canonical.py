@@ -0,0 +1,49 @@
+import pytest
+
+from store_engine.canonical import ModelIndex, get_model_index, tokenize
+from store_engine.history import HistoryStore
+
+
+def test_tokenize():
+    assert tokenize('GeForce RTX3070Ti 8Гб') == ['GEFORCE', 'RTX', '3070', 'TI', '8']
+    assert tokenize('Видеокарта') == []
+
+
+@pytest.mark.parametrize('text, canonical_model', [
+    ('NVIDIA GeForce RTX 3070 Ti', 'NVIDIA GeForce RTX 3070 Ti'),
+    ('GeForce RTX3070Ti', 'NVIDIA GeForce RTX 3070 Ti'),
+    ('NVIDIA GeForce RTX3070 ASUS 8Gb LHR', 'NVIDIA GeForce RTX 3070'),
+    ('Видеокарта Sapphire Radeon RX 7900 XTX 24GB', 'AMD Radeon RX 7900 XTX'),
+    ('Intel Arc A770 16G', 'Intel Arc A770'),
+    ('Видеокарта', None),
+    ('', None),
+    (None, None),
+])
+def test_lookup_finds_the_longest_family(text, canonical_model):
+    assert get_model_index().lookup(text) == canonical_model
+
+
+def test_canonicalize_uses_the_name_when_the_model_is_not_known():
+    index = ModelIndex({'NVIDIA GeForce': ['RTX 3060', 'RTX 3060 Ti']})
+    assert index.canonicalize({'gpu_model': 'RTX 3060', 'gpu_name': 'ASUS RTX 3060 Ti'}) == 'NVIDIA GeForce RTX 3060'
+    assert index.canonicalize({'gpu_model': '', 'gpu_name': 'ASUS RTX 3060 Ti'}) == 'NVIDIA GeForce RTX 3060 Ti'
+    assert index.canonicalize({'gpu_model': 'GTX 1650', 'gpu_name': 'Palit GTX 1650'}) is None
+    with pytest.raises(ValueError):
+        index.add('Видеокарта', 'None')
+
+
+def test_cheapest_in_stock_across_the_stores(tmp_path):
+    rows = [('OnlineTrade', 'https://www.onlinetrade.ru/p1.html', 'NVIDIA GeForce RTX 3070 Ti', '90000', 'true'),
+            ('Regard', 'https://www.regard.ru/p1.html', 'GeForce RTX3070Ti', '85000', 'true'),
+            ('Regard', 'https://www.regard.ru/p2.html', 'GeForce RTX3070Ti', '80000', 'false'),
+            ('Regard', 'https://www.regard.ru/p3.html', 'GeForce RTX3060', '50000', 'true')]
+    with HistoryStore(str(tmp_path / 'history.sqlite')) as history:
+        for store_name, url, gpu_model, gpu_price, in_stock in rows:
+            history.record({'store_name': store_name, 'url': url, 'gpu_model': gpu_model, 'gpu_name': 'GPU',
+                            'gpu_price': gpu_price, 'in_stock': in_stock, 'fetch_ts': 1000})
+        history.finish_run()
+        assert [(gpu['canonical_model'], gpu['url']) for gpu in history.get_cheapest_in_stock()] == [
+            ('NVIDIA GeForce RTX 3060', 'https://www.regard.ru/p3.html'),
+            ('NVIDIA GeForce RTX 3070 Ti', 'https://www.regard.ru/p1.html')]
+        assert [gpu['gpu_price'] for gpu in history.get_cheapest_in_stock('NVIDIA GeForce RTX 3070 Ti')] == [85000]
+        assert history.get_cheapest_in_stock('AMD Radeon RX 6600') == []
@@ -0,0 +1,42 @@
+import pytest
+from scrapy import Request
+from scrapy.utils.test import get_crawler
+
+from store_engine.dupefilter import CanonicalDupeFilter
+
+LINK = 'https://www.regard.ru/catalog/1.htm?a=1&b=2'
+ALIASES = ['https://www.regard.ru/catalog/1.htm?b=2&a=1', 'https://www.regard.ru/catalog/1.htm?a=1&b=2&utm_source=x',
+           'https://regard.ru/catalog/1.htm?gclid=abc&b=2&a=1#reviews']
+
+
+def make_dupefilter(job_dir=None, bloom_capacity=0):
+    settings = {'DUPEFILTER_CLASS': 'store_engine.dupefilter.CanonicalDupeFilter',
+                'DUPEFILTER_BLOOM_CAPACITY': bloom_capacity, 'JOBDIR': job_dir}
+    crawler = get_crawler(settings_dict=settings)
+    return CanonicalDupeFilter.from_settings(crawler.settings, fingerprinter=crawler.request_fingerprinter)
+
+
+@pytest.mark.parametrize('bloom_capacity', [0, 1000])
+def test_aliases_of_a_link_are_filtered_as_one_request(bloom_capacity):
+    dupefilter = make_dupefilter(bloom_capacity=bloom_capacity)
+    assert not dupefilter.request_seen(Request(LINK))
+    assert all(dupefilter.request_seen(Request(alias)) for alias in ALIASES)
+    assert not dupefilter.request_seen(Request('https://www.regard.ru/catalog/1.htm?a=1&b=3'))
+    dupefilter.close('finished')
+
+
+def test_other_requests_are_fingerprinted_as_usual():
+    dupefilter = make_dupefilter()
+    assert not dupefilter.request_seen(Request(LINK, method='POST', body=b'page=1'))
+    assert not dupefilter.request_seen(Request(LINK.replace('www.', ''), method='POST', body=b'page=1'))
+    assert dupefilter.request_seen(Request(LINK, method='POST', body=b'page=1'))
+    dupefilter.close('finished')
+
+
+def test_fingerprints_are_kept_in_the_job_dir(tmp_path):
+    dupefilter = make_dupefilter(str(tmp_path))
+    assert not dupefilter.request_seen(Request(LINK))
+    dupefilter.close('shutdown')
+    dupefilter = make_dupefilter(str(tmp_path))
+    assert dupefilter.request_seen(Request(ALIASES[2]))
+    dupefilter.close('finished')
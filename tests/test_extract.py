@@ -0,0 +1,110 @@
+import pytest
+from scrapy.http import HtmlResponse
+from scrapy.utils.test import get_crawler
+
+from store_engine import extract, get_store_config, load_stores
+from store_engine.spider import GpuSpider
+from task1.gpu_scraper import GpuScraper
+
+# A gpus list page and a gpu page of every store, cut down to the elements its selectors (CSS and XPath) look at.
+PAGES = {
+    'OnlineTrade': {
+        'list': '''<html><body><div class="indexGoods">
+<div class="indexGoods__item"><div class="indexGoods__item__flexCover">
+<div class="indexGoods__item__descriptionCover"><a class="indexGoods__item__name"
+href="/catalogue/videokarty-c338/palit_rtx_3060-2861211.html?utm_source=list">
+Видеокарта Palit GeForce RTX 3060 Dual (NE63060019K9-190AD)</a></div></div>
+<div class="indexGoods__item__price"><span class="price regular">32 990 ₽</span></div>
+<span class="catalog__displayedItem__availabilityCount"><label>в наличии</label></span></div>
+</div><div class="paginator"><div class="paginator__links"><a>1</a><a>2</a><a>12</a><a>Дальше</a></div></div>
+</body></html>''',
+        'gpu': '''<html><body><div class="productPage__card">
+<h1>Видеокарта Palit GeForce RTX 3060 Dual (NE63060019K9-190AD)</h1></div>
+<span class="js__actualPrice"><span>32&nbsp;990</span> ₽</span>
+<span class="catalog__displayedItem__availabilityCount"><label>в наличии</label></span>
+<ul><li class="featureList__item"><span>Производитель:</span> Palit</li>
+<li class="featureList__item"><span>Графический процессор:</span> NVIDIA GeForce RTX 3060</li></ul>
+</body></html>''',
+        'gpu_link': 'https://www.onlinetrade.ru/catalogue/videokarty-c338/palit_rtx_3060-2861211.html',
+        'last_page': 12,
+        'listing_name': 'Видеокарта Palit GeForce RTX 3060 Dual',
+        'row': {'gpu_model': 'NVIDIA GeForce RTX 3060', 'gpu_name': 'Palit GeForce RTX 3060 Dual',
+                'gpu_price': '32990', 'in_stock': True},
+    },
+    'Regard': {
+        'list': '''<html><body><div id="hits"><div class="content">
+<div class="block"><div class="bcontent"><div class="aheader"><a href="/catalog/tovar123456.htm">
+Видеокарта Palit GeForce RTX 3060 Dual [NE63060019K9-190AD]</a></div>
+<div class="price"><span>31 990 руб.</span></div></div></div>
+<div class="pagination"><a>1</a><a>2</a><a>5</a></div></div></div></body></html>''',
+        'gpu': '''<html><body><h1 id="goods_head">Видеокарта Palit GeForce RTX 3060 Dual [NE63060019K9-190AD]</h1>
+<div id="hits-long"><div class="content"><div class="block bblock-long lot"><div class="bcontent lot">
+<div class="goods_price"><div class="price_block"><span class="price lot"><span>31 990</span></span></div>
+<div class="action_block left"><div><div class="goodCard_inStock_button inStock_available">В наличии</div></div></div>
+</div></div></div></div></div>
+<div id="tabs-1"><table><tr><td>Производитель </td><td> Palit</td></tr>
+<tr><td>Серия </td><td> GeForce RTX 3060</td></tr></table></div></body></html>''',
+        'gpu_link': 'https://regard.ru/catalog/tovar123456.htm',
+        'last_page': 5,
+        'listing_name': 'Видеокарта Palit GeForce RTX 3060 Dual',
+        'row': {'gpu_model': 'GeForce RTX 3060', 'gpu_name': 'Palit GeForce RTX 3060 Dual', 'gpu_price': '31990',
+                'in_stock': True},
+    },
+}
+STORES = {store['store_name']: store for store in load_stores()}
+
+
+class FakeFetcher:
+    cache = None
+
+
+class StoresSpider(GpuSpider):
+    name = 'stores'
+    stores = [get_store_config(store, 'xpath', 'scrapy') for store in STORES.values()]
+
+
+def test_every_store_has_pages():
+    assert set(PAGES) == set(STORES)
+
+
+@pytest.mark.parametrize('store_name', sorted(PAGES))
+def test_css_selectors_of_the_store(store_name):
+    pages = PAGES[store_name]
+    scraper = GpuScraper(**get_store_config(STORES[store_name], 'css', 'requests'), fetcher=FakeFetcher())
+    list_page = scraper.parse_page(pages['list'].encode('utf-8'), scraper.page_strainer, 'list')
+    assert [gpu_link for gpu_link, _ in scraper.get_gpu_items(list_page)] == [pages['gpu_link']]
+    assert scraper.get_last_page(list_page) == pages['last_page']
+    gpu_page = scraper.parse_page(pages['gpu'].encode('utf-8'), scraper.gpu_strainer, 'gpu')
+    assert scraper.handle_gpu_item(gpu_page) == pages['row']
+    assert not any(name.startswith('field_failures') for name in scraper.metrics.get_summary())
+
+
+@pytest.mark.parametrize('store_name', sorted(PAGES))
+def test_xpath_selectors_of_the_store(store_name):
+    pages = PAGES[store_name]
+    crawler = get_crawler(StoresSpider)
+    spider = StoresSpider.from_crawler(crawler, store_names=store_name)
+    crawler.spider = spider
+    request = next(iter(spider.start_requests()))
+    list_response = HtmlResponse(request.url, body=pages['list'].encode('utf-8'), encoding='utf-8', request=request)
+    results = list(spider.parse(list_response))
+    gpu_requests = [result for result in results if result.callback == spider.parse_gpu]
+    page_requests = [result for result in results if result.callback == spider.parse]
+    assert [gpu_request.url for gpu_request in gpu_requests] == [pages['gpu_link']]
+    assert page_requests[-1].meta['page_num'] == pages['last_page']
+    gpu_response = HtmlResponse(pages['gpu_link'], body=pages['gpu'].encode('utf-8'), encoding='utf-8',
+                                request=gpu_requests[0])
+    item = next(iter(spider.parse_gpu(gpu_response)))
+    # The spider keeps the words of the listing's name which are not ascii.
+    expected = {**pages['row'], 'gpu_name': pages['listing_name'], 'store_name': store_name, 'url': pages['gpu_link']}
+    assert {key: item[key].strip() if key in ('gpu_model', 'gpu_name') else item[key] for key in expected} == expected
+
+
+def test_extract_helpers():
+    assert extract.fix_price('32\xa0990 ₽') == '32990'
+    with pytest.raises(ValueError):
+        extract.fix_price('нет в наличии')
+    assert extract.fix_gpu_name('Palit GeForce RTX 3060 (NE63060019K9)') == 'Palit GeForce RTX 3060'
+    assert not extract.is_in_stock('= 0 шт.') and extract.is_in_stock('в наличии')
+    assert extract.get_gpu_model(['Серия  GeForce RTX 3060'], 'Серия', '  ') == 'GeForce RTX 3060'
+    assert extract.get_last_page(['1', '2', '1 024', 'Дальше']) == 1024 and extract.get_last_page(['Дальше']) is None
@@ -0,0 +1,153 @@
+import asyncio
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from task1.cache import ResponseCache
+from task1 import fetcher as fetcher_module
+from task1.fetcher import Fetcher
+
+PAGE = ('<html><body><div class="price">45 990</div>%s</body></html>' % ('<p>footer</p>' * 5000)).encode('utf-8')
+STREAM_QUERIES = {'gpu_price': '//div[@class="price"]/text()'}
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    failures = 0
+    failure_status = 503
+    retry_after = None
+    num_requests = 0
+
+    def do_GET(self):
+        PageHandler.num_requests += 1
+        if PageHandler.failures:
+            PageHandler.failures -= 1
+            self.send_response(PageHandler.failure_status)
+            if PageHandler.retry_after is not None:
+                self.send_header('Retry-After', PageHandler.retry_after)
+            self.send_header('Content-Length', str(len(PAGE)))
+            self.end_headers()
+            self.wfile.write(PAGE)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(PAGE)))
+        self.send_header('ETag', '"v1"')
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def link():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), PageHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:%d/gpu.html' % server.server_port
+    server.shutdown()
+    server.server_close()
+    PageHandler.failures = 0
+    PageHandler.failure_status = 503
+    PageHandler.retry_after = None
+    PageHandler.num_requests = 0
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    delays = []
+    monkeypatch.setattr(fetcher_module.time, 'sleep', delays.append)
+    return delays
+
+
+def make_response(retry_after):
+    response = requests.Response()
+    response.status_code = 503
+    response.headers['Retry-After'] = retry_after
+    return response
+
+
+def test_retry_after_in_seconds_and_as_a_date():
+    fetcher = Fetcher(backoff_factor=1.0)
+    assert fetcher.get_retry_delay(0, make_response('120')) == 120.0
+    assert 25 < fetcher.get_retry_delay(0, make_response(formatdate(time.time() + 30, usegmt=True))) <= 30
+    assert fetcher.get_retry_delay(0, make_response(formatdate(time.time() - 30, usegmt=True))) == 0.0
+    assert 0 <= fetcher.get_retry_delay(2, make_response('soon')) <= 4.0
+    assert 0 <= fetcher.get_retry_delay(10) <= fetcher.max_backoff
+
+
+def test_the_server_retry_after_is_waited(link, delays):
+    PageHandler.failures = 2
+    PageHandler.retry_after = '7'
+    with Fetcher(backoff_factor=0.0) as fetcher:
+        response = fetcher.get(link)
+    assert response.status_code == 200 and response.retries == 2
+    assert delays == [7.0, 7.0]
+
+
+def test_requests_are_given_up_after_max_retries(link, delays):
+    PageHandler.failures = 10
+    with Fetcher(max_retries=2, backoff_factor=0.0) as fetcher:
+        with pytest.raises(requests.HTTPError) as error:
+            fetcher.get(link)
+    assert error.value.response.status_code == 503
+    assert PageHandler.num_requests == 3 and len(delays) == 2
+
+
+def test_non_retryable_statuses_raise_at_once(link, delays):
+    PageHandler.failures = 1
+    PageHandler.failure_status = 404
+    with Fetcher(backoff_factor=0.0) as fetcher:
+        with pytest.raises(requests.HTTPError) as error:
+            fetcher.get(link)
+    assert error.value.response.status_code == 404
+    assert PageHandler.num_requests == 1 and delays == []
+
+
+def test_stopped_downloads_are_not_cached(link, tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    with Fetcher(cache=cache) as fetcher:
+        response = fetcher.get(link, STREAM_QUERIES)
+        assert response.truncated and len(response.content) < len(PAGE)
+        assert cache.get_body(link) is None and cache.get_validators(link) == {}
+        response = fetcher.get(link)
+        assert response.content == PAGE and cache.get_body(link) == PAGE
+
+
+def test_unread_responses_are_closed_before_a_retry(link, monkeypatch):
+    responses = []
+    session_get = requests.Session.get
+
+    def get(session, *args, **kwargs):
+        response = session_get(session, *args, **kwargs)
+        responses.append(response)
+        return response
+
+    monkeypatch.setattr(requests.Session, 'get', get)
+    PageHandler.failures = 2
+    with Fetcher(backoff_factor=0.0) as fetcher:
+        response = fetcher.get(link, STREAM_QUERIES)
+    assert response.retries == 2 and response.status_code == 200
+    assert [response.status_code for response in responses] == [503, 503, 200]
+    assert all(response.raw.closed for response in responses)
+
+
+def test_stopped_async_downloads_are_not_cached(link, tmp_path):
+    pytest.importorskip('httpx')
+    from task1.async_scraper import AsyncFetcher
+
+    async def get_twice(fetcher, cache):
+        try:
+            streamed_response = await fetcher.get(link, STREAM_QUERIES)
+            assert streamed_response.truncated and cache.get_body(link) is None
+            response = await fetcher.get(link)
+            assert not response.truncated and cache.get_body(link) == PAGE
+        finally:
+            await fetcher.aclose()
+
+    cache = ResponseCache(str(tmp_path))
+    asyncio.run(get_twice(AsyncFetcher(cache=cache, http2=False), cache))
@@ -0,0 +1,34 @@
+from task1.frontier import Frontier
+
+LINKS = ['https://www.onlinetrade.ru/p%d.html' % i for i in range(4)]
+
+
+def test_an_interrupted_run_is_continued(tmp_path):
+    path = str(tmp_path / 'frontier.jsonl')
+    frontier = Frontier(path)
+    assert not frontier.resumed
+    for link in LINKS[:3]:
+        assert frontier.add_pending('OnlineTrade', link)
+    assert not frontier.add_pending('OnlineTrade', LINKS[0])
+    frontier.page_done('OnlineTrade', 1)
+    frontier.add_pending('Regard', LINKS[3])
+    frontier.page_done('Regard', 0)
+    frontier.listing_done('Regard')
+    frontier.close()
+    frontier = Frontier(path)
+    frontier.add_done([LINKS[1]])
+    assert frontier.resumed
+    assert frontier.get_pending('OnlineTrade') == [LINKS[0], LINKS[2]]
+    assert frontier.get_next_page('OnlineTrade') == 2 and not frontier.is_listed('OnlineTrade')
+    assert frontier.is_listed('Regard') and frontier.get_next_page('Store') is None
+    assert not frontier.add_pending('OnlineTrade', LINKS[1])
+    frontier.clear()
+    assert not (tmp_path / 'frontier.jsonl').exists()
+
+
+def test_a_partly_written_line_is_ignored(tmp_path):
+    path = tmp_path / 'frontier.jsonl'
+    path.write_text('{"event": "page", "store": "OnlineTrade", "page": 3}\n{"event": "pen', encoding='utf-8')
+    frontier = Frontier(str(path))
+    assert frontier.get_next_page('OnlineTrade') == 4 and frontier.get_pending('OnlineTrade') == []
+    frontier.close()
@@ -0,0 +1,59 @@
+import threading
+
+from bs4 import BeautifulSoup
+
+from task1.gpu_scraper import GpuScraper
+
+BASE_LINK = 'https://www.onlinetrade.ru'
+GPU_PAGE = ('<html><body><h1>ASUS GeForce RTX 3060 (%d)</h1><span class="price">75 999 ₽</span>'
+            '<span class="stock">в наличии</span><ul><li class="feature">Графический процессор: RTX 3060</li></ul>'
+            '</body></html>')
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+        self.from_cache = False
+
+
+class FakeFetcher:
+    """
+    A stand-in of Fetcher whose gpu pages are returned only once num_concurrent of them are requested at the same time.
+    """
+
+    def __init__(self, num_concurrent):
+        self.cache = None
+        self.barrier = threading.Barrier(num_concurrent, timeout=5)
+        self.links = []
+
+    def get(self, link):
+        self.links.append(link)
+        self.barrier.wait()
+        return FakeResponse((GPU_PAGE % int(link.rsplit('p', 1)[1])).encode('utf-8'))
+
+
+def make_scraper(max_workers, fetcher):
+    return GpuScraper(BASE_LINK, BASE_LINK + '/gpus?page=', 'OnlineTrade', 'li.feature', 'h1', 'span.price',
+                      'span.stock', 'a.gpu[href]', 'div.pages > a', False, 'Графический процессор', ':',
+                      max_workers=max_workers, fetcher=fetcher)
+
+
+def make_list_page(num_gpus):
+    links = ''.join('<a class="gpu" href="/p%d">GPU</a>' % i for i in range(num_gpus))
+    return BeautifulSoup('<html><body>%s</body></html>' % links, 'html.parser')
+
+
+def test_gpu_pages_of_a_list_page_are_fetched_concurrently():
+    fetcher = FakeFetcher(3)
+    scraper = make_scraper(3, fetcher)
+    rows = list(scraper.iter_page(make_list_page(6)))
+    assert sorted(fetcher.links) == sorted(BASE_LINK + '/p%d' % i for i in range(6))
+    assert [row['url'] for row in rows] == [BASE_LINK + '/p%d' % i for i in range(6)]
+    assert [row['gpu_price'] for row in rows] == ['75999'] * 6
+    assert {row['gpu_model'] for row in rows} == {'RTX 3060'}
+
+
+def test_gpu_pages_are_fetched_one_by_one_with_one_worker():
+    scraper = make_scraper(1, FakeFetcher(1))
+    rows = list(scraper.iter_page(make_list_page(3)))
+    assert [row['url'] for row in rows] == [BASE_LINK + '/p%d' % i for i in range(3)]
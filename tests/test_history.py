@@ -0,0 +1,102 @@
+from store_engine.history import HistoryPipeline, HistoryStore, format_diff
+
+LINK = 'https://www.onlinetrade.ru/p1.html'
+OTHER_LINK = 'https://www.onlinetrade.ru/p2.html'
+
+
+def make_row(url=LINK, gpu_price='75999', in_stock='true', fetch_ts=1000, **values):
+    return {'store_name': 'OnlineTrade', 'gpu_model': 'RTX 3060', 'gpu_name': 'ASUS RTX 3060', 'fetch_ts': fetch_ts,
+            'gpu_price': gpu_price, 'in_stock': in_stock, 'url': url, **values}
+
+
+def test_versions_are_written_only_on_change(tmp_path):
+    with HistoryStore(str(tmp_path / 'history.sqlite')) as history:
+        assert history.record(make_row()) == 'new'
+        history.finish_run()
+        assert history.record(make_row(fetch_ts=2000)) is None
+        history.finish_run()
+        assert history.record(make_row(gpu_price='69999', fetch_ts=3000)) == 'changed'
+        diff = history.finish_run()
+        assert diff['changed'] == [{'url': LINK, 'store_name': 'OnlineTrade', 'gpu_price': (75999, 69999)}]
+        assert [(version['fetch_ts'], version['gpu_price']) for version in history.get_price_history(LINK)] == [
+            (1000, 75999), (3000, 69999)]
+
+
+def test_gpus_not_seen_are_removed_and_come_back_as_new(tmp_path):
+    with HistoryStore(str(tmp_path / 'history.sqlite')) as history:
+        history.record(make_row())
+        history.record(make_row(OTHER_LINK))
+        history.finish_run()
+        history.record(make_row())
+        diff = history.finish_run()
+        assert [gpu['url'] for gpu in diff['removed']] == [OTHER_LINK]
+        assert [gpu['url'] for gpu in history.get_latest_prices('RTX 3060')] == [LINK]
+        history.record(make_row(fetch_ts=3000))
+        assert history.record(make_row(OTHER_LINK, fetch_ts=3000)) == 'new'
+        assert format_diff(history.finish_run()).split('\n')[0] == '1 new, 0 changed, 0 removed gpus'
+
+
+def test_stores_without_gpus_in_a_run_are_kept(tmp_path):
+    with HistoryStore(str(tmp_path / 'history.sqlite')) as history:
+        history.record(make_row())
+        history.finish_run()
+        history.record(make_row('https://www.regard.ru/p1.html', store_name='Regard'))
+        assert history.finish_run()['removed'] == []
+
+
+def test_runs_are_committed_by_finish_run(tmp_path):
+    path = str(tmp_path / 'history.sqlite')
+    with HistoryStore(path) as history:
+        history.record(make_row())
+        history.finish_run()
+        history.record(make_row(OTHER_LINK))
+    with HistoryStore(path) as history:
+        assert [gpu['url'] for gpu in history.get_latest_prices('RTX 3060', in_stock_only=True)] == [LINK]
+
+
+def test_format_diff():
+    diff = {'new': [{'url': LINK, 'gpu_name': 'ASUS RTX 3060', 'gpu_price': 75999}],
+            'changed': [{'url': OTHER_LINK, 'gpu_price': (75999, 69999)}], 'removed': []}
+    assert format_diff(diff).split('\n') == ['1 new, 1 changed, 0 removed gpus',
+                                             '  new     %s (ASUS RTX 3060, 75999)' % LINK,
+                                             '  changed %s (gpu_price: 75999 -> 69999)' % OTHER_LINK]
+
+
+def test_a_suspended_run_is_continued(tmp_path):
+    path = str(tmp_path / 'history.sqlite')
+    with HistoryStore(path) as history:
+        history.record(make_row())
+        history.record(make_row(OTHER_LINK))
+        history.finish_run()
+        history.record(make_row(fetch_ts=2000))
+        history.suspend_run()
+    with HistoryStore(path) as history:
+        history.record(make_row(OTHER_LINK, fetch_ts=2000))
+        assert history.finish_run()['removed'] == []
+        history.record(make_row(fetch_ts=3000))
+        assert [gpu['url'] for gpu in history.finish_run()['removed']] == [OTHER_LINK]
+
+
+class FakeSpider:
+    class logger:
+        @staticmethod
+        def info(*args):
+            pass
+
+
+def test_pipeline_finishes_the_run_only_when_the_crawl_finished(tmp_path):
+    path = str(tmp_path / 'history.sqlite')
+    with HistoryStore(path) as history:
+        history.record(make_row())
+        history.record(make_row(OTHER_LINK))
+        history.finish_run()
+    pipeline = HistoryPipeline(path)
+    pipeline.open_spider(FakeSpider)
+    pipeline.process_item(make_row(fetch_ts=2000), FakeSpider)
+    pipeline.spider_closed(FakeSpider, 'shutdown')
+    with HistoryStore(path) as history:
+        assert len(history.get_latest_prices('RTX 3060')) == 2
+    pipeline.open_spider(FakeSpider)
+    pipeline.spider_closed(FakeSpider, 'finished')
+    with HistoryStore(path) as history:
+        assert [gpu['url'] for gpu in history.get_latest_prices('RTX 3060')] == [LINK]
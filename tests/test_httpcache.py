@@ -0,0 +1,24 @@
+from scrapy import Request
+from scrapy.http import HtmlResponse
+from scrapy.settings import Settings
+
+from store_engine.httpcache import RevalidatePolicy
+
+LINK = 'https://www.onlinetrade.ru/p1.html'
+
+
+def make_response(status=200, headers=None, flags=None):
+    return HtmlResponse(LINK, status=status, headers=headers, body=b'<html></html>', flags=flags)
+
+
+def test_only_complete_pages_which_can_be_revalidated_are_cached():
+    policy = RevalidatePolicy(Settings())
+    request = Request(LINK)
+    assert policy.should_cache_response(make_response(headers={'ETag': '"v1"'}), request)
+    assert policy.should_cache_response(make_response(headers={'Last-Modified': 'Mon, 15 Nov 2021 10:00:00 GMT'}),
+                                        request)
+    assert not policy.should_cache_response(make_response(), request)
+    assert not policy.should_cache_response(make_response(404, {'ETag': '"v1"'}), request)
+    # The download of the page was stopped once its fields were found, so its body is incomplete.
+    assert not policy.should_cache_response(make_response(headers={'ETag': '"v1"'}, flags=['download_stopped']),
+                                            request)
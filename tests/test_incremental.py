@@ -0,0 +1,65 @@
+import csv
+import time
+
+from store_engine.incremental import get_previous_row, load_previous_data
+from task1.gpu_scraper import COLUMNS, GpuScraper
+
+BASE_LINK = 'https://www.onlinetrade.ru'
+LINK = BASE_LINK + '/p1.html'
+OTHER_LINK = BASE_LINK + '/p2.html'
+LIST_PAGE = '''<html><body>
+<div class="item"><a class="name" href="/p1.html?utm_source=list">Видеокарта Palit GeForce RTX 3060 Dual</a>
+<span class="price">32 990 ₽</span></div>
+<div class="item"><a class="name" href="/p2.html">Видеокарта MSI GeForce RTX 3070 Ventus</a>
+<span class="price">54 990 ₽</span></div></body></html>'''
+
+
+def write_previous_output(path, fetch_ts):
+    # The names come from the gpu pages, so they are not the names of the list page.
+    rows = [['OnlineTrade', 'RTX 3060', 'Palit RTX 3060 Dual 12GB', fetch_ts, '32990', 'True', LINK],
+            ['OnlineTrade', 'RTX 3070', 'MSI RTX 3070 Ventus 8GB', fetch_ts, '49990', 'True', OTHER_LINK + '?ysclid=1']]
+    with open(path, 'w', newline='', encoding='utf-8') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(COLUMNS)
+        writer.writerows(rows)
+
+
+class FakeFetcher:
+    cache = None
+
+    def get(self, link):
+        raise AssertionError('The gpu pages are not fetched in this test: %s' % link)
+
+
+def test_the_listing_price_is_compared_once_normalized(tmp_path):
+    path = str(tmp_path / 'output.csv')
+    write_previous_output(path, int(time.time()))
+    previous_data = load_previous_data(path)
+    assert set(previous_data) == {LINK, OTHER_LINK}
+    assert get_previous_row(previous_data, LINK, {'gpu_name': 'Palit GeForce RTX 3060', 'gpu_price': '32 990 ₽'},
+                            3600) is previous_data[LINK]
+    assert get_previous_row(previous_data, LINK, {'gpu_price': 32990}, 3600) is previous_data[LINK]
+    assert get_previous_row(previous_data, LINK, {}, 3600) is previous_data[LINK]
+    assert get_previous_row(previous_data, LINK, {'gpu_price': '29 990 ₽'}, 3600) is None
+    assert get_previous_row(previous_data, LINK, {'gpu_price': ''}, 3600) is None
+    assert get_previous_row(previous_data, BASE_LINK + '/p3.html', {}, 3600) is None
+    assert get_previous_row(None, LINK, {}, 3600) is None
+
+
+def test_old_previous_data_is_not_reused(tmp_path):
+    path = str(tmp_path / 'output.csv')
+    write_previous_output(path, int(time.time()) - 7200)
+    assert get_previous_row(load_previous_data(path), LINK, {'gpu_price': '32990'}, 3600) is None
+
+
+def test_unchanged_gpus_of_the_list_page_are_reused(tmp_path):
+    path = str(tmp_path / 'output.csv')
+    write_previous_output(path, int(time.time()))
+    scraper = GpuScraper(BASE_LINK, BASE_LINK + '/gpus?page=', 'OnlineTrade', 'li', 'h1', 'span.js__actualPrice',
+                         'label', 'a.name[href]', 'div.pages > a', False, 'Графический процессор', ':',
+                         fetcher=FakeFetcher(), gpu_item_element='div.item', gpu_item_name_element='a.name',
+                         gpu_item_price_element='span.price', previous_data=load_previous_data(path))
+    scraper.scrape_gpu = lambda gpu_link: ({'url': gpu_link, 'gpu_price': '54990'}, time.time())
+    rows = list(scraper.iter_page(scraper.parse_page(LIST_PAGE.encode('utf-8'), scraper.page_strainer, 'list')))
+    assert rows[0] == load_previous_data(path)[LINK]
+    assert rows[1] == {'url': OTHER_LINK, 'gpu_price': '54990'}
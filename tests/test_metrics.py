@@ -0,0 +1,84 @@
+import re
+
+from store_engine.metrics import Histogram, Metrics
+
+# A sample of the Prometheus text format: a metric name, its labels and its value.
+SAMPLE_PATTERN = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{((?:[a-zA-Z_]\w*="(?:[^"\\]|\\.)*",?)*)\})? (\S+)$')
+LABEL_PATTERN = re.compile(r'([a-zA-Z_]\w*)="((?:[^"\\]|\\.)*)"')
+
+
+class FakeStats:
+    def __init__(self):
+        self.values = {}
+
+    def set_value(self, key, value):
+        self.values[key] = value
+
+
+def parse_prometheus(text):
+    """
+    Parses the Prometheus text format, and returns the types of the metrics and their samples by (name, labels).
+    """
+    types, samples = {}, {}
+    assert text.endswith('\n')
+    for line in text.splitlines():
+        if line.startswith('# TYPE '):
+            _, _, name, metric_type = line.split(' ')
+            assert name not in types and metric_type in ('counter', 'histogram')
+            types[name] = metric_type
+            continue
+        match = SAMPLE_PATTERN.match(line)
+        assert match, line
+        name, labels, value = match.groups()
+        assert any(name == type_name or name.startswith(type_name + '_') for type_name in types), line
+        samples[name, tuple(LABEL_PATTERN.findall(labels or ''))] = float(value)
+    return types, samples
+
+
+def test_histogram_buckets_and_quantiles():
+    histogram = Histogram((0.1, 1.0, 10.0))
+    for value in (0.05, 0.1, 0.5, 0.7, 2.0, 50.0):
+        histogram.observe(value)
+    assert histogram.counts == [2, 2, 1, 1]
+    assert (histogram.count, histogram.sum, histogram.max) == (6, 53.35, 50.0)
+    assert histogram.get_quantile(0.5) == 1.0
+    assert histogram.get_quantile(0.8) == 10.0
+    assert histogram.get_quantile(1.0) == 50.0
+    assert Histogram((1.0,)).get_quantile(0.5) == 0.0
+
+
+def test_prometheus_output_parses():
+    metrics = Metrics()
+    for latency in (0.03, 0.2, 0.2, 45.0):
+        metrics.observe('fetch_seconds', latency, store='OnlineTrade', page='gpu')
+    metrics.observe('fetch_seconds', 0.7, store='Reg"ard', page='list')
+    metrics.inc('retries', 2, store='OnlineTrade', page='gpu')
+    metrics.inc('field_failures', store='Regard', field='gpu_price')
+    types, samples = parse_prometheus(metrics.to_prometheus())
+    assert types == {'gpu_scraper_fetch_seconds': 'histogram', 'gpu_scraper_field_failures_total': 'counter',
+                     'gpu_scraper_retries_total': 'counter'}
+    labels = (('page', 'gpu'), ('store', 'OnlineTrade'))
+    buckets = [(float(dict(sample_labels)['le']), value) for (name, sample_labels), value in samples.items()
+               if name == 'gpu_scraper_fetch_seconds_bucket' and sample_labels[:2] == labels]
+    assert buckets == sorted(buckets) and [value for _, value in buckets] == sorted(value for _, value in buckets)
+    assert buckets[0] == (0.05, 1) and buckets[-1] == (float('inf'), 4)
+    assert samples['gpu_scraper_fetch_seconds_count', labels] == 4
+    assert samples['gpu_scraper_fetch_seconds_sum', labels] == 45.43
+    assert samples['gpu_scraper_fetch_seconds_count', (('page', 'list'), ('store', 'Reg\\"ard'))] == 1
+    assert samples['gpu_scraper_retries_total', labels] == 2
+    assert samples['gpu_scraper_field_failures_total', (('field', 'gpu_price'), ('store', 'Regard'))] == 1
+
+
+def test_prometheus_file_and_stats(tmp_path):
+    metrics = Metrics()
+    metrics.observe('extract_seconds', 0.0002, store='Regard', field='gpu_price')
+    metrics.inc('retries', store='Regard', page='list')
+    path = str(tmp_path / 'metrics.prom')
+    metrics.write_prometheus(path)
+    with open(path, encoding='utf-8') as metrics_file:
+        assert metrics_file.read() == metrics.to_prometheus()
+    stats = FakeStats()
+    metrics.to_stats(stats)
+    assert stats.values['metrics/Regard/extract_seconds/gpu_price/count'] == 1
+    assert stats.values['metrics/Regard/extract_seconds/gpu_price/p95'] == 0.0002
+    assert stats.values['metrics/Regard/retries/list'] == 1
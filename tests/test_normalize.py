@@ -0,0 +1,122 @@
+import csv
+import os
+import subprocess
+
+import pytest
+
+from store_engine import normalize
+from store_engine.bench import ROOT_DIR, get_command
+from store_engine.normalize import NormalizePipeline, RawRow, normalize_batches, normalize_row, normalize_rows
+from store_engine.replay import FixtureStore, ReplayServer
+
+NAMES = ['ASUS GeForce RTX 3060 (LHR)', 'Видеокарта MSI RTX\xa03070 [RTX3070-8G]', '  Palit GTX 1650 ', None,
+         'Gigabyte RX 6600 Eagle\t8GB']
+PRICES = ['75 999 ₽', '75\xa0999 руб.', '0', 'Нет в наличии', None, '120999']
+IN_STOCK = ['= 0 шт.', ' = 0\xa0шт. ', '> 10 шт.', None]
+MODELS = ['NVIDIA\xa0GeForce RTX 3060', None]
+
+
+def make_rows(count):
+    return [RawRow(store_name='OnlineTrade', url='https://www.onlinetrade.ru/p%d.html' % i, fetch_ts=1000,
+                   gpu_model=MODELS[i % len(MODELS)], gpu_name=NAMES[i % len(NAMES)],
+                   gpu_price=PRICES[i % len(PRICES)], in_stock=IN_STOCK[i % len(IN_STOCK)])
+            for i in range(count)]
+
+
+def test_normalize_row():
+    row = normalize_row(RawRow(store_name='OnlineTrade', gpu_model='RTX\xa03060', gpu_name='Видеокарта ASUS RTX (OC)',
+                               gpu_price='75 999 ₽', in_stock='= 0 шт.'), ascii_only=True)
+    assert row == {'store_name': 'OnlineTrade', 'gpu_model': 'RTX 3060', 'gpu_name': 'ASUS RTX', 'gpu_price': '75999',
+                   'in_stock': False}
+    row = normalize_row(RawRow(gpu_model=None, gpu_name=None, gpu_price='0', in_stock=None))
+    assert row == {'gpu_model': None, 'gpu_name': '', 'gpu_price': '', 'in_stock': False}
+
+
+@pytest.mark.skipif(normalize.pandas is None, reason='pandas is not installed')
+@pytest.mark.parametrize('ascii_only', [False, True])
+def test_columns_are_normalized_like_rows(ascii_only):
+    rows = make_rows(2 * normalize.MIN_VECTORIZED_ROWS)
+    assert normalize_rows(rows, ascii_only) == [normalize_row(row, ascii_only) for row in rows]
+
+
+def test_normalized_rows_keep_their_order():
+    previous_row = {'store_name': 'OnlineTrade', 'gpu_price': '1000'}
+    rows = make_rows(3)
+    rows.insert(1, previous_row)
+    normalized_rows = list(normalize_batches(rows, batch_size=2))
+    assert normalized_rows[1] is previous_row
+    assert [row.get('url') for row in normalized_rows] == [row.get('url') for row in rows]
+    assert not any(isinstance(row, RawRow) for row in normalized_rows)
+
+
+class FakeStats:
+    def inc_value(self, key, value=1):
+        pass
+
+    def max_value(self, key, value):
+        pass
+
+
+class FakeMetrics:
+    def __init__(self):
+        self.failures = []
+
+    def inc(self, name, store, field):
+        self.failures.append(field)
+
+
+class FakeSpider:
+    class crawler:
+        stats = FakeStats()
+
+    def __init__(self):
+        self.metrics = FakeMetrics()
+
+
+def test_pipeline_normalizes_its_items_in_batches():
+    spider = FakeSpider()
+    pipeline = NormalizePipeline(batch_size=2)
+    items = []
+    rows = make_rows(3)
+    for row in rows:
+        pipeline.process_item(row, spider).addCallback(items.append)
+        assert len(items) == (2 if row is rows[1] else 0 if row is rows[0] else 2)
+    assert pipeline.process_item({'gpu_price': '1'}, spider) == {'gpu_price': '1'}
+    pipeline.close_spider(spider)
+    assert items == [normalize_row(row) for row in rows]
+    assert spider.metrics.failures == ['gpu_price']
+
+
+LIST_PAGE = '''<html><body>%s</body></html>''' % ''.join('''<div class="indexGoods__item">
+<div class="indexGoods__item__flexCover"><div class="indexGoods__item__descriptionCover">
+<a href="/catalogue/videokarty-c338/gpu-%d.html">Видеокарта MSI GeForce RTX\xa03070 Ventus (RTX 3070 VENTUS)</a>
+</div></div></div>''' % i for i in range(2))
+GPU_PAGE = '''<html><body><span class="js__actualPrice"><span>54\xa0990</span> ₽</span>
+<span class="catalog__displayedItem__availabilityCount"><label>%s</label></span>
+<ul><li class="featureList__item"><span>Графический процессор:</span>NVIDIA\xa0GeForce RTX 3070</li></ul>
+</body></html>'''
+
+
+@pytest.mark.parametrize('batch_size', [0, 2])
+def test_crawl_with_the_pipeline(tmp_path, batch_size):
+    # The spider of task2 is run over the replay server, normalizing its items by itself or with the pipeline.
+    fixtures = FixtureStore(str(tmp_path / 'fixtures'))
+    fixtures.put('www.onlinetrade.ru', '/catalogue/videokarty-c338/?page=0', 200, 'text/html; charset=utf-8',
+                 LIST_PAGE.encode('utf-8'))
+    for i, in_stock in enumerate(['в наличии', '= 0\xa0шт.']):
+        fixtures.put('www.onlinetrade.ru', '/catalogue/videokarty-c338/gpu-%d.html' % i, 200,
+                     'text/html; charset=utf-8', (GPU_PAGE % in_stock).encode('utf-8'))
+    server = ReplayServer(fixtures.fixture_dir).start()
+    output = str(tmp_path / 'output.csv')
+    try:
+        command, cwd = get_command('task2', server.url, output)
+        command += ['-a', 'store_names=OnlineTrade', '-s', 'NORMALIZE_BATCH_SIZE=%d' % batch_size]
+        env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [ROOT_DIR, os.environ.get('PYTHONPATH')]))}
+        subprocess.run(command, cwd=cwd, env=env, check=True, timeout=120)
+    finally:
+        server.stop()
+    with open(output, newline='', encoding='utf-8') as csv_file:
+        rows = sorted(csv.DictReader(csv_file), key=lambda row: row['url'])
+    assert [(row['gpu_model'], row['gpu_name'], row['gpu_price'], row['in_stock']) for row in rows] == [
+        ('NVIDIA GeForce RTX 3070', 'Видеокарта MSI GeForce RTX 3070 Ventus', '54990', 'True'),
+        ('NVIDIA GeForce RTX 3070', 'Видеокарта MSI GeForce RTX 3070 Ventus', '54990', 'False')]
@@ -0,0 +1,65 @@
+import datetime
+import os
+
+import pytest
+
+from store_engine import parquet
+
+pytest.importorskip('pyarrow')
+
+# 2021-11-15 10:00:00 UTC, and the same time on the day before.
+FETCH_TS = 1636970400
+OLD_FETCH_TS = FETCH_TS - 24 * 3600
+
+
+def make_row(url, store_name='OnlineTrade', gpu_model='NVIDIA GeForce RTX 3060', gpu_price='32990', fetch_ts=FETCH_TS,
+             in_stock='True'):
+    return {'store_name': store_name, 'gpu_model': gpu_model, 'gpu_name': 'Palit GeForce RTX 3060',
+            'fetch_ts': fetch_ts, 'gpu_price': gpu_price, 'in_stock': in_stock, 'url': url}
+
+
+def test_to_record():
+    record = parquet.to_record(make_row('https://www.onlinetrade.ru/p1.html', gpu_price='', in_stock='false'))
+    assert record['fetch_ts'] == datetime.datetime(2021, 11, 15, 10, tzinfo=datetime.timezone.utc)
+    assert record['scrape_date'] == '2021-11-15'
+    assert record['gpu_price'] is None and record['in_stock'] is False
+    record = parquet.to_record(make_row('https://www.onlinetrade.ru/p1.html', gpu_price=32990, in_stock=True),
+                               '2021-11-16')
+    assert record['scrape_date'] == '2021-11-16'
+    assert record['gpu_price'] == 32990 and record['in_stock'] is True
+    assert parquet.get_scrape_date(OLD_FETCH_TS) == '2021-11-14'
+
+
+def test_the_gpus_of_a_run_are_in_its_partition(tmp_path):
+    root_dir = str(tmp_path / 'gpus')
+    with parquet.ParquetWriter(root_dir, batch_size=2, scrape_date='2021-11-15') as writer:
+        # The second gpu was reused by an incremental run, with the fetch_ts of the day before.
+        writer.write_all([make_row('https://www.onlinetrade.ru/p1.html'),
+                          make_row('https://www.onlinetrade.ru/p2.html', fetch_ts=OLD_FETCH_TS),
+                          make_row('https://regard.ru/p1.htm', store_name='Regard')])
+    assert sorted(os.listdir(os.path.join(root_dir, 'store_name=OnlineTrade'))) == ['scrape_date=2021-11-15']
+    assert sorted(os.listdir(os.path.join(root_dir, 'store_name=Regard'))) == ['scrape_date=2021-11-15']
+    table = parquet.read_price_history(root_dir, 'OnlineTrade')
+    assert sorted(row['fetch_ts'].timestamp() for row in table.to_pylist()) == [OLD_FETCH_TS, FETCH_TS]
+
+
+def test_the_default_scrape_date_is_the_start_of_the_run(tmp_path):
+    writer = parquet.ParquetWriter(str(tmp_path))
+    assert writer.scrape_date == parquet.get_scrape_date()
+
+
+def test_read_filters(tmp_path):
+    root_dir = str(tmp_path / 'gpus')
+    for scrape_date, gpu_price in (('2021-11-14', '34990'), ('2021-11-15', '32990'), ('2021-11-16', '31990')):
+        with parquet.ParquetWriter(root_dir, scrape_date=scrape_date) as writer:
+            writer.write(make_row('https://www.onlinetrade.ru/p1.html', gpu_price=gpu_price))
+            writer.write(make_row('https://www.onlinetrade.ru/p2.html', gpu_model='NVIDIA GeForce RTX 3070'))
+            writer.write(make_row('https://regard.ru/p1.htm', store_name='Regard'))
+    assert parquet.read_price_history(root_dir).num_rows == 9
+    table = parquet.read_price_history(root_dir, 'OnlineTrade', '2021-11-15', gpu_model='NVIDIA GeForce RTX 3060',
+                                       columns=['url', 'gpu_price'])
+    assert sorted(table.to_pylist(), key=lambda row: row['gpu_price']) == [
+        {'url': 'https://www.onlinetrade.ru/p1.html', 'gpu_price': 31990},
+        {'url': 'https://www.onlinetrade.ru/p1.html', 'gpu_price': 32990}]
+    assert parquet.read_price_history(root_dir, 'Regard', end_date='2021-11-14').num_rows == 1
+    assert parquet.read_price_history(root_dir, 'Citilink').num_rows == 0
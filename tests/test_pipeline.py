@@ -0,0 +1,121 @@
+import threading
+
+import requests
+
+from store_engine.history import HistoryStore
+from store_engine.urls import SeenSet
+from task1.frontier import Frontier
+from task1.main import end_run
+from task1.pipeline import ScrapePipeline
+
+
+class FakeScraper:
+    """
+    A stand-in of GpuScraper with one list page of gpu links, whose gpus are scraped once their store is released. The
+    gpu pages in errors fail with their status, and the list page fails if list_error is set.
+    """
+
+    def __init__(self, store_name, num_gpus, max_workers=1, errors=None, list_error=False):
+        self.store_name = store_name
+        self.max_workers = max_workers
+        self.page_start_from_zero = False
+        self.seen_links = SeenSet()
+        self.last_scrape = None
+        self.links = ['https://%s.ru/p%d' % (store_name, i) for i in range(num_gpus)]
+        self.released = threading.Event()
+        self.released.set()
+        self.errors = errors or {}
+        self.list_error = list_error
+
+    def iter_pages(self, page_num):
+        if self.list_error:
+            raise requests.ConnectionError('Connection refused')
+        yield self.links
+
+    def get_new_gpu_items(self, page_content):
+        return [(link, {}) for link in page_content if self.seen_links.add(link)]
+
+    def get_previous_row(self, gpu_link, item_data):
+        return None
+
+    def scrape_gpu(self, gpu_link, raise_errors=False):
+        if not self.released.wait(5):
+            raise TimeoutError(gpu_link)
+        if gpu_link in self.errors:
+            response = requests.Response()
+            response.status_code = self.errors[gpu_link]
+            raise requests.HTTPError('%d Error for url: %s' % (response.status_code, gpu_link), response=response)
+        return {'store_name': self.store_name, 'url': gpu_link}, 1.0
+
+
+def test_slow_store_does_not_hold_the_other_stores():
+    slow, fast = FakeScraper('slow', 50), FakeScraper('fast', 20)
+    slow.released.clear()
+    rows = ScrapePipeline([slow, fast], queue_size=5).run()
+    fast_rows = [next(rows) for _ in range(20)]
+    assert {row['store_name'] for row in fast_rows} == {'fast'}
+    slow.released.set()
+    assert len(list(rows)) == 50
+
+
+def test_every_store_uses_its_max_workers():
+    scrapers = [FakeScraper('a', 3, max_workers=2), FakeScraper('b', 4, max_workers=3)]
+    pipeline = ScrapePipeline(scrapers)
+    assert pipeline.num_workers == [2, 3]
+    rows = list(pipeline.run())
+    assert sorted(row['url'] for row in rows) == sorted(scrapers[0].links + scrapers[1].links)
+    assert all(scraper.last_scrape == 1.0 for scraper in scrapers)
+
+
+def test_failed_pages_are_recorded():
+    scraper = FakeScraper('a', 4)
+    scraper.errors = {scraper.links[0]: 503, scraper.links[1]: 404, scraper.links[2]: 410}
+    pipeline = ScrapePipeline([scraper, FakeScraper('b', 2, list_error=True)])
+    rows = list(pipeline.run())
+    assert [row['url'] for row in rows] == [scraper.links[3]]
+    # The removed gpus are skipped, but they do not fail the run.
+    assert pipeline.failed and pipeline.failed_links == [scraper.links[0]] and pipeline.failed_stores == ['b']
+    pipeline = ScrapePipeline([FakeScraper('a', 2, errors={'https://a.ru/p0': 404})])
+    assert len(list(pipeline.run())) == 1 and not pipeline.failed
+
+
+def run_and_end(tmp_path, scraper):
+    """
+    Runs a pipeline over the scraper like main.py, with a previous output, and ends the run.
+    """
+    temp_output, output = tmp_path / 'output.csv.tmp', tmp_path / 'output.csv'
+    output.write_text('previous', encoding='utf-8')
+    frontier = Frontier(str(tmp_path / 'frontier.jsonl'))
+    history = HistoryStore(str(tmp_path / 'history.sqlite'))
+    pipeline = ScrapePipeline([scraper], frontier=frontier)
+    with open(temp_output, 'w', encoding='utf-8') as writer:
+        for row in pipeline.run():
+            writer.write(row['url'] + '\n')
+            frontier.add_done([row['url']])
+            history.record({'store_name': row['store_name'], 'gpu_model': '', 'gpu_name': '', 'fetch_ts': 1000,
+                            'gpu_price': '', 'in_stock': 'true', 'url': row['url']})
+    finished = end_run(pipeline, history, frontier, str(temp_output), str(output))
+    frontier.close()
+    history.close()
+    return finished
+
+
+def test_a_failed_run_is_kept_for_the_next_run(tmp_path):
+    scraper = FakeScraper('a', 3, errors={'https://a.ru/p1': 503})
+    assert not run_and_end(tmp_path, scraper)
+    assert (tmp_path / 'output.csv').read_text(encoding='utf-8') == 'previous'
+    assert (tmp_path / 'output.csv.tmp').read_text(encoding='utf-8').split() == ['https://a.ru/p0', 'https://a.ru/p2']
+    frontier = Frontier(str(tmp_path / 'frontier.jsonl'))
+    frontier.add_done(['https://a.ru/p0', 'https://a.ru/p2'])
+    assert frontier.resumed and frontier.get_pending('a') == ['https://a.ru/p1']
+    frontier.close()
+    with HistoryStore(str(tmp_path / 'history.sqlite')) as history:
+        assert sorted(history.seen_urls) == ['https://a.ru/p0', 'https://a.ru/p2']
+
+
+def test_a_run_without_failures_is_finished(tmp_path):
+    assert run_and_end(tmp_path, FakeScraper('a', 3, errors={'https://a.ru/p1': 404}))
+    assert (tmp_path / 'output.csv').read_text(encoding='utf-8').split() == ['https://a.ru/p0', 'https://a.ru/p2']
+    assert not (tmp_path / 'output.csv.tmp').exists() and not (tmp_path / 'frontier.jsonl').exists()
+    with HistoryStore(str(tmp_path / 'history.sqlite')) as history:
+        assert history.seen_urls == {}
@@ -0,0 +1,74 @@
+import sys
+import urllib.error
+import urllib.request
+
+import pytest
+
+from store_engine.bench import ROOT_DIR, SCRAPY_PROJECTS, get_command
+from store_engine.replay import FixtureStore, ReplayServer, replay_link, replay_store
+
+HOST = 'www.regard.ru'
+PATH = '/catalog/1013/videokarty?page=2'
+PAGE = '<html><body>Видеокарты</body></html>'.encode('utf-8')
+
+
+@pytest.fixture
+def server(tmp_path):
+    FixtureStore(str(tmp_path)).put(HOST, PATH, 200, 'text/html; charset=utf-8', PAGE)
+    server = ReplayServer(str(tmp_path), port=0).start()
+    yield server
+    server.stop()
+
+
+def read(link):
+    try:
+        with urllib.request.urlopen(link, timeout=5) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def test_fixture_store_put_and_get(tmp_path):
+    fixtures = FixtureStore(str(tmp_path))
+    assert fixtures.get(HOST, PATH) is None
+    fixtures.put(HOST, PATH, 200, 'text/html', PAGE)
+    fixtures.put('127.0.0.1:8000', PATH, 503, 'text/plain', b'busy')
+    assert fixtures.get(HOST, PATH) == (200, 'text/html', PAGE)
+    assert fixtures.get('127.0.0.1:8000', PATH) == (503, 'text/plain', b'busy')
+    assert fixtures.get(HOST, '/catalog/1013/videokarty?page=3') is None
+
+
+def test_replay_links():
+    server_url = 'http://127.0.0.1:8765/'
+    assert replay_link('https://%s%s' % (HOST, PATH), server_url) == 'http://127.0.0.1:8765/%s%s' % (HOST, PATH)
+    store = replay_store({'base_link': 'https://www.regard.ru', 'gpu_page_link': 'https://www.regard.ru/c?page='},
+                         server_url)
+    assert store == {'base_link': 'http://127.0.0.1:8765/www.regard.ru',
+                     'gpu_page_link': 'http://127.0.0.1:8765/www.regard.ru/c?page='}
+
+
+def test_saved_pages_are_served_and_missing_pages_are_404(server):
+    assert read(replay_link('https://%s%s' % (HOST, PATH), server.url)) == (200, PAGE)
+    assert read(replay_link('https://%s/catalog/1013/videokarty?page=3' % HOST, server.url)) == (404, b'Not recorded')
+    assert (server.num_requests, server.num_bytes, server.num_missing, server.num_errors) == (2, len(PAGE), 1, 0)
+    server.reset_counts()
+    assert server.num_requests == 0
+
+
+def test_errors_are_injected(server):
+    server.error_rate = 1.0
+    assert read(replay_link('https://%s%s' % (HOST, PATH), server.url)) == (503, b'Injected error')
+    assert server.num_errors == 1 and server.num_bytes == 0
+
+
+def test_bench_commands():
+    command, cwd = get_command('task1_async', 'http://127.0.0.1:8765', 'out.csv')
+    assert command == [sys.executable, '-m', 'store_engine.bench', '--run-task1-async', 'http://127.0.0.1:8765',
+                       'out.csv']
+    assert cwd == ROOT_DIR
+    command, cwd = get_command('task2', 'http://127.0.0.1:8765', 'out.csv', throttle=True)
+    assert command[1:4] == ['-m', 'scrapy', 'crawl'] and cwd == SCRAPY_PROJECTS['task2']
+    assert 'replay_server=http://127.0.0.1:8765' in command and 'STORE_THROTTLE_ENABLED=True' in command
+    assert 'DOWNLOADER_MIDDLEWARES={}' not in command
+    command, cwd = get_command('task3', 'http://127.0.0.1:8765', 'out.csv')
+    assert 'DOWNLOADER_MIDDLEWARES={}' in command and cwd == SCRAPY_PROJECTS['task3']
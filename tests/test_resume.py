@@ -0,0 +1,37 @@
+import pytest
+from scrapy import Spider, signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.test import get_crawler
+
+from store_engine.resume import FinishedJobCleaner
+
+
+def close_crawl(tmp_path, reason):
+    job_dir = tmp_path / 'job'
+    (job_dir / 'requests.queue').mkdir(parents=True)
+    (job_dir / 'spider.state').write_bytes(b'state')
+    # Only the cleaner listens to the signals (the other extensions would save their state in the JOBDIR).
+    settings = {'JOBDIR': str(job_dir), 'JOBDIR_CLEAR_FINISHED': True, 'EXTENSIONS_BASE': {}}
+    crawler = get_crawler(Spider, settings_dict=settings)
+    cleaner = FinishedJobCleaner.from_crawler(crawler)
+    crawler.signals.send_catch_log(signals.spider_closed, spider=Spider('gpus'), reason=reason)
+    assert job_dir.exists()
+    crawler.signals.send_catch_log(signals.engine_stopped)
+    assert cleaner.finished == (reason == 'finished')
+    return job_dir
+
+
+def test_the_job_dir_of_a_finished_crawl_is_removed(tmp_path):
+    assert not close_crawl(tmp_path, 'finished').exists()
+
+
+@pytest.mark.parametrize('reason', ['shutdown', 'cancelled', 'closespider_errorcount'])
+def test_the_job_dir_of_a_stopped_crawl_is_kept(tmp_path, reason):
+    job_dir = close_crawl(tmp_path, reason)
+    assert (job_dir / 'spider.state').read_bytes() == b'state'
+
+
+@pytest.mark.parametrize('settings', [{'JOBDIR_CLEAR_FINISHED': True}, {'JOBDIR': 'job'}])
+def test_the_cleaner_needs_a_job_dir_and_its_setting(settings):
+    with pytest.raises(NotConfigured):
+        FinishedJobCleaner.from_crawler(get_crawler(Spider, settings_dict=settings))
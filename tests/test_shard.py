@@ -0,0 +1,61 @@
+import subprocess
+import sys
+
+from scrapy.utils.test import get_crawler
+
+from store_engine.history import HistoryStore
+from store_engine.shard import ROOT_DIR, make_shards, merge_items, record_history
+from store_engine.throttle import StoreThrottle
+
+PROFILE = {'concurrency': 8, 'start_delay': 0.5, 'min_delay': 0.25, 'max_delay': 10.0, 'target_concurrency': 4.0}
+
+
+def test_every_shard_has_its_own_directories_and_share_of_the_throttle():
+    shards = make_shards(['OnlineTrade', 'Regard'], 2, {'replay_server': 'http://127.0.0.1:8765'},
+                         {'JOBDIR': 'crawls', 'HISTORY_DB': 'history.sqlite'}, [{'proxy': 'a'}, {'proxy': 'b'}])
+    assert [shard['spider_kwargs']['shard'] for shard in shards] == ['0/2', '1/2', '0/2', '1/2']
+    assert [shard['spider_kwargs']['store_names'] for shard in shards] == ['OnlineTrade'] * 2 + ['Regard'] * 2
+    assert len({shard['settings']['JOBDIR'] for shard in shards}) == 4
+    assert len({shard['settings']['HTTPCACHE_DIR'] for shard in shards}) == 4
+    assert [shard['settings']['TOR_PROXIES'] for shard in shards] == [[{'proxy': 'a'}], [{'proxy': 'b'}]] * 2
+    assert all(shard['settings']['STORE_THROTTLE_SHARDS'] == 2 and shard['settings']['HISTORY_DB'] is None
+               for shard in shards)
+
+
+def test_the_throttle_profile_is_split_between_the_shards():
+    throttle = StoreThrottle(get_crawler(settings_dict={'STORE_THROTTLE_ENABLED': True}))
+    assert throttle.split_profile(PROFILE) is PROFILE
+    throttle = StoreThrottle(get_crawler(settings_dict={'STORE_THROTTLE_ENABLED': True, 'STORE_THROTTLE_SHARDS': 4}))
+    assert throttle.split_profile(PROFILE) == {'concurrency': 2, 'start_delay': 2.0, 'min_delay': 1.0,
+                                               'max_delay': 40.0, 'target_concurrency': 1.0}
+    assert throttle.split_profile({'concurrency': 2})['concurrency'] == 1
+
+
+def test_merge_keeps_the_latest_row_of_every_gpu():
+    items = [{'url': 'a', 'fetch_ts': 2}, {'url': 'b', 'fetch_ts': 1}, {'url': 'a', 'fetch_ts': '1'},
+             {'url': 'b', 'fetch_ts': 3}]
+    assert merge_items(items) == [{'url': 'a', 'fetch_ts': 2}, {'url': 'b', 'fetch_ts': 3}]
+
+
+def make_item(url, fetch_ts):
+    return {'store_name': 'OnlineTrade', 'gpu_model': 'RTX 3060', 'gpu_name': 'ASUS RTX 3060', 'fetch_ts': fetch_ts,
+            'gpu_price': '75999', 'in_stock': 'true', 'url': url}
+
+
+def test_the_history_run_is_finished_only_when_every_shard_finished(tmp_path):
+    history_db = str(tmp_path / 'history.sqlite')
+    record_history([make_item('a', 1), make_item('b', 1)], history_db, True)
+    # A shard failed, so 'b' may still be in the store: the run is left open and nothing is removed.
+    record_history([make_item('a', 2)], history_db, False)
+    with HistoryStore(history_db) as history:
+        assert sorted(history.seen_urls) == ['a']
+        assert [gpu['url'] for gpu in history.get_latest_prices('RTX 3060')] == ['a', 'b']
+    record_history([make_item('a', 3)], history_db, True)
+    with HistoryStore(history_db) as history:
+        assert [gpu['url'] for gpu in history.get_latest_prices('RTX 3060')] == ['a']
+
+
+def test_a_job_dir_needs_a_shards_dir():
+    process = subprocess.run([sys.executable, '-m', 'store_engine.shard', 'task2', '-s', 'JOBDIR=crawls'],
+                             cwd=ROOT_DIR, capture_output=True, text=True)
+    assert process.returncode == 2 and '--shards-dir is required' in process.stderr
@@ -0,0 +1,68 @@
+import gzip
+
+import pytest
+
+from store_engine import get_store_config, load_stores
+from store_engine.stream import StreamParser
+
+CONTENT_TYPE = b'text/html; charset=utf-8'
+REGARD_PAGE = '''<html><head><title>Видеокарта</title></head><body>
+<div id="hits-long"><div class="content"><div class="block bblock-long lot"><div class="bcontent lot">
+<div class="goods_price"><div class="price_block"><span class="price lot"><span>45 990</span></span></div>
+<div class="goodCard_inStock_button inStock_available">В наличии</div></div>
+<div id="tabs-1"><table>
+<tr><td>Производитель</td><td>Palit</td></tr>
+<tr><td>Серия</td><td>GeForce RTX 3060</td></tr>
+<tr><td>Объем памяти</td><td>12 Гб</td></tr>
+</table></div></div></div></div></div>
+<div id="footer">%s</div></body></html>''' % ('<p>Доставка по всей России</p>' * 500)
+
+
+def get_regard_queries():
+    store = next(store for store in load_stores() if store['store_name'] == 'Regard')
+    config = get_store_config(store, 'xpath', 'scrapy')
+    return {name: config[name] for name in ('gpu_model_element', 'gpu_price_element', 'gpu_in_stock_element')}
+
+
+def feed(parser, body, chunk_size=16):
+    for start in range(0, len(body), chunk_size):
+        if parser.feed(body[start:start + chunk_size]):
+            return start + chunk_size
+    return None
+
+
+def test_regard_page_is_streamed_until_its_fields_are_found():
+    body = REGARD_PAGE.encode('utf-8')
+    parser = StreamParser(get_regard_queries(), CONTENT_TYPE)
+    num_bytes = feed(parser, body)
+    assert num_bytes is not None and num_bytes < body.index(b'footer')
+    assert {name: value.strip() for name, value in parser.values.items()} == {
+        'gpu_model_element': 'GeForce RTX 3060', 'gpu_price_element': '45 990', 'gpu_in_stock_element': 'В наличии'}
+
+
+def test_compressed_page_with_a_meta_charset():
+    body = gzip.compress(REGARD_PAGE.replace('<head>', '<head><meta charset="utf-8">').encode('utf-8'))
+    parser = StreamParser(get_regard_queries(), b'text/html', b'gzip')
+    assert feed(parser, body) is not None
+    assert parser.values['gpu_model_element'].strip() == 'GeForce RTX 3060'
+
+
+def test_selectors_depending_on_the_rest_of_the_page_are_rejected():
+    with pytest.raises(ValueError):
+        StreamParser({'gpu_model': '//tr/td[contains(text(), "Серия")]/../td[last()]/text()'})
+    with pytest.raises(ValueError):
+        StreamParser({'gpu_model': '//tr/td[count(following-sibling::*) = 0]/text()'})
+
+
+def test_matches_in_a_row_are_final_once_the_row_is_closed():
+    body = '<html><body><table><tr><td>a</td><td>b</td><td>c</td></tr><tr><td>d</td><td>e</td></tr>' \
+           '</table></body></html>'.encode('utf-8')
+    parser = StreamParser({'cell': '//tr[not(td[3])]/td[2]/text()'}, CONTENT_TYPE)
+    feed(parser, body, chunk_size=1)
+    assert parser.values == {'cell': 'e'}
+
+
+def test_page_without_a_declared_encoding_is_not_streamed():
+    parser = StreamParser(get_regard_queries())
+    assert feed(parser, REGARD_PAGE.encode('utf-8')) is None
+    assert parser.failed and parser.close() is None
@@ -0,0 +1,82 @@
+import pytest
+from scrapy import Request, Spider
+from scrapy.core.downloader import Downloader
+from scrapy.utils.test import get_crawler
+
+from store_engine.throttle import StoreThrottle
+
+PROFILES = {'OnlineTrade': {'concurrency': 8, 'start_delay': 0.5, 'min_delay': 0.25, 'max_delay': 10.0,
+                            'target_concurrency': 4.0},
+            'Regard': {'concurrency': 2, 'start_delay': 2.0, 'max_delay': 20.0}}
+
+
+class FakeEngine:
+    def __init__(self, downloader):
+        self.downloader = downloader
+
+
+@pytest.fixture
+def make_throttle():
+    downloaders = []
+
+    def make_throttle(shards=1):
+        crawler = get_crawler(Spider, settings_dict={'STORE_THROTTLE_ENABLED': True, 'STORE_THROTTLE_SHARDS': shards})
+        crawler.spider = Spider('gpus')
+        downloader = Downloader(crawler)
+        downloaders.append(downloader)
+        crawler.engine = FakeEngine(downloader)
+        return StoreThrottle.from_crawler(crawler)
+
+    yield make_throttle
+    for downloader in downloaders:
+        downloader.close()
+
+
+def send(throttle, store_name, url='https://www.onlinetrade.ru/p1.html'):
+    """
+    Sends a request of the store to the downloader's slot, like the spider does, and returns the slot.
+    """
+    request = Request(url, meta={'download_slot': store_name, 'throttle': PROFILES[store_name]})
+    _, slot = throttle.crawler.engine.downloader._get_slot(request, throttle.crawler.spider)
+    throttle.request_reached_downloader(request, throttle.crawler.spider)
+    return request, slot
+
+
+def test_every_store_keeps_its_own_slot_and_profile(make_throttle):
+    throttle = make_throttle()
+    _, online_trade_slot = send(throttle, 'OnlineTrade')
+    _, regard_slot = send(throttle, 'Regard', 'https://www.onlinetrade.ru/p2.html')
+    assert online_trade_slot is not regard_slot
+    assert (online_trade_slot.concurrency, online_trade_slot.delay) == (8, 0.5)
+    assert (regard_slot.concurrency, regard_slot.delay) == (2, 2.0)
+
+
+def test_the_delay_follows_the_latency_of_the_store(make_throttle):
+    throttle = make_throttle()
+    request, slot = send(throttle, 'OnlineTrade')
+    request.meta['download_latency'] = 4.0
+    throttle.response_downloaded(type('Response', (), {'status': 200}), request, throttle.crawler.spider)
+    assert slot.delay == 1.0
+    request.meta['download_latency'] = 0.01
+    throttle.response_downloaded(type('Response', (), {'status': 503}), request, throttle.crawler.spider)
+    assert slot.delay == 1.0
+    throttle.response_downloaded(type('Response', (), {'status': 200}), request, throttle.crawler.spider)
+    assert slot.delay == 0.50125
+
+
+@pytest.mark.parametrize('shards', [1, 2, 3, 8, 10])
+def test_shards_keep_to_the_budget_of_the_store(make_throttle, shards):
+    throttle = make_throttle(shards)
+    for store_name, profile in PROFILES.items():
+        profile = throttle.split_profile(profile)
+        assert shards * profile['concurrency'] <= max(PROFILES[store_name]['concurrency'], shards)
+        assert profile['start_delay'] == PROFILES[store_name]['start_delay'] * shards
+        assert profile['max_delay'] == PROFILES[store_name]['max_delay'] * shards
+        assert shards * profile.get('target_concurrency', 1.0) == PROFILES[store_name].get('target_concurrency', 1.0)
+
+
+def test_the_slot_of_a_shard_gets_its_share(make_throttle):
+    throttle = make_throttle(3)
+    _, slot = send(throttle, 'OnlineTrade')
+    assert (slot.concurrency, slot.delay) == (2, 1.5)
+    assert PROFILES['OnlineTrade']['concurrency'] == 8 and PROFILES['OnlineTrade']['start_delay'] == 0.5
@@ -0,0 +1,185 @@
+import pytest
+from scrapy import Request
+from scrapy.http import HtmlResponse
+from scrapy.settings import Settings
+from twisted.internet import defer
+
+from scrapy_tor import middlewares
+from scrapy_tor.middlewares import ProxyMiddleware, TorEndpoint
+from scrapy_tor.rotation import CircuitStats, RotationPolicy
+
+PROXIES = ['http://127.0.0.1:8118', 'http://127.0.0.1:8119', 'http://127.0.0.1:8120']
+
+
+class FakeStats:
+    def __init__(self):
+        self.values = {}
+
+    def inc_value(self, key):
+        self.values[key] = self.values.get(key, 0) + 1
+
+
+class FakeController:
+    opened = []
+
+    def __init__(self, port):
+        self.port = port
+        self.password = None
+        self.signals = []
+        self.closed = False
+
+    @classmethod
+    def from_port(cls, port):
+        controller = cls(port)
+        cls.opened.append(controller)
+        return controller
+
+    def authenticate(self, password):
+        self.password = password
+
+    def is_alive(self):
+        return not self.closed
+
+    def signal(self, signal):
+        self.signals.append(signal)
+
+    def close(self):
+        self.closed = True
+
+
+def make_middleware(selection, **policy):
+    endpoints = [TorEndpoint(proxy) for proxy in PROXIES]
+    return ProxyMiddleware(endpoints, selection, RotationPolicy([403], ['captcha'], **policy), FakeStats())
+
+
+def run(coroutine):
+    result = defer.ensureDeferred(coroutine)
+    assert result.called
+    return result.result
+
+
+def make_response(request, status=200, body=b'<html>gpu</html>'):
+    return HtmlResponse(request.url, status=status, body=body, request=request)
+
+
+def test_least_loaded_chooses_the_endpoint_with_fewest_requests_in_progress():
+    middleware = make_middleware('least_loaded')
+    for endpoint, in_flight in zip(middleware.endpoints, (3, 1, 2)):
+        endpoint.in_flight = in_flight
+    assert [middleware.choose_endpoint() for _ in range(3)] == [1, 1, 1]
+
+
+def test_round_robin_chooses_the_endpoints_in_turn():
+    middleware = make_middleware('round_robin')
+    for endpoint, in_flight in zip(middleware.endpoints, (3, 1, 2)):
+        endpoint.in_flight = in_flight
+    assert [middleware.choose_endpoint() for _ in range(4)] == [0, 1, 2, 0]
+
+
+def test_endpoints_being_rotated_are_skipped():
+    middleware = make_middleware('round_robin')
+    middleware.endpoints[1].rotation = object()
+    assert [middleware.choose_endpoint() for _ in range(3)] == [0, 2, 2]
+    for endpoint in middleware.endpoints:
+        endpoint.rotation = object()
+    assert middleware.choose_endpoint() == 0
+
+
+def test_requests_are_spread_over_the_pool():
+    middleware = make_middleware('least_loaded')
+    requests = [Request('https://www.onlinetrade.ru/p%d.html' % i) for i in range(6)]
+    for request in requests:
+        assert run(middleware.process_request(request, None)) is None
+    assert [request.meta['proxy'] for request in requests] == PROXIES * 2
+    assert [endpoint.in_flight for endpoint in middleware.endpoints] == [2, 2, 2]
+    middleware.process_exception(requests[0], Exception(), None)
+    assert middleware.endpoints[0].in_flight == 1 and 'tor_endpoint' not in requests[0].meta
+    assert middleware.stats.values['tor/endpoint/0/requests'] == 2
+
+
+def test_unsupported_selection():
+    with pytest.raises(ValueError):
+        make_middleware('random')
+    with pytest.raises(ValueError):
+        ProxyMiddleware([])
+
+
+def test_circuit_stats_count_bans_and_failures():
+    stats = CircuitStats(smoothing=0.5)
+    stats.record(True, 1.0)
+    stats.record(False, 3.0, banned=True)
+    stats.record(False, banned=True)
+    assert stats.num_samples == 3 and stats.bans_in_row == 2
+    assert stats.success_rate == 0.25 and stats.latency == 2.0
+    stats.record(True)
+    assert stats.bans_in_row == 0
+    stats.reset()
+    assert stats.num_samples == 0 and stats.success_rate == 1.0 and stats.latency is None
+
+
+def test_rotation_policy_reasons():
+    policy = RotationPolicy([403], ['captcha'], max_bans=2, min_samples=3, max_latency=5.0, max_requests=10)
+    stats = CircuitStats(smoothing=0.5)
+    stats.record(False, banned=True)
+    assert policy.get_rotation_reason(stats, 1) is None
+    stats.record(False, banned=True)
+    assert policy.get_rotation_reason(stats, 2) == 'ban'
+    stats.record(False)
+    assert policy.get_rotation_reason(stats, 3) == 'success_rate'
+    stats.reset()
+    for _ in range(3):
+        stats.record(True, 10.0)
+    assert policy.get_rotation_reason(stats, 3) == 'latency'
+    stats.reset()
+    assert policy.get_rotation_reason(stats, 10) == 'max_requests'
+    assert [policy.get_retry_delay(retries) for retries in range(4)] == [2.0, 4.0, 8.0, None]
+
+
+@pytest.mark.parametrize('ban_codes', ['403,429', ['403', '429'], [403, 429]])
+def test_ban_codes_from_the_settings(ban_codes):
+    policy = RotationPolicy.from_settings(Settings({'TOR_BAN_CODES': ban_codes}))
+    assert policy.ban_codes == {403, 429}
+    request = Request('https://www.onlinetrade.ru/p1.html')
+    assert policy.is_ban(make_response(request, status=429)) and not policy.is_ban(make_response(request))
+
+
+def test_newnym_is_sent_over_one_control_connection(monkeypatch):
+    monkeypatch.setattr(middlewares, 'Controller', FakeController)
+    monkeypatch.setattr(FakeController, 'opened', [])
+    endpoint = TorEndpoint(PROXIES[0], 9051, 'secret')
+    endpoint.send_newnym()
+    endpoint.send_newnym()
+    assert len(FakeController.opened) == 1
+    controller = FakeController.opened[0]
+    assert controller.port == 9051 and controller.password == 'secret'
+    assert controller.signals == [middlewares.Signal.NEWNYM] * 2
+    endpoint.close()
+    assert controller.closed and endpoint.controller is None
+
+
+def test_ban_rotates_the_endpoint_and_retries_the_request():
+    middleware = make_middleware('round_robin', retry_backoff=0.0, max_retries=1)
+    request = Request('https://www.onlinetrade.ru/p1.html')
+    run(middleware.process_request(request, None))
+    endpoint = middleware.endpoints[0]
+    retry_request = run(middleware.process_response(request, make_response(request, body=b'CAPTCHA'), None))
+    assert isinstance(retry_request, Request) and retry_request.dont_filter
+    assert retry_request.meta['tor_retries'] == 1 and endpoint.in_flight == 0
+    assert endpoint.stats.num_samples == 0
+    assert middleware.stats.values['tor/rotations/ban'] == 1 and middleware.stats.values['tor/retries/count'] == 1
+    run(middleware.process_request(retry_request, None))
+    response = make_response(retry_request, status=403)
+    assert run(middleware.process_response(retry_request, response, None)) is response
+    assert middleware.stats.values['tor/retries/max_reached'] == 1 and middleware.stats.values['tor/bans'] == 2
+
+
+def test_requests_wait_for_the_rotation_of_their_endpoint():
+    middleware = ProxyMiddleware([TorEndpoint(PROXIES[0])], policy=RotationPolicy([403], [], max_requests=2))
+    endpoint = middleware.endpoints[0]
+    for _ in range(2):
+        run(middleware.process_request(Request('https://www.onlinetrade.ru/p1.html'), None))
+    endpoint.rotation = defer.Deferred()
+    waiting = defer.ensureDeferred(middleware.process_request(Request('https://www.onlinetrade.ru/p2.html'), None))
+    assert not waiting.called
+    endpoint.rotation_done(None)
+    assert waiting.called and endpoint.rotation is None
@@ -0,0 +1,69 @@
+import pickle
+
+import pytest
+
+from store_engine.incremental import load_previous_data
+from store_engine.urls import BloomFilter, SeenSet, canonicalize_url, join_link, url_fingerprint
+
+LINK = 'https://www.regard.ru/catalog/1.htm?a=1&b=2'
+
+
+@pytest.mark.parametrize('link', [
+    'HTTPS://www.Regard.ru:443/catalog/1.htm?utm_source=x&b=2&a=1#reviews',
+    'https://www.regard.ru/catalog/1.htm?b=2&gclid=abc&a=1',
+    ' https://www.regard.ru/catalog/1.htm?a=1&b=2 ',
+])
+def test_canonicalize_url(link):
+    assert canonicalize_url(link) == LINK
+
+
+def test_canonicalize_url_keeps_the_page():
+    assert canonicalize_url('http://regard.ru:8080') == 'http://regard.ru:8080/'
+    assert canonicalize_url('https://regard.ru/p?q=a%20b&q=c') == 'https://regard.ru/p?q=a%20b&q=c'
+
+
+def test_join_link():
+    assert join_link('https://regard.ru', '/catalog/1.htm') == 'https://regard.ru/catalog/1.htm'
+    assert join_link('http://127.0.0.1:8765/regard.ru/', 'catalog/1.htm') == (
+        'http://127.0.0.1:8765/regard.ru/catalog/1.htm')
+    assert join_link('https://regard.ru', '//www.regard.ru/1.htm') == 'https://www.regard.ru/1.htm'
+    assert join_link('https://regard.ru', 'http://regard.ru/1.htm') == 'http://regard.ru/1.htm'
+
+
+def test_aliases_have_the_same_fingerprint():
+    assert url_fingerprint(LINK) == url_fingerprint('http://regard.ru/catalog/1.htm?b=2&a=1#x')
+    assert url_fingerprint(LINK) != url_fingerprint('https://www.regard.ru/catalog/2.htm?a=1&b=2')
+
+
+def test_bloom_filter_false_positives():
+    bloom_filter = BloomFilter(10000, 0.001)
+    for i in range(10000):
+        assert bloom_filter.add(url_fingerprint('https://regard.ru/%d.htm' % i))
+    assert all(url_fingerprint('https://regard.ru/%d.htm' % i) in bloom_filter for i in range(10000))
+    false_positives = sum(url_fingerprint('https://regard.ru/new/%d.htm' % i) in bloom_filter for i in range(10000))
+    assert false_positives <= 30
+
+
+@pytest.mark.parametrize('bloom_capacity', [0, 1000])
+def test_seen_set(bloom_capacity):
+    seen_links = SeenSet(bloom_capacity)
+    assert seen_links.add(LINK)
+    assert not seen_links.add('http://regard.ru/catalog/1.htm?b=2&a=1')
+    assert LINK in seen_links and 'https://regard.ru/catalog/2.htm' not in seen_links
+    seen_links = pickle.loads(pickle.dumps(seen_links))
+    assert LINK in seen_links and seen_links.add('https://regard.ru/catalog/2.htm')
+    seen_links.clear()
+    assert LINK not in seen_links
+
+
+def test_previous_data_is_keyed_by_canonical_links(tmp_path):
+    path = tmp_path / 'output.csv'
+    path.write_text('store_name,gpu_model,gpu_name,fetch_ts,gpu_price,in_stock,url\n'
+                    'Regard,RTX 3060,ASUS,1000,75999,true,https://www.regard.ru/catalog/1.htm?utm_source=x&b=2&a=1\n'
+                    'Regard,RTX 3060,ASUS,2000,69999,false,https://www.regard.ru/catalog/1.htm?a=1&b=2#reviews\n'
+                    'Regard,RTX 3060,ASUS,,69999,false,https://www.regard.ru/catalog/2.htm\n', encoding='utf-8')
+    previous_data = load_previous_data(str(path))
+    assert list(previous_data) == [LINK]
+    assert previous_data[LINK]['url'] == LINK and previous_data[LINK]['fetch_ts'] == 2000
+    assert previous_data[LINK]['in_stock'] is False
+    assert load_previous_data(str(tmp_path / 'missing.csv')) == {}